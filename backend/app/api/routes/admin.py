@@ -7,6 +7,8 @@ from app.core.security import require_admin
 from app.models.user import User
 from app.models.report import ReportLog
 from app.models.token import TokenTransaction
+from app.services.report_scheduler import report_scheduler
+from app.services.offline_report_service import offline_report_pipeline
 
 router = APIRouter()
 
@@ -215,3 +217,15 @@ async def get_admin_stats(admin: User = Depends(require_admin)):
     except Exception:
         traceback.print_exc()
         raise
+
+
+@router.get("/report-queue")
+async def get_report_queue_metrics(admin: User = Depends(require_admin)):
+    """Report scheduler queue depth and wait-time metrics"""
+    try:
+        metrics = await report_scheduler.get_metrics()
+        metrics["offline"] = await offline_report_pipeline.get_metrics()
+        return metrics
+    except Exception:
+        traceback.print_exc()
+        raise
@@ -0,0 +1,230 @@
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import List
+
+from beanie import PydanticObjectId
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.models.report import (
+    ReportBatch,
+    ReportBatchStatus,
+    ReportLog,
+    ReportStatus,
+    ReportType,
+    ReportComplexity,
+    ReportGenerationMode,
+    get_report_token_requirement,
+)
+from app.models.user import User
+from app.schemas.report import ReportBatchCreate, ReportBatchResponse, ReportResponse
+from app.services.batch_service import prepare_batch, iter_zip, build_batch_summary
+from app.services.report_scheduler import report_scheduler
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {ReportStatus.COMPLETED, ReportStatus.FAILED, ReportStatus.CANCELLED}
+
+
+async def get_user_batch(batch_id: str, current_user: User) -> ReportBatch:
+    batch = await ReportBatch.get(batch_id)
+    if not batch or batch.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found"
+        )
+    return batch
+
+
+def get_batch_status(batch: ReportBatch, reports: List[ReportLog]) -> str:
+    """Overall batch status, derived from the statuses of its reports"""
+    if batch.status != ReportBatchStatus.QUEUED:
+        return batch.status.value
+    if any(r.status not in FINISHED_STATUSES for r in reports):
+        return "processing"
+    if all(r.status == ReportStatus.COMPLETED for r in reports):
+        return "completed"
+    return "completed_with_errors"
+
+
+def build_batch_response(batch: ReportBatch, reports: List[ReportLog], message: str = None) -> ReportBatchResponse:
+    status_counts = {s.value: 0 for s in ReportStatus}
+    for report in reports:
+        status_counts[report.status.value] += 1
+    finished = sum(status_counts[s.value] for s in FINISHED_STATUSES)
+    batch_status = get_batch_status(batch, reports)
+
+    return ReportBatchResponse(
+        id=str(batch.id),
+        name=batch.name,
+        status=batch_status,
+        complexity=batch.complexity,
+        total_reports=len(reports),
+        status_counts=status_counts,
+        progress=round(finished / len(reports), 3) if reports else 0.0,
+        tokens_used=batch.tokens_used,
+        reports=[
+            ReportResponse(
+                id=str(r.id),
+                title=r.title,
+                status=r.status,
+                created_at=r.created_at,
+                pdf_url=r.pdf_url,
+                complexity=r.complexity,
+                sections=r.sections,
+                tokens_used=r.tokens_used,
+                estimated_completion_at=r.estimated_completion_at,
+                message=r.error_message,
+            )
+            for r in reports
+        ],
+        created_at=batch.created_at,
+        download_url=(
+            f"/reports/batch/{batch.id}/download"
+            if batch_status in ("completed", "completed_with_errors") else None
+        ),
+        message=message,
+    )
+
+
+@router.post("", response_model=ReportBatchResponse)
+async def create_report_batch(
+    batch_data: ReportBatchCreate,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+):
+    """Submit many report ideas at once; research is shared across the batch"""
+    report_count = len(batch_data.ideas)
+    logger.info(f"Batch report request from user: {current_user.email} ({report_count} reports, {batch_data.complexity})")
+
+    # Without the pipeline nothing would ever collect an offline report
+    if batch_data.offline and not settings.OFFLINE_REPORTS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Offline generation is not available. Please request the report without offline.",
+        )
+
+    # Admission control covers the whole batch, before any tokens are deducted
+    estimate = await report_scheduler.estimate(batch_data.complexity, batch_data.sections)
+    over_capacity = not estimate.admitted or estimate.queue_depth + report_count > settings.REPORT_MAX_QUEUE_DEPTH
+    if over_capacity and not batch_data.allow_deferred and not batch_data.offline:
+        logger.warning(f"Report queue cannot take a batch of {report_count} (depth {estimate.queue_depth}), "
+                       f"rejecting request from {current_user.email}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Report generation is at capacity. Please try again later or submit a smaller batch.",
+            headers={"Retry-After": str(estimate.retry_after_seconds)},
+        )
+
+    # Reserve the whole batch in one update, one reservation per report so each settles on its own
+    tokens_per_report = get_report_token_requirement(batch_data.complexity, batch_data.sections, batch_data.offline)
+    tokens_required = tokens_per_report * report_count
+    report_ids = [PydanticObjectId() for _ in batch_data.ideas]
+    if not await current_user.reserve_tokens({str(report_id): tokens_per_report for report_id in report_ids}):
+        balance = await current_user.get_token_balance()
+        logger.warning(f"User {current_user.email} has insufficient tokens for batch. Required: {tokens_required}, Available: {balance.available_tokens}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Insufficient tokens. Required: {tokens_required}, Available: {balance.available_tokens}. Please purchase more tokens.",
+        )
+
+    batch = ReportBatch(
+        user_id=str(current_user.id),
+        name=batch_data.name,
+        complexity=batch_data.complexity,
+        sections=batch_data.sections,
+        tokens_used=tokens_required,
+    )
+    await batch.insert()
+
+    # Reports stay pending without a finish tag, so the scheduler skips them until the
+    # shared research is done and prepare_batch enqueues them.
+    title_prefix = "Draft Assessment" if batch_data.complexity == ReportComplexity.DRAFT else "Technology Assessment"
+    estimated_completion_at = datetime.utcnow() + timedelta(
+        seconds=settings.OFFLINE_REPORT_EXPECTED_SECONDS if batch_data.offline else estimate.completion_seconds)
+    reports = []
+    for report_id, idea in zip(report_ids, batch_data.ideas):
+        report = ReportLog(
+            id=report_id,
+            user_id=str(current_user.id),
+            batch_id=str(batch.id),
+            title=f"{title_prefix}: {idea[:50]}...",
+            idea=idea,
+            report_type=ReportType.CUSTOM if batch_data.complexity == ReportComplexity.CUSTOM else ReportType.TECHNOLOGY_ASSESSMENT,
+            complexity=batch_data.complexity,
+            sections=batch_data.sections,
+            status=ReportStatus.PENDING,
+            generation_mode=ReportGenerationMode.OFFLINE if batch_data.offline else ReportGenerationMode.STANDARD,
+            tokens_used=tokens_per_report,
+            estimated_completion_at=estimated_completion_at,
+        )
+        await report.insert()
+        reports.append(report)
+
+    batch.report_ids = [str(r.id) for r in reports]
+    await batch.save()
+    logger.info(f"Created report batch {batch.id} with {report_count} reports")
+
+    current_user.reports_generated += report_count
+    current_user.updated_at = datetime.utcnow()
+    await current_user.save()
+
+    background_tasks.add_task(prepare_batch, str(batch.id))
+
+    return build_batch_response(
+        batch,
+        reports,
+        message=f"Batch of {report_count} reports queued using {tokens_required} tokens. "
+                "You will be notified as each report completes.",
+    )
+
+
+@router.get("/{batch_id}", response_model=ReportBatchResponse)
+async def get_report_batch(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Aggregate status of a report batch"""
+    batch = await get_user_batch(batch_id, current_user)
+    reports = await ReportLog.find({"batch_id": str(batch.id)}).sort([("created_at", 1)]).to_list()
+    return build_batch_response(batch, reports)
+
+
+@router.get("/{batch_id}/download")
+async def download_report_batch(
+    batch_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    """Download every completed report of a finished batch as one ZIP archive"""
+    batch = await get_user_batch(batch_id, current_user)
+    reports = await ReportLog.find({"batch_id": str(batch.id)}).sort([("created_at", 1)]).to_list()
+
+    batch_status = get_batch_status(batch, reports)
+    if batch_status not in ("completed", "completed_with_errors"):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Batch is not finished yet (status: {batch_status})"
+        )
+
+    files = []
+    for index, report in enumerate(reports, start=1):
+        if report.status == ReportStatus.COMPLETED and report.pdf_path and os.path.exists(report.pdf_path):
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", report.idea[:40]).strip("_")
+            files.append((f"{index:02d}_{slug}.pdf", report.pdf_path))
+    if not files:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No completed report files in this batch"
+        )
+
+    logger.info(f"Streaming batch {batch.id} archive with {len(files)} reports to {current_user.email}")
+    return StreamingResponse(
+        iter_zip(files, {"batch_summary.json": build_batch_summary(batch, reports)}),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="report_batch_{batch.id}.zip"'},
+    )
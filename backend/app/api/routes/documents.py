@@ -0,0 +1,131 @@
+import logging
+import os
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.models.document import DocumentStatus, SupportingDocument
+from app.models.user import User
+from app.schemas.report import SupportingDocumentResponse
+from app.services.document_service import (
+    DocumentTooLargeError,
+    extract_document_text,
+    find_cached_extraction,
+    get_document_path,
+    get_text_cache_path,
+    save_upload_stream,
+)
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def build_document_response(document: SupportingDocument) -> SupportingDocumentResponse:
+    return SupportingDocumentResponse(
+        id=str(document.id),
+        filename=document.filename,
+        file_type=document.file_type,
+        file_size=document.file_size,
+        status=document.status,
+        page_count=document.page_count,
+        text_chars=document.text_chars,
+        error_message=document.error_message,
+        created_at=document.created_at,
+    )
+
+
+async def get_user_document(document_id: str, current_user: User) -> SupportingDocument:
+    document = await SupportingDocument.get(document_id)
+    if not document or document.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    return document
+
+
+@router.post("", response_model=SupportingDocumentResponse, status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str = Query(..., min_length=1, max_length=255),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Upload a supporting document as the raw request body. It is streamed to disk with the
+    size cap enforced as it arrives; text is extracted in the background.
+    """
+    file_type = os.path.splitext(filename)[1].lstrip(".").lower()
+    if file_type not in settings.ALLOWED_FILE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported file type. Allowed: {', '.join(settings.ALLOWED_FILE_TYPES)}"
+        )
+
+    # Reject early when the client declares an oversized body
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB limit"
+        )
+
+    try:
+        _, file_size, content_hash = await save_upload_stream(request.stream(), file_type)
+    except DocumentTooLargeError:
+        logger.warning(f"Upload from {current_user.email} exceeded {settings.MAX_FILE_SIZE} bytes")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the {settings.MAX_FILE_SIZE // (1024 * 1024)}MB limit"
+        )
+    if file_size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Uploaded file is empty"
+        )
+
+    document = SupportingDocument(
+        user_id=str(current_user.id),
+        filename=os.path.basename(filename),
+        file_type=file_type,
+        file_size=file_size,
+        content_hash=content_hash,
+    )
+
+    # Identical content was extracted before: reuse the cached text
+    cached = await find_cached_extraction(content_hash)
+    if cached:
+        document.status = DocumentStatus.READY
+        document.page_count = cached.page_count
+        document.text_chars = cached.text_chars
+    await document.insert()
+
+    if cached:
+        logger.info(f"Document {document.id} reuses cached text for {content_hash[:12]}")
+    else:
+        background_tasks.add_task(extract_document_text, str(document.id))
+    logger.info(f"Uploaded document {document.id} ({file_type}, {file_size} bytes) for {current_user.email}")
+
+    return build_document_response(document)
+
+
+@router.get("/{document_id}", response_model=SupportingDocumentResponse)
+async def get_document(document_id: str, current_user: User = Depends(get_current_user)):
+    """Get a supporting document and its text extraction status"""
+    return build_document_response(await get_user_document(document_id, current_user))
+
+
+@router.delete("/{document_id}")
+async def delete_document(document_id: str, current_user: User = Depends(get_current_user)):
+    """Delete a supporting document; stored content is removed once no upload references it"""
+    document = await get_user_document(document_id, current_user)
+    await document.delete()
+
+    if not await SupportingDocument.find_one({"content_hash": document.content_hash}):
+        for path in (get_document_path(document.content_hash, document.file_type),
+                     get_text_cache_path(document.content_hash)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    return {"message": "Document deleted successfully"}
@@ -1,27 +1,105 @@
+import asyncio
 import logging
 import os
+import threading
+import time
 import traceback
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlencode
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from fastapi.responses import FileResponse
+from beanie import PydanticObjectId
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse, Response
 
 from app.core.config import settings
-from app.core.security import get_current_user
-from app.models.report import ReportLog, ReportStatus, ReportType, ReportComplexity, REPORT_TOKEN_REQUIREMENTS
+from app.core.security import (
+    get_current_user,
+    get_current_user_optional,
+    create_signed_download_params,
+    verify_download_signature,
+)
+from app.models.report import (
+    ReportLog,
+    ReportStatus,
+    ReportType,
+    ReportComplexity,
+    ReportGenerationMode,
+    ALL_SECTION_TITLES,
+    CUSTOM_REPORT_BASE_TOKENS,
+    CUSTOM_REPORT_TOKENS_PER_SECTION,
+    get_report_token_requirement,
+)
+from app.models.document import DocumentStatus, SupportingDocument
 from app.models.user import User
-from app.schemas.report import ReportCreate, ReportResponse, ReportListResponse
+from app.schemas.report import ReportCreate, ReportUpgrade, ReportResponse, ReportListResponse
+from app.services.batch_service import normalize_search_query, research_ideas
+from app.services.document_service import get_report_documents
 from app.services.email_service import send_report_ready_email
-from app.services.report_generator import PDFReportGenerator
+from app.services.report_scheduler import report_scheduler
+from app.services.thumbnail_service import (
+    THUMBNAIL_PAGES,
+    THUMBNAIL_MEDIA_TYPES,
+    generate_thumbnails,
+    get_thumbnail_path,
+    delete_thumbnails,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Cancellation events for reports generating in this worker, keyed by report id
+_cancel_events: Dict[str, threading.Event] = {}
+
+def calculate_cancellation_refund(tokens_used: int, sections_completed: int, sections_total: int) -> int:
+    """Refund tokens in proportion to the sections that were not generated"""
+    if sections_total <= 0:
+        return tokens_used
+    remaining = max(sections_total - sections_completed, 0)
+    return int(tokens_used * remaining / sections_total)
+
+async def watch_for_cancellation(report_id: str, cancel_event: threading.Event):
+    """Poll the report so a cancel request handled by any worker reaches the generator"""
+    while not cancel_event.is_set():
+        await asyncio.sleep(settings.REPORT_CANCEL_POLL_SECONDS)
+        report = await ReportLog.get(report_id)
+        if report is None or report.cancel_requested:
+            cancel_event.set()
+
+async def finalize_cancelled_report(report_id: str, sections_completed: int, sections_total: int):
+    """Mark a report cancelled mid-generation and refund the unused share of its tokens"""
+    report = await ReportLog.get(report_id)
+    if not report or report.status == ReportStatus.CANCELLED:
+        return
+
+    tokens_refunded = calculate_cancellation_refund(report.tokens_used, sections_completed, sections_total)
+    try:
+        user = await User.get(report.user_id)
+        tokens_consumed = report.tokens_used - tokens_refunded
+        if user and await user.release_tokens(str(report.id), report.tokens_used, tokens_consumed):
+            logger.info(f"Refunded {tokens_refunded} tokens to user {user.email} for cancelled report {report.id}")
+        else:
+            tokens_refunded = 0
+    except Exception as refund_error:
+        logger.error(f"Failed to refund tokens for user {report.user_id} on report {report.id}: {refund_error}")
+        tokens_refunded = 0
+
+    report.mark_cancelled(tokens_refunded)
+    report.metadata["sections_completed"] = sections_completed
+    report.metadata["sections_total"] = sections_total
+    await report.save()
+    await report.release_upgraded_draft()
+    logger.info(f"Report {report_id} cancelled after {sections_completed}/{sections_total} sections")
+
 async def generate_report_background(report_id: str, idea: str, complexity: ReportComplexity, user_email: str, user_name: str):
     """Background task to generate report with comprehensive logging"""
     logger.info(f"Starting background report generation for report_id: {report_id}")
-    
+
+    cancel_event = threading.Event()
+    _cancel_events[report_id] = cancel_event
+    cancel_watcher = None
+    generator = None
+
     try:
         report = await ReportLog.get(report_id)
         if not report:
@@ -30,9 +108,14 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
 
         logger.info(f"Found report - Report: {report.title}, Complexity: {complexity}")
 
-        # Update status to processing
+        # Update status to processing, unless the report was cancelled while queued
+        result = await ReportLog.find_one({"_id": report.id, "status": ReportStatus.PENDING}).update(
+            {"$set": {"status": ReportStatus.PROCESSING, "updated_at": datetime.utcnow()}}
+        )
+        if not result.modified_count:
+            logger.info(f"Report {report_id} is no longer pending, skipping generation")
+            return
         report.status = ReportStatus.PROCESSING
-        await report.save()
         logger.info(f"Updated report status to PROCESSING")
 
         # Generate report
@@ -40,21 +123,63 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
         os.makedirs(settings.REPORTS_STORAGE_PATH, exist_ok=True)
         logger.info(f"Output path: {output_path}")
 
+        # Sections generated offline by a bulk LLM job; not kept once the report is built
+        section_results = report.metadata.pop("section_results", None)
+        supporting_documents = await get_report_documents(report.document_ids)
+
+        # Patents from the local corpus first, SerpApi only to fill gaps
+        patents = report.metadata.get("prefetched_patents")
+        if patents is None and report.complexity != ReportComplexity.DRAFT:
+            try:
+                queries, patents_by_query = await research_ideas([idea])
+                patents = patents_by_query[normalize_search_query(queries[0])]
+                report.metadata["search_query"] = queries[0]
+            except Exception as e:
+                logger.error(f"Patent research failed, the generator will search itself: {e}")
+        # Hard LLM token budget, from the list price of the report
+        token_budget = get_report_token_requirement(report.complexity, report.sections) * settings.REPORT_LLM_TOKENS_PER_CREDIT
+
         logger.info("Calling generate_technology_report...")
+        # Imported lazily: the report engine pulls in openai, weasyprint and serpapi,
+        # which API workers only need once a report job actually runs.
+        from app.services.report_generator import PDFReportGenerator
         generator= PDFReportGenerator()
         
         # Use asyncio to run the synchronous report generation in a thread pool
         # This prevents blocking the main event loop
-        import asyncio
         loop = asyncio.get_event_loop()
+        cancel_watcher = asyncio.create_task(watch_for_cancellation(report_id, cancel_event))
+
+        async def save_token_estimate(tokens_estimated: int):
+            report.tokens_estimated = tokens_estimated
+            await ReportLog.find_one({"_id": report.id}).update({"$set": {
+                "tokens_estimated": tokens_estimated,
+                "updated_at": datetime.utcnow(),
+            }})
+
+        def persist_token_estimate(estimate: dict):
+            # Called from the generator thread before the first LLM call, so the estimate
+            # is recorded even if the worker dies mid-report
+            asyncio.run_coroutine_threadsafe(save_token_estimate(estimate["total_tokens"]), loop)
+
+        generation_started = time.monotonic()
         report_data = await loop.run_in_executor(
             None, 
             generator.generate_complete_report, 
             idea, 
             output_path, 
-            complexity
+            complexity,
+            cancel_event,
+            report.sections,
+            patents,
+            section_results,
+            token_budget,
+            supporting_documents,
+            persist_token_estimate,
         )
-        logger.info("Report generation completed successfully")
+        cancel_watcher.cancel()
+        report.generation_time = time.monotonic() - generation_started
+        logger.info(f"Report generation completed successfully in {report.generation_time:.1f}s")
 
         # Verify file was created
         if not os.path.exists(f"{output_path}.pdf"):
@@ -75,17 +200,48 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
             file_size=file_size,
         )
 
+        pdf_stats = report_data.get("metadata", {}).get("pdf_optimization")
+        if pdf_stats:
+            report.original_file_size = pdf_stats.get("original_size")
+            report.metadata["pdf_optimization"] = pdf_stats
+            if pdf_stats.get("original_size") is not None:
+                logger.info(f"PDF optimization ({pdf_stats.get('preset')}): "
+                            f"{pdf_stats['original_size']} -> {pdf_stats.get('optimized_size')} bytes")
+            else:
+                logger.info(f"PDF optimization ({pdf_stats.get('preset')}): {pdf_stats.get('optimized_size')} bytes, "
+                            f"original size not measured")
+
+        hedge_stats = report_data.get("metadata", {}).get("hedging")
+        if hedge_stats:
+            report.metadata["hedging"] = hedge_stats
+            logger.info(f"Section hedging: {hedge_stats}")
+
+        budget_stats = report_data.get("metadata", {}).get("token_budget")
+        if budget_stats:
+            report.tokens_estimated = budget_stats["estimated_tokens"]
+            report.metadata["token_budget"] = budget_stats
+            logger.info(f"LLM tokens: estimated {budget_stats['estimated_tokens']}, used {budget_stats['used_tokens']} "
+                        f"of {budget_stats['budget']}, {len(budget_stats['sections_skipped'])} sections skipped")
+
         # Update content metadata
         report.content_preview = report_data.get("executive_summary", "")[:500]
         
         # Store OpenAI usage info
-        if "_usage_info" in report_data:
-            report.openai_usage = report_data["_usage_info"]
-            logger.info(f"Stored OpenAI usage info: {report_data['_usage_info']}")
+        usage_info = report_data.get("metadata", {}).get("usage")
+        if usage_info:
+            report.openai_usage = usage_info
+            logger.info(f"Stored OpenAI usage info: {usage_info}")
         
         await report.save()
         logger.info("Report marked as completed and saved")
 
+        try:
+            user = await User.get(report.user_id)
+            if user and not await user.commit_tokens(report_id, report.tokens_used):
+                logger.warning(f"No open token reservation to commit for report {report_id}")
+        except Exception as commit_error:
+            logger.error(f"Failed to commit tokens for user {report.user_id} on report {report_id}: {commit_error}")
+
         # Send notification email
         try:
             await send_report_ready_email(user_email, user_name, report.title, report_id)
@@ -93,9 +249,22 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
         except Exception as e:
             logger.error(f"Failed to send report ready email: {e}")
 
+        # Post-render stage: cache preview thumbnails next to the PDF
+        try:
+            thumbnails = await loop.run_in_executor(None, generate_thumbnails, report.pdf_path)
+            if thumbnails:
+                report.metadata["thumbnails"] = thumbnails
+                await report.save()
+        except Exception as e:
+            logger.error(f"Failed to generate thumbnails for report {report_id}: {e}")
+
         logger.info(f"Background report generation completed successfully for report_id: {report_id}")
 
     except Exception as e:
+        if cancel_event.is_set() and generator is not None:
+            await finalize_cancelled_report(report_id, generator.sections_completed, generator.sections_total)
+            return
+
         logger.error(f"Error in background report generation: {e}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         
@@ -103,12 +272,13 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
         try:
             report = await ReportLog.get(report_id)
             if report:
-                # Refund tokens to the user
+                # Release the report's token reservation
                 try:
                     user = await User.get(report.user_id)
-                    if user and report.tokens_used > 0:
-                        await user.add_tokens(report.tokens_used)
+                    if user and await user.release_tokens(report_id, report.tokens_used):
                         logger.info(f"Refunded {report.tokens_used} tokens to user {user.email} for failed report {report.id}")
+                    else:
+                        logger.warning(f"No open token reservation to release for failed report {report_id}")
                 except Exception as refund_error:
                     logger.error(f"Failed to refund tokens for user {report.user_id} on report {report.id}: {refund_error}")
 
@@ -120,28 +290,75 @@ async def generate_report_background(report_id: str, idea: str, complexity: Repo
                 else:
                     error_message = f"Report generation failed: {error_message}"
                 
+                if generator is not None and generator.token_estimate:
+                    report.tokens_estimated = generator.token_estimate["total_tokens"]
                 report.mark_failed(error_message)
                 await report.save()
+                await report.release_upgraded_draft()
                 logger.info(f"Report marked as failed with error: {error_message}")
         except Exception as save_error:
             logger.error(f"Failed to save error status: {save_error}")
+    finally:
+        _cancel_events.pop(report_id, None)
+        if cancel_watcher is not None:
+            cancel_watcher.cancel()
+
+async def create_and_queue_report(
+    current_user: User,
+    idea: str,
+    complexity: ReportComplexity,
+    sections: Optional[List[str]] = None,
+    allow_deferred: bool = False,
+    tokens_credit: int = 0,
+    metadata: Optional[dict] = None,
+    offline: bool = False,
+    document_ids: Optional[List[str]] = None,
+) -> ReportResponse:
+    """Admit, charge and queue a new report; tokens_credit is subtracted from the price"""
+
+    # Without the pipeline nothing would ever collect an offline report
+    if offline and not settings.OFFLINE_REPORTS_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Offline generation is not available. Please request the report without offline.",
+        )
 
-@router.post("/generate", response_model=ReportResponse)
-async def generate_report(
-    report_data: ReportCreate,
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user),
-):
-    """Generate a new technology assessment report with enhanced logging"""
-    logger.info(f"Report generation request from user: {current_user.email}")
-    logger.info(f"Idea length: {len(report_data.idea)} characters")
-    logger.info(f"Report complexity: {report_data.complexity}")
+    document_ids = document_ids or []
+    if len(document_ids) > settings.MAX_DOCUMENTS_PER_REPORT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.MAX_DOCUMENTS_PER_REPORT} supporting documents can be attached",
+        )
+    for document_id in document_ids:
+        document = await SupportingDocument.get(document_id)
+        if not document or document.user_id != str(current_user.id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail=f"Document {document_id} not found"
+            )
+        if document.status != DocumentStatus.READY:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Document {document.filename} is {document.status.value}; wait until it is ready",
+            )
+
+    # Admission control: reject before deducting tokens when the queue is over capacity.
+    # Offline reports wait for the bulk LLM path instead of the live queue.
+    estimate = await report_scheduler.estimate(complexity, sections)
+    if not estimate.admitted and not allow_deferred and not offline:
+        logger.warning(f"Report queue over capacity (depth {estimate.queue_depth}, "
+                       f"wait {estimate.wait_seconds:.0f}s), rejecting request from {current_user.email}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Report generation is at capacity. Please try again later.",
+            headers={"Retry-After": str(estimate.retry_after_seconds)},
+        )
 
     # Get token requirements for the complexity level
-    tokens_required = REPORT_TOKEN_REQUIREMENTS.get(report_data.complexity, 2500)
+    tokens_required = max(get_report_token_requirement(complexity, sections, offline) - tokens_credit, 0)
     
-    # Check if user has enough tokens
-    if not await current_user.can_generate_report(tokens_required):
+    # Reserve tokens under the new report's id; committed on completion, released on failure or cancel
+    report_id = PydanticObjectId()
+    if not await current_user.reserve_tokens({str(report_id): tokens_required}):
         balance = await current_user.get_token_balance()
         logger.warning(f"User {current_user.email} has insufficient tokens. Required: {tokens_required}, Available: {balance.available_tokens}")
         raise HTTPException(
@@ -149,26 +366,30 @@ async def generate_report(
             detail=f"Insufficient tokens. Required: {tokens_required}, Available: {balance.available_tokens}. Please purchase more tokens.",
         )
 
-    # Use tokens
-    if not await current_user.use_tokens(tokens_required):
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to deduct tokens. Please try again."
-        )
-
     # Create report log
+    title_prefix = "Draft Assessment" if complexity == ReportComplexity.DRAFT else "Technology Assessment"
     report = ReportLog(
+        id=report_id,
         user_id=str(current_user.id),
-        title=f"Technology Assessment: {report_data.idea[:50]}...",
-        idea=report_data.idea,
-        report_type=ReportType.TECHNOLOGY_ASSESSMENT,
-        complexity=report_data.complexity,
+        title=f"{title_prefix}: {idea[:50]}...",
+        idea=idea,
+        report_type=ReportType.CUSTOM if complexity == ReportComplexity.CUSTOM else ReportType.TECHNOLOGY_ASSESSMENT,
+        complexity=complexity,
+        sections=sections,
+        document_ids=document_ids,
         status=ReportStatus.PENDING,
+        generation_mode=ReportGenerationMode.OFFLINE if offline else ReportGenerationMode.STANDARD,
         tokens_used=tokens_required,
-        tokens_estimated=tokens_required,
+        estimated_completion_at=datetime.utcnow() + timedelta(
+            seconds=settings.OFFLINE_REPORT_EXPECTED_SECONDS if offline else estimate.completion_seconds),
+        metadata=metadata or {},
     )
 
-    await report.insert()
+    try:
+        await report.insert()
+    except Exception:
+        await current_user.release_tokens(str(report_id), tokens_required)
+        raise
     logger.info(f"Created report log with ID: {report.id}")
 
     # Update user's report count
@@ -177,27 +398,117 @@ async def generate_report(
     await current_user.save()
     logger.info(f"Updated user report count to: {current_user.reports_generated}")
 
-    # Start background generation
-    logger.info("Starting background report generation task")
-    background_tasks.add_task(
-        generate_report_background, 
-        str(report.id), 
-        report_data.idea, 
-        report_data.complexity,
-        current_user.email,
-        current_user.name
-    )
+    if offline:
+        # Collected into the next bulk LLM job; the scheduler gets it once results are back
+        logger.info("Queueing report for offline generation")
+    else:
+        # Queue for generation; the scheduler dispatches it by priority and fair share
+        logger.info("Queueing report for generation")
+        await report_scheduler.enqueue(report, current_user)
 
     return ReportResponse(
         id=str(report.id),
         title=report.title,
         status=report.status,
         created_at=report.created_at,
-        complexity=report_data.complexity,
+        complexity=complexity,
+        sections=sections,
         tokens_used=tokens_required,
-        message=f"Report generation started using {tokens_required} tokens. You will be notified when complete.",
+        estimated_completion_at=report.estimated_completion_at,
+        message=(
+            f"Report queued for generation using {tokens_required} tokens. "
+            + ("Offline generation can take several hours. " if offline else "")
+            + ("Generation is busy, so it may take longer than usual. " if not estimate.admitted and not offline else "")
+            + "You will be notified when complete."
+        ),
+    )
+
+@router.post("/generate", response_model=ReportResponse)
+async def generate_report(
+    report_data: ReportCreate,
+    current_user: User = Depends(get_current_user),
+):
+    """Generate a new technology assessment report with enhanced logging"""
+    logger.info(f"Report generation request from user: {current_user.email}")
+    logger.info(f"Idea length: {len(report_data.idea)} characters")
+    logger.info(f"Report complexity: {report_data.complexity}")
+
+    return await create_and_queue_report(
+        current_user,
+        report_data.idea,
+        report_data.complexity,
+        sections=report_data.sections,
+        allow_deferred=report_data.allow_deferred,
+        offline=report_data.offline,
+        document_ids=report_data.document_ids,
     )
 
+@router.post("/{report_id}/upgrade", response_model=ReportResponse)
+async def upgrade_draft_report(
+    report_id: str,
+    upgrade_data: ReportUpgrade,
+    current_user: User = Depends(get_current_user),
+):
+    """Upgrade a completed draft into a full report, crediting the tokens paid for the draft"""
+
+    draft = await ReportLog.get(report_id)
+    if not draft or draft.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+
+    if draft.complexity != ReportComplexity.DRAFT or draft.status != ReportStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only completed draft reports can be upgraded",
+        )
+
+    if draft.metadata.get("upgraded_to"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This draft has already been upgraded",
+        )
+
+    if upgrade_data.complexity == ReportComplexity.DRAFT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Choose a full report complexity to upgrade to",
+        )
+
+    # Claim the draft first, so concurrent upgrades can't both get its credit
+    claimed = await ReportLog.find_one(
+        {"_id": draft.id, "metadata.upgraded_to": {"$exists": False}}
+    ).update({"$set": {"metadata.upgraded_to": "pending", "updated_at": datetime.utcnow()}})
+    if not claimed.modified_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="This draft has already been upgraded",
+        )
+
+    try:
+        response = await create_and_queue_report(
+            current_user,
+            draft.idea,
+            upgrade_data.complexity,
+            sections=upgrade_data.sections,
+            allow_deferred=upgrade_data.allow_deferred,
+            tokens_credit=draft.tokens_used,
+            metadata={"upgraded_from": str(draft.id)},
+        )
+    except BaseException:
+        await ReportLog.find_one({"_id": draft.id, "metadata.upgraded_to": "pending"}).update(
+            {"$unset": {"metadata.upgraded_to": ""}}
+        )
+        raise
+
+    # Conditional: if the new report already failed or was cancelled, the draft was released
+    await ReportLog.find_one({"_id": draft.id, "metadata.upgraded_to": "pending"}).update(
+        {"$set": {"metadata.upgraded_to": response.id, "updated_at": datetime.utcnow()}}
+    )
+    logger.info(f"Upgraded draft {draft.id} to {upgrade_data.complexity} report {response.id}")
+
+    return response
+
 @router.get("", response_model=ReportListResponse)
 async def get_reports(
     page: int = 1,
@@ -238,7 +549,9 @@ async def get_reports(
                 idea=report.idea,
                 pdf_url=report.pdf_url,
                 complexity=getattr(report, 'complexity', ReportComplexity.BASIC),
+                sections=report.sections,
                 tokens_used=getattr(report, 'tokens_used', 0),
+                estimated_completion_at=report.estimated_completion_at,
             )
             for report in reports
         ],
@@ -262,6 +575,16 @@ async def get_recent_reports(
 
     return [report.dict_for_user() for report in reports]
 
+@router.get("/sections")
+async def get_report_sections_catalog(current_user: User = Depends(get_current_user)):
+    """Sections available for custom reports and their base and per-section token price"""
+    return {
+        "sections": ALL_SECTION_TITLES,
+        "base_tokens": CUSTOM_REPORT_BASE_TOKENS,
+        "tokens_per_section": CUSTOM_REPORT_TOKENS_PER_SECTION,
+        "max_tokens": get_report_token_requirement(ReportComplexity.CUSTOM, ALL_SECTION_TITLES),
+    }
+
 @router.get("/{report_id}")
 async def get_report(report_id: str, current_user: User = Depends(get_current_user)):
     """Get a specific report"""
@@ -274,11 +597,74 @@ async def get_report(report_id: str, current_user: User = Depends(get_current_us
 
     return report.dict_for_user()
 
+def build_offload_response(report: ReportLog) -> Optional[Response]:
+    """Hand the file off to the reverse proxy when an offload mode is configured"""
+    mode = (settings.DOWNLOAD_OFFLOAD_MODE or "").lower()
+    if not mode:
+        return None
+
+    headers = {
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(f'{report.title}.pdf')}",
+    }
+    if mode == "x-accel-redirect":
+        storage_root = os.path.abspath(settings.REPORTS_STORAGE_PATH)
+        relative_path = os.path.relpath(os.path.abspath(report.pdf_path), storage_root)
+        prefix = settings.DOWNLOAD_ACCEL_PREFIX.rstrip("/")
+        headers["X-Accel-Redirect"] = quote(f"{prefix}/{relative_path}")
+    elif mode == "x-sendfile":
+        headers["X-Sendfile"] = os.path.abspath(report.pdf_path)
+    else:
+        logger.warning(f"Unknown DOWNLOAD_OFFLOAD_MODE '{settings.DOWNLOAD_OFFLOAD_MODE}', streaming through API")
+        return None
+
+    return Response(content=b"", media_type="application/pdf", headers=headers)
+
+@router.get("/{report_id}/download-url")
+async def get_report_download_url(report_id: str, current_user: User = Depends(get_current_user)):
+    """Get an expiring, signed download link for a report"""
+
+    report = await ReportLog.get(report_id)
+    if not report or report.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+
+    if report.status != ReportStatus.COMPLETED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Report is not ready for download",
+        )
+
+    params = create_signed_download_params(report_id)
+    return {
+        "url": f"/reports/{report_id}/download?{urlencode(params)}",
+        "expires_at": datetime.utcfromtimestamp(params["expires"]),
+    }
+
 @router.get("/{report_id}/download")
 async def download_report(
-    report_id: str
+    report_id: str,
+    expires: Optional[int] = None,
+    signature: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_current_user_optional),
 ):
+    """Download a report via a signed link or as its authenticated owner"""
     report = await ReportLog.get(report_id)
+    if not report:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+
+    is_owner = current_user is not None and (
+        report.user_id == str(current_user.id) or current_user.is_admin
+    )
+    if not is_owner and not verify_download_signature(report_id, expires, signature):
+        logger.warning(f"Rejected unauthorized download for report {report_id}")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Download link is invalid or has expired",
+        )
+
     if report.status != ReportStatus.COMPLETED or not report.pdf_path:
         logger.warning(f"Report not ready for download - status: {report.status}, pdf_path: {report.pdf_path}")
         raise HTTPException(
@@ -308,12 +694,122 @@ async def download_report(
     await report.save()
     logger.info(f"Download count incremented to: {report.download_count}")
 
+    offload_response = build_offload_response(report)
+    if offload_response is not None:
+        return offload_response
+
     return FileResponse(
         path=report.pdf_path,
         filename=f"{report.title}.pdf",
         media_type="application/pdf",
     )
 
+@router.get("/{report_id}/thumbnail")
+async def get_report_thumbnail(
+    report_id: str,
+    page: str = "cover",
+    format: Optional[str] = None,
+    expires: Optional[int] = None,
+    signature: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+):
+    """Serve a cached cover or first-page preview thumbnail for a report"""
+    fmt = (format or settings.THUMBNAIL_FORMAT).lower()
+    if page not in THUMBNAIL_PAGES or fmt not in THUMBNAIL_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid thumbnail request. Pages: {list(THUMBNAIL_PAGES)}, formats: {list(THUMBNAIL_MEDIA_TYPES)}",
+        )
+
+    report = await ReportLog.get(report_id)
+    if not report:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+
+    is_owner = current_user is not None and (
+        report.user_id == str(current_user.id) or current_user.is_admin
+    )
+    if not is_owner and not verify_download_signature(report_id, expires, signature):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Thumbnail link is invalid or has expired",
+        )
+
+    if report.status != ReportStatus.COMPLETED or not report.pdf_path or not os.path.exists(report.pdf_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report preview not available"
+        )
+
+    thumbnail_path = get_thumbnail_path(report.pdf_path, page, fmt)
+    if not os.path.exists(thumbnail_path):
+        # Reports rendered before thumbnails existed are backfilled on first request
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, generate_thumbnails, report.pdf_path, fmt)
+        if not os.path.exists(thumbnail_path):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Report preview not available"
+            )
+
+    # Completed reports never change, so the preview can be cached indefinitely
+    return FileResponse(
+        path=thumbnail_path,
+        media_type=THUMBNAIL_MEDIA_TYPES[fmt],
+        headers={"Cache-Control": "private, max-age=31536000, immutable"},
+    )
+
+@router.post("/{report_id}/cancel")
+async def cancel_report(report_id: str, current_user: User = Depends(get_current_user)):
+    """Cancel a pending or in-progress report and refund the unused tokens"""
+
+    report = await ReportLog.get(report_id)
+    if not report or report.user_id != str(current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Report not found"
+        )
+
+    now = datetime.utcnow()
+    if report.status == ReportStatus.PENDING:
+        # Not started yet: cancel outright with a full refund
+        result = await ReportLog.find_one({"_id": report.id, "status": ReportStatus.PENDING}).update(
+            {"$set": {
+                "status": ReportStatus.CANCELLED,
+                "cancel_requested": True,
+                "tokens_refunded": report.tokens_used,
+                "cancelled_at": now,
+                "updated_at": now,
+            }}
+        )
+        if result.modified_count:
+            await current_user.release_tokens(str(report.id), report.tokens_used)
+            await report.release_upgraded_draft()
+            logger.info(f"Cancelled pending report {report_id}, refunded {report.tokens_used} tokens")
+            return {
+                "message": f"Report cancelled. {report.tokens_used} tokens refunded.",
+                "status": ReportStatus.CANCELLED,
+                "tokens_refunded": report.tokens_used,
+            }
+        # Generation started in the meantime
+        report = await ReportLog.get(report_id)
+
+    if report.status == ReportStatus.PROCESSING:
+        await ReportLog.find_one({"_id": report.id, "status": ReportStatus.PROCESSING}).update(
+            {"$set": {"cancel_requested": True, "updated_at": now}}
+        )
+        cancel_event = _cancel_events.get(report_id)
+        if cancel_event is not None:
+            cancel_event.set()
+        logger.info(f"Cancellation requested for in-progress report {report_id}")
+        return {
+            "message": "Cancellation requested. Tokens for the sections not generated will be refunded.",
+            "status": ReportStatus.PROCESSING,
+        }
+
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Report cannot be cancelled in status '{report.status.value}'",
+    )
+
 @router.delete("/{report_id}")
 async def delete_report(report_id: str, current_user: User = Depends(get_current_user)):
     """Delete a report"""
@@ -328,6 +824,8 @@ async def delete_report(report_id: str, current_user: User = Depends(get_current
     if report.pdf_path and os.path.exists(report.pdf_path):
         os.remove(report.pdf_path)
         logger.info(f"Deleted PDF file: {report.pdf_path}")
+    if report.pdf_path:
+        delete_thumbnails(report.pdf_path)
 
     # Delete report from database
     await report.delete()
@@ -1,16 +1,14 @@
-from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi.responses import Response
 from typing import List
-import razorpay
 import hmac
 import hashlib
 import traceback
-import requests  # <-- Added import
 
 from app.core.security import get_current_user
 from app.core.config import settings
 from app.models.user import User
-from app.models.token import TokenPackage, TokenTransaction, UserTokenBalance, TokenTransactionStatus
+from app.models.token import TokenPackage, TokenTransaction, TokenTransactionStatus, UserTokenBalance
 from app.schemas.token import (
     TokenPackageResponse,
     TokenPurchaseCreate,
@@ -18,6 +16,10 @@ from app.schemas.token import (
     TokenPaymentVerification,
     UserTokenBalanceResponse
 )
+from app.services.geoip_service import currency_resolver
+from app.services.payment_gateway import create_order, fetch_payment_and_order
+from app.services.payment_service import complete_token_purchase
+from app.services.price_catalog import price_catalog
 
 router = APIRouter()
 
@@ -32,86 +34,17 @@ def get_client_ip(request: Request) -> str:
     return request.client.host
 
 
-def get_currency_from_ip(ip: str) -> str:
-    """
-    Fetches the currency code from the user's IP address using a free geolocation API.
-    Defaults to 'INR' for localhost (dev environment).
-    """
-    if ip in ("127.0.0.1", "::1", "localhost"):
-        return "INR"  # Local dev defaults to INR
-
-    try:
-        response = requests.get(f"http://ip-api.com/json/{ip}?fields=status,message,currency", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if data.get("status") == "success" and data.get("currency"):
-            return data["currency"]
-    except requests.RequestException as e:
-        print(f"IP Geolocation failed for IP {ip}: {e}")
-
-    return "INR"  # Fallback to INR (primary market)
-
-
-def get_exchange_rate(base_currency: str, target_currency: str) -> float:
-    """
-    Fetches the exchange rate from ExchangeRate-API.
-    Returns 1.0 on failure, effectively keeping the base currency price.
-    """
-    if base_currency == target_currency:
-        return 1.0
-
-    try:
-        api_key = settings.EXCHANGE_RATE_API_KEY
-        if not api_key:
-            raise ValueError("EXCHANGE_RATE_API_KEY is not configured in settings.")
-
-        url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/{base_currency}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if data.get("result") == "success" and target_currency in data.get("conversion_rates", {}):
-            return data["conversion_rates"][target_currency]
-    except (requests.RequestException, ValueError) as e:
-        print(f"Exchange rate fetch failed for {base_currency} to {target_currency}: {e}")
-
-    return 1.0  # Fallback rate
-
-
 # +++ END: New Helper Functions +++
 
 
-def get_razorpay_client():
-    """Get or create Razorpay client"""
-    try:
-        return razorpay.Client(
-            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-        )
-    except Exception as e:
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Payment gateway initialization failed: {str(e)}"
-        )
-
-
 @router.get("/packages", response_model=List[TokenPackageResponse])
-async def get_token_packages():
-    """Get all available token packages"""
-    packages = await TokenPackage.find({"is_active": True}).sort([("sort_order", 1)]).to_list()
-
-    return [
-        TokenPackageResponse(
-            id=str(package.id),
-            name=package.name,
-            package_type=package.package_type,
-            tokens=package.tokens,
-            price_inr=package.price_inr,
-            price_usd=package.price_usd,
-            description=package.description
-        )
-        for package in packages
-    ]
+async def get_token_packages(request: Request):
+    """Get all available token packages with their localized prices, from the price catalog"""
+    body = await price_catalog.get_body()
+    headers = {"ETag": price_catalog.etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("If-None-Match") == price_catalog.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/balance", response_model=UserTokenBalanceResponse)
@@ -123,6 +56,7 @@ async def get_user_token_balance(current_user: User = Depends(get_current_user))
         total_tokens=balance.total_tokens,
         used_tokens=balance.used_tokens,
         available_tokens=balance.available_tokens,
+        reserved_tokens=balance.reserved_tokens,
         updated_at=balance.updated_at
     )
 
@@ -135,11 +69,9 @@ async def create_token_purchase_order(
 ):
     """Create a Razorpay order for token purchase.
     - INR users: use price_inr directly (no conversion, no GST added on top).
-    - All others: convert price_inr → target currency via live exchange rate.
+    - All others: price_inr converted to the target currency, precomputed in the price catalog.
     """
     try:
-        razorpay_client = get_razorpay_client()
-
         package = await TokenPackage.get(order_data.package_id)
         if not package or not package.is_active:
             raise HTTPException(
@@ -156,23 +88,14 @@ async def create_token_purchase_order(
             target_currency = order_data.currency_hint
         else:
             client_ip = get_client_ip(request)
-            target_currency = get_currency_from_ip(client_ip)
-
-        if target_currency == "INR":
-            # INR: use stored INR price directly — exact, no conversion needed
-            final_amount_local = int(package.price_inr * 100)  # paise
-            final_currency = "INR"
-            exchange_rate = 1.0
-        else:
-            # Non-INR: convert from INR to target currency
-            exchange_rate = get_exchange_rate("INR", target_currency)
-            if exchange_rate == 1.0:
-                # Conversion failed — fall back to USD using stored price_usd
-                target_currency = "USD"
-                final_amount_local = int(package.price_usd * 100)  # cents
-            else:
-                final_amount_local = int((package.price_inr * exchange_rate) * 100)
-            final_currency = target_currency
+            target_currency = await currency_resolver.get_currency(client_ip)
+
+        # Precomputed: INR is the stored price, others are converted from INR, and
+        # currencies without a rate fall back to USD
+        price = await price_catalog.get_price(package, target_currency)
+        final_amount_local = price.amount
+        final_currency = price.currency
+        exchange_rate = price.exchange_rate
         # --- End Currency Logic ---
 
         import time
@@ -194,7 +117,17 @@ async def create_token_purchase_order(
             }
         }
 
-        order = razorpay_client.order.create(order_data_razorpay)
+        order = await create_order(order_data_razorpay)
+
+        # Pending until verify-payment or the webhook completes it, whichever comes first
+        await TokenTransaction(
+            user_id=str(current_user.id),
+            package_id=str(package.id),
+            package_name=package.name,
+            tokens_purchased=package.tokens,
+            amount_paid=order["amount"],
+            razorpay_order_id=order["id"],
+        ).insert()
 
         return TokenOrderResponse(
             order_id=order["id"],
@@ -222,8 +155,6 @@ async def verify_token_payment(
 ):
     """Verify token purchase payment"""
     try:
-        razorpay_client = get_razorpay_client()
-
         generated_signature = hmac.new(
             settings.RAZORPAY_KEY_SECRET.encode(),
             f"{payment_data.razorpay_order_id}|{payment_data.razorpay_payment_id}".encode(),
@@ -236,8 +167,9 @@ async def verify_token_payment(
                 detail="Invalid payment signature"
             )
 
-        payment = razorpay_client.payment.fetch(payment_data.razorpay_payment_id)
-        order = razorpay_client.order.fetch(payment_data.razorpay_order_id)
+        payment, order = await fetch_payment_and_order(
+            payment_data.razorpay_payment_id, payment_data.razorpay_order_id
+        )
 
         if payment["status"] != "captured":
             raise HTTPException(
@@ -254,23 +186,16 @@ async def verify_token_payment(
                 detail="Token package not found"
             )
 
-        transaction = TokenTransaction(
-            user_id=str(current_user.id),
-            package_id=str(package.id),
-            package_name=package.name,
-            tokens_purchased=package.tokens,
+        # Credits at most once per order, whether this or the webhook gets there first
+        await complete_token_purchase(
+            payment_data.razorpay_order_id,
+            payment_id=payment_data.razorpay_payment_id,
             amount_paid=payment["amount"],
-            razorpay_payment_id=payment_data.razorpay_payment_id,
-            razorpay_order_id=payment_data.razorpay_order_id,
-            razorpay_signature=payment_data.razorpay_signature,
-            status=TokenTransactionStatus.COMPLETED,
-            completed_at=datetime.utcnow()
+            signature=payment_data.razorpay_signature,
+            user_id=str(current_user.id),
+            package=package,
         )
 
-        await transaction.insert()
-
-        await current_user.add_tokens(package.tokens)
-
         return {"message": "Token purchase completed successfully", "tokens_added": package.tokens}
 
     except Exception as e:
@@ -283,10 +208,12 @@ async def verify_token_payment(
 
 @router.get("/transactions")
 async def get_user_token_transactions(current_user: User = Depends(get_current_user)):
-    """Get user's token transaction history"""
+    """Get user's completed token purchases; abandoned or unpaid checkouts are left out"""
     try:
-        transactions = await TokenTransaction.find({"user_id": str(current_user.id)}).sort(
-            [("created_at", -1)]).to_list()
+        transactions = await TokenTransaction.find({
+            "user_id": str(current_user.id),
+            "status": TokenTransactionStatus.COMPLETED,
+        }).sort([("created_at", -1)]).to_list()
 
         result = []
         for transaction in transactions:
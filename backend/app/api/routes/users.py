@@ -5,6 +5,7 @@ from app.core.security import get_current_user
 from app.models.user import User
 from app.models.report import ReportLog
 from app.schemas.user import UserResponse, UserUpdate, UserStats
+from app.services.balance_cache import token_balance_cache
 from datetime import datetime
 
 router = APIRouter()
@@ -64,6 +65,7 @@ async def delete_user_account(current_user: User = Depends(get_current_user)):
     from app.models.token import TokenTransaction, UserTokenBalance
     await TokenTransaction.find({"user_id": str(current_user.id)}).delete()
     await UserTokenBalance.find({"user_id": str(current_user.id)}).delete()
+    await token_balance_cache.invalidate(str(current_user.id))
     
     # Delete user account
     await current_user.delete()
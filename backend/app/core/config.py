@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Dict, List, Optional
 import os
 
 
@@ -21,6 +21,14 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
+    BALANCE_CACHE_ENABLED: bool = True
+    BALANCE_CACHE_TTL_SECONDS: int = 300  # shared copy in Redis
+    BALANCE_CACHE_LOCAL_TTL_SECONDS: float = 5.0  # per-worker copy in front of Redis
+    BALANCE_CACHE_LOCAL_SIZE: int = 10_000  # users kept per worker, least recently used evicted
+    BALANCE_CACHE_REDIS_TIMEOUT_SECONDS: float = 0.25
+    # After this many consecutive Redis errors, reads bypass the cache for a while
+    BALANCE_CACHE_BREAKER_FAILURES: int = 3
+    BALANCE_CACHE_BREAKER_SECONDS: float = 30.0
 
     # OAuth
     GOOGLE_CLIENT_ID: str
@@ -44,6 +52,12 @@ class Settings(BaseSettings):
     RAZORPAY_KEY_ID: str
     RAZORPAY_KEY_SECRET: str
     RAZORPAY_WEBHOOK_SECRET: str
+    RAZORPAY_POOL_SIZE: int = 10  # pooled connections and threads for gateway calls
+    RAZORPAY_TIMEOUT_SECONDS: float = 15.0
+    # Webhook inbox: events are stored on receipt and processed by a background worker
+    WEBHOOK_POLL_SECONDS: float = 5.0
+    WEBHOOK_MAX_ATTEMPTS: int = 5
+    WEBHOOK_LOCK_SECONDS: float = 300.0  # a processing claim older than this is retried
 
     # OpenAI - CRITICAL: This must be set correctly
     OPENAI_API_KEY: str
@@ -78,12 +92,131 @@ class Settings(BaseSettings):
     # File upload
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = ["pdf", "docx", "txt"]
+    # Supporting documents attached to report requests
+    DOCUMENTS_STORAGE_PATH: str = "uploads"
+    DOCUMENT_EXTRACTION_WORKERS: int = 2  # processes running PyPDF2 text extraction
+    DOCUMENT_EXTRACTION_TIMEOUT_SECONDS: float = 120.0
+    MAX_DOCUMENTS_PER_REPORT: int = 5
+    DOCUMENT_INDEX_MAX_CHARS: int = 2_000_000  # text indexed per document
+    # Per-report BM25 retrieval: each section prompt gets the top-k chunks for its title
+    CONTEXT_CHUNK_WORDS: int = 200
+    CONTEXT_CHUNK_OVERLAP_WORDS: int = 40
+    CONTEXT_TOP_K: int = 5
 
     FRONTEND_URL:str = "https://assesme.com"
     # Report generation
     REPORTS_STORAGE_PATH: str = "reports"
     MAX_REPORTS_FREE_USERS: int = 1
+    # Report scheduler
+    REPORT_MAX_CONCURRENT_JOBS: int = 2  # per API worker
+    REPORT_MAX_CONCURRENT_PER_USER: int = 1
+    # Drafts run in their own slots (per API worker) with their own per-user cap, so they
+    # never wait behind full reports
+    REPORT_DRAFT_SLOTS: int = 1
+    REPORT_MAX_CONCURRENT_DRAFTS_PER_USER: int = 1
+    REPORT_SCHEDULER_POLL_SECONDS: float = 5.0
+    # Reports queued longer than this jump ahead of fair-share ordering
+    REPORT_STARVATION_SECONDS: int = 15 * 60
+    # Running reports older than this are cancelled, refunding the sections not generated
+    REPORT_JOB_TIMEOUT_SECONDS: int = 2 * 60 * 60
+    # A worker renews the lease of each report it runs; reports whose lease lapses
+    # (worker restarted or crashed) are requeued, then failed and refunded
+    REPORT_HEARTBEAT_SECONDS: float = 30.0
+    REPORT_LEASE_SECONDS: int = 180
+    REPORT_MAX_DISPATCH_ATTEMPTS: int = 2
+    REPORT_RECOVERY_SECONDS: float = 60.0
+    # Batches still preparing after this long lost their worker: prepared again, then failed and refunded
+    BATCH_PREPARE_TIMEOUT_SECONDS: int = 30 * 60
+    BATCH_MAX_PREPARE_RETRIES: int = 1
+    # Admission control and ETA prediction
+    REPORT_WORKER_COUNT: int = 4  # API workers running the scheduler (gunicorn --workers)
+    REPORT_DEFAULT_SECTION_SECONDS: float = 30.0  # until enough reports have completed
+    REPORT_MAX_QUEUE_DEPTH: int = 50
+    REPORT_MAX_QUEUE_WAIT_SECONDS: int = 30 * 60
+    REPORT_MIN_RETRY_AFTER_SECONDS: int = 60
+    # Fair-share weights per priority class; a higher weight gets a larger share
+    REPORT_PRIORITY_WEIGHTS: Dict[str, float] = {"paid": 2.0, "standard": 1.0}
+    # How often a running report checks for a cancel request made on another worker
+    REPORT_CANCEL_POLL_SECONDS: float = 2.0
+
+    # Draft reports: one structured call on a fast model
+    DRAFT_REPORT_MODEL: str = "gpt-4.1-mini"
+    DRAFT_REPORT_TIMEOUT_SECONDS: float = 12.0
+
+    # Offline reports: section prompts go through a bulk LLM API at a discount
+    OFFLINE_REPORTS_ENABLED: bool = True
+    OFFLINE_REPORT_EXPECTED_SECONDS: int = 6 * 3600
+    # "openai" (Batch API) or "local" (file-based stand-in for development and tests)
+    BULK_LLM_BACKEND: str = "openai"
+    BULK_LLM_POLL_SECONDS: float = 300.0  # also how often pending offline reports are collected
+    BULK_LLM_MAX_REQUESTS_PER_FILE: int = 5000
+    BULK_LLM_WORK_DIR: str = "./bulk_jobs"
+    # A job still collecting after this long lost its worker; its reports are collected again
+    BULK_LLM_COLLECT_TIMEOUT_SECONDS: int = 3600
+    # Local backend: answer with placeholder sections after this delay; None waits for an output file
+    BULK_LLM_LOCAL_COMPLETE_AFTER_SECONDS: Optional[float] = 0.0
+
+    # LLM token estimation and the hard per-report LLM token budget
+    REPORT_EXPECTED_COMPLETION_TOKENS: int = 2000  # per section, for the upfront estimate
+    REPORT_SECTION_MAX_TOKENS: int = 4096
+    REPORT_LLM_TOKENS_PER_CREDIT: int = 60  # budget = report price in tokens x this
+    # Sections are skipped once less than this is left for the completion
+    REPORT_MIN_SECTION_COMPLETION_TOKENS: int = 512
+
+    # Patent retrieval: the local corpus of earlier SerpApi results is searched first
+    PATENT_SEARCH_RESULTS: int = 10
+    PATENT_CORPUS_MIN_RESULTS: int = 5  # fewer local matches than this falls back to SerpApi
+    PATENT_CORPUS_MIN_TERM_MATCH: float = 0.6  # share of query terms a patent must match
+    # Patent details (abstract, claims, CPC codes), fetched concurrently and cached in the corpus
+    PATENT_DETAIL_CONCURRENCY: int = 10
+    PATENT_DETAIL_TIMEOUT_SECONDS: float = 8.0
+    PATENT_DETAIL_CACHE_DAYS: int = 90
+    PATENT_DETAIL_ABSTRACT_CHARS: int = 1500
+    PATENT_DETAIL_MAX_CLAIMS: int = 3
+    PATENT_DETAIL_CLAIM_CHARS: int = 600
+
+    # Section generation deadlines and hedged LLM requests
+    SECTION_DEADLINE_SECONDS: float = 240.0
+    # A stream that sends nothing for this long is dropped (also bounds the wait for headers)
+    SECTION_STREAM_IDLE_SECONDS: float = 60.0
+    SECTION_HEDGE_ENABLED: bool = True
+    # Fire a duplicate request once a section runs longer than this latency percentile
+    SECTION_HEDGE_PERCENTILE: float = 0.95
+    SECTION_HEDGE_DEFAULT_DELAY_SECONDS: float = 90.0
+    SECTION_HEDGE_MIN_DELAY_SECONDS: float = 20.0
+    SECTION_HEDGE_MIN_SAMPLES: int = 20
+
+    # PDF size optimization: "none", "screen", "ebook" or "print"
+    PDF_OPTIMIZATION_PRESET: str = "ebook"
+    # Also render an unoptimized copy in memory to record the before/after size (renders twice)
+    PDF_MEASURE_ORIGINAL_SIZE: bool = False
+
+    # Report thumbnails
+    THUMBNAIL_WIDTH: int = 320
+    THUMBNAIL_FORMAT: str = "webp"
+    THUMBNAIL_QUALITY: int = 80
+
+    # Report downloads
+    DOWNLOAD_URL_EXPIRE_SECONDS: int = 15 * 60
+    # None streams through the API, "x-accel-redirect" (nginx) or "x-sendfile" (apache/lighttpd)
+    DOWNLOAD_OFFLOAD_MODE: Optional[str] = None
+    # Internal nginx location that aliases REPORTS_STORAGE_PATH
+    DOWNLOAD_ACCEL_PREFIX: str = "/protected-reports"
     EXCHANGE_RATE_API_KEY:str
+    # Rates are cached per base currency and refreshed in the background
+    EXCHANGE_RATE_REFRESH_SECONDS: float = 6 * 3600
+    EXCHANGE_RATE_TIMEOUT_SECONDS: float = 5.0
+    EXCHANGE_RATE_CACHE_PATH: str = "./exchange_rates.json"  # last-known-good rates
+    # Checkout currency from the client IP: a local MaxMind-format country database,
+    # provisioned with download_geoip_database.py
+    GEOIP_DATABASE_PATH: Optional[str] = "./GeoLite2-Country.mmdb"
+    GEOIP_CACHE_SIZE: int = 10_000  # /24 or /48 prefixes
+    GEOIP_REMOTE_FALLBACK: bool = True  # ask ip-api.com when the database has no answer
+    GEOIP_REMOTE_TIMEOUT_SECONDS: float = 2.0
+    # Localized package prices, precomputed for these currencies
+    PRICE_CATALOG_CURRENCIES: List[str] = ["INR", "USD", "EUR", "GBP", "AED", "SGD", "AUD", "CAD"]
+    PRICE_CATALOG_REFRESH_SECONDS: float = 60.0  # how often package changes are picked up
+
     class Config:
         env_file = ".env"
         case_sensitive = True
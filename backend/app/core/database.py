@@ -4,14 +4,36 @@ import logging
 
 from app.core.config import settings
 from app.models.user import User
-from app.models.report import ReportLog
+from app.models.report import ReportLog, ReportBatch, BulkLLMJob
 from app.models.contact import ContactSubmission
-from app.models.token import TokenPackage, TokenTransaction, UserTokenBalance
+from app.models.document import SupportingDocument
+from app.models.patent import PatentRecord
+from app.models.token import TokenPackage, TokenTransaction, UserTokenBalance, RazorpayWebhookEvent
 from app.models.blog import BlogPost
 from app.models.onboarding import InvestorRegistration, TechnologySubmission, PrototypeInquiry, InvestorDraft, TechnologyDraft
 
 logger = logging.getLogger(__name__)
 
+DOCUMENT_MODELS = [
+    User,
+    ReportLog,
+    ReportBatch,
+    BulkLLMJob,
+    SupportingDocument,
+    PatentRecord,
+    ContactSubmission,
+    TokenPackage,
+    TokenTransaction,
+    UserTokenBalance,
+    RazorpayWebhookEvent,
+    BlogPost,
+    InvestorRegistration,
+    TechnologySubmission,
+    PrototypeInquiry,
+    InvestorDraft,
+    TechnologyDraft,
+]
+
 class Database:
     client: AsyncIOMotorClient = None
 
@@ -29,20 +51,7 @@ async def init_database():
         # Initialize Beanie with models
         await init_beanie(
             database=db.client[settings.DATABASE_NAME],
-            document_models=[
-                User,
-                ReportLog,
-                ContactSubmission,
-                TokenPackage,
-                TokenTransaction,
-                UserTokenBalance,
-                BlogPost,
-                InvestorRegistration,
-                TechnologySubmission,
-                PrototypeInquiry,
-                InvestorDraft,
-                TechnologyDraft,
-            ]
+            document_models=DOCUMENT_MODELS,
         )
         
         logger.info("Database initialized successfully")
@@ -4,7 +4,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+import hashlib
+import hmac
 import secrets
+import time
 import traceback
 import logging
 
@@ -15,6 +18,7 @@ logger = logging.getLogger(__name__)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 import bcrypt
 
@@ -115,6 +119,38 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         raise credentials_exception
 
 
+async def get_current_user_optional(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[User]:
+    """Get current user if a valid bearer token is present, otherwise None"""
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+
+def create_download_signature(report_id: str, expires: int) -> str:
+    """Create an HMAC signature binding a report download to an expiry timestamp"""
+    message = f"download:{report_id}:{expires}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+
+def create_signed_download_params(report_id: str, expires_in: Optional[int] = None) -> dict:
+    """Create query params for an expiring, signed report download link"""
+    expires = int(time.time()) + (expires_in or settings.DOWNLOAD_URL_EXPIRE_SECONDS)
+    return {"expires": expires, "signature": create_download_signature(report_id, expires)}
+
+
+def verify_download_signature(report_id: str, expires: Optional[int], signature: Optional[str]) -> bool:
+    """Verify a signed report download link has not expired or been tampered with"""
+    if not expires or not signature:
+        return False
+    if expires < int(time.time()):
+        return False
+    expected = create_download_signature(report_id, expires)
+    return hmac.compare_digest(expected, signature)
+
+
 async def require_admin(current_user: User = Depends(get_current_user)) -> User:
     """Require the current user to have is_admin=True"""
     if not current_user.is_admin:
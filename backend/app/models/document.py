@@ -0,0 +1,37 @@
+from beanie import Document, Indexed
+from pydantic import Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class DocumentStatus(str, Enum):
+    PROCESSING = "processing"
+    READY = "ready"
+    FAILED = "failed"
+
+class SupportingDocument(Document):
+    user_id: Indexed(str) = Field(..., description="User who uploaded the document")
+    filename: str = Field(..., max_length=255)
+    file_type: str = Field(..., description="One of ALLOWED_FILE_TYPES")
+    file_size: int
+
+    # Files are stored and their extracted text cached by SHA-256 of the content
+    content_hash: Indexed(str) = Field(..., description="SHA-256 of the uploaded bytes")
+
+    # Text extraction
+    status: DocumentStatus = DocumentStatus.PROCESSING
+    page_count: Optional[int] = None
+    text_chars: Optional[int] = None
+    error_message: Optional[str] = None
+
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "supporting_documents"
+        indexes = [
+            "user_id",
+            "content_hash",
+            [("user_id", 1), ("created_at", -1)],
+        ]
@@ -0,0 +1,53 @@
+from beanie import Document, Indexed
+from pydantic import Field
+from typing import Optional, List
+from datetime import datetime
+
+class PatentRecord(Document):
+    """A patent retrieved through SerpApi, kept so later reports can find it locally"""
+    patent_number: Indexed(str, unique=True)
+    patent_id: Optional[str] = None  # SerpApi id for the details endpoint
+    title: Optional[str] = None
+    assignee: Optional[str] = None
+    inventor: Optional[str] = None
+    grant_status: Optional[str] = None
+    filing_date: Optional[str] = None
+    link: Optional[str] = None
+    snippet: Optional[str] = None
+
+    # Details, cached from the google_patents_details endpoint
+    abstract: Optional[str] = None
+    claims: List[str] = Field(default_factory=list)
+    cpc_codes: List[str] = Field(default_factory=list)
+    details_fetched_at: Optional[datetime] = None
+
+    # Inverted index: normalized terms from the title, assignee and snippet plus the
+    # search queries that returned the patent (topic labels) and CPC codes once details are fetched
+    keywords: List[str] = Field(default_factory=list)
+    queries: List[str] = Field(default_factory=list)
+
+    # Analytics
+    times_retrieved: int = 0
+    first_seen: datetime = Field(default_factory=datetime.utcnow)
+    last_seen: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "patents"
+        indexes = [
+            "keywords",
+            "last_seen",
+        ]
+
+    def to_patent_data(self) -> dict:
+        """The shape report prompts expect, as returned by the SerpApi search"""
+        return {
+            "patent_number": self.patent_number,
+            "patent_id": self.patent_id,
+            "title": self.title,
+            "assignee": self.assignee,
+            "inventor": self.inventor,
+            "grant_status": self.grant_status,
+            "filing_date": self.filing_date,
+            "link": self.link,
+            "snippet": self.snippet,
+        }
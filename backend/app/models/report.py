@@ -1,6 +1,6 @@
-from beanie import Document, Indexed
+from beanie import Document, Indexed, PydanticObjectId
 from pydantic import Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
 
@@ -15,32 +15,59 @@ class ReportStatus(str, Enum):
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 class ReportComplexity(str, Enum):
+    DRAFT = "draft"
     BASIC = "basic"
     ADVANCED = "advanced"
     COMPREHENSIVE = "comprehensive"
+    CUSTOM = "custom"
+
+class ReportGenerationMode(str, Enum):
+    STANDARD = "standard"
+    OFFLINE = "offline"
 class ReportLog(Document):
     user_id: Indexed(str) = Field(..., description="User who generated the report")
+    batch_id: Optional[str] = Field(None, description="Batch this report was submitted in")
     
     # Report details
     report_type: ReportType = ReportType.TECHNOLOGY_ASSESSMENT
     complexity: ReportComplexity = ReportComplexity.BASIC
+    sections: Optional[List[str]] = Field(None, description="Section titles picked for a custom report")
+    document_ids: List[str] = Field(default_factory=list, description="Supporting documents used as context")
     title: str = Field(..., description="Report title")
     idea: str = Field(..., description="Original idea/input for the report")
     
     # Token information
     tokens_used: int = Field(..., description="Tokens consumed for this report")
-    tokens_estimated: Optional[int] = Field(None, description="Estimated tokens before generation")
+    tokens_estimated: Optional[int] = Field(None, description="LLM tokens estimated from the section prompts before generation")
     
     # Generation status
     status: ReportStatus = ReportStatus.PENDING
     error_message: Optional[str] = None
     
+    # Scheduling
+    generation_mode: ReportGenerationMode = ReportGenerationMode.STANDARD
+    bulk_job_id: Optional[str] = Field(None, description="Bulk LLM job generating an offline report's sections")
+    priority_class: str = "standard"
+    virtual_finish: Optional[float] = Field(None, description="Weighted fair queuing finish tag")
+    dispatched_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = Field(None, description="Last lease renewal by the worker running the report")
+    dispatch_attempts: int = 0
+    queue_wait_seconds: Optional[float] = None
+    estimated_completion_at: Optional[datetime] = None
+    
+    # Cancellation
+    cancel_requested: bool = False
+    cancelled_at: Optional[datetime] = None
+    tokens_refunded: int = 0
+    
     # File storage
     pdf_url: Optional[str] = None
     pdf_path: Optional[str] = None
     file_size: Optional[int] = None
+    original_file_size: Optional[int] = Field(None, description="PDF size before optimization")
     
     # AI generation details with token usage
     openai_usage: Optional[Dict[str, Any]] = Field(None, description="OpenAI API usage details including token counts")
@@ -74,6 +101,9 @@ class ReportLog(Document):
             "created_at",
             [("user_id", 1), ("created_at", -1)],
             [("user_id", 1), ("status", 1)],
+            [("status", 1), ("dispatched_at", 1), ("virtual_finish", 1)],
+            "batch_id",
+            [("generation_mode", 1), ("status", 1), ("bulk_job_id", 1)],
         ]
     
     def mark_completed(self, pdf_url: str, pdf_path: str, file_size: int):
@@ -91,6 +121,26 @@ class ReportLog(Document):
         self.error_message = error_message
         self.updated_at = datetime.utcnow()
     
+    def mark_cancelled(self, tokens_refunded: int):
+        """Mark report as cancelled"""
+        self.status = ReportStatus.CANCELLED
+        self.tokens_refunded = tokens_refunded
+        self.cancelled_at = datetime.utcnow()
+        self.updated_at = datetime.utcnow()
+    
+    async def release_upgraded_draft(self):
+        """
+        Let the draft this report was upgraded from be upgraded again, after the report
+        failed or was cancelled and its tokens were refunded. Matches "pending" too, for a
+        report that ended before the upgrade recorded its id.
+        """
+        draft_id = self.metadata.get("upgraded_from")
+        if not draft_id:
+            return
+        await ReportLog.find_one(
+            {"_id": PydanticObjectId(draft_id), "metadata.upgraded_to": {"$in": [str(self.id), "pending"]}}
+        ).update({"$unset": {"metadata.upgraded_to": ""}, "$set": {"updated_at": datetime.utcnow()}})
+
     def increment_download(self):
         """Increment download count"""
         self.download_count += 1
@@ -102,9 +152,126 @@ class ReportLog(Document):
             "pdf_path",
             "metadata"
         })
+class ReportBatchStatus(str, Enum):
+    PREPARING = "preparing"
+    QUEUED = "queued"
+    FAILED = "failed"
+
+class ReportBatch(Document):
+    user_id: Indexed(str) = Field(..., description="User who submitted the batch")
+    name: Optional[str] = None
+    complexity: ReportComplexity = ReportComplexity.BASIC
+    sections: Optional[List[str]] = None
+    report_ids: List[str] = Field(default_factory=list)
+    tokens_used: int = Field(..., description="Tokens consumed for the whole batch")
+    
+    # Shared research: one keyword extraction call and one patent search per unique query
+    status: ReportBatchStatus = ReportBatchStatus.PREPARING
+    unique_queries: int = 0
+    prepare_retries: int = 0  # times preparation was rerun after its worker died
+    error_message: Optional[str] = None
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "report_batches"
+        indexes = [
+            "user_id",
+            [("user_id", 1), ("created_at", -1)],
+            [("status", 1), ("updated_at", 1)],
+        ]
+
+class BulkJobStatus(str, Enum):
+    COLLECTING = "collecting"
+    SUBMITTED = "submitted"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class BulkLLMJob(Document):
+    backend: str = Field(..., description="Bulk LLM backend the requests were submitted to")
+    provider_job_id: Optional[str] = None
+    status: BulkJobStatus = BulkJobStatus.COLLECTING
+    report_ids: List[str] = Field(default_factory=list)
+    request_count: int = 0
+    input_path: Optional[str] = None
+    error_message: Optional[str] = None
+    
+    # Timestamps
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    submitted_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "bulk_llm_jobs"
+        indexes = [
+            "status",
+            "created_at",
+        ]
+
 # Token requirements for different report types
 REPORT_TOKEN_REQUIREMENTS = {
+    ReportComplexity.DRAFT: 500,
     ReportComplexity.BASIC: 2500,
     ReportComplexity.ADVANCED: 7500,
     ReportComplexity.COMPREHENSIVE: 9000
-}
\ No newline at end of file
+}
+
+# Report structure (number-less section titles) for each complexity level
+ALL_SECTION_TITLES = [
+    "Executive Summary", "Problem / Opportunity Statement", "Technology Overview",
+    "Unique Selling Proposition (USP) & Key Benefits", "Applications & Use-Cases", "IP Snapshot",
+    "Next Steps & Development Suggestions", "Expanded Executive Summary",
+    "Problem & Solution Fit (Validated Background)", "Technical Feasibility & TRL", "IP Summary & Landscape",
+    "Market Signals & Traction", "Competitive Intelligence", "Regulatory & Compliance Overview",
+    "Risk Summary & Open Questions", "Business Case & Commercial Viability", "Market Analysis & Forecasts",
+    "Business Models", "Financial Overview & ROI Projection", "Funding Strategy", "Licensing & Exit Strategy",
+    "Team & Strategic Resource Planning", "Implementation Roadmap", "Appendices", "Conclusion", "References"
+]
+
+SECTION_MAPPING = {
+    ReportComplexity.BASIC: [ALL_SECTION_TITLES[i] for i in [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,24,25]],
+    ReportComplexity.ADVANCED: [ALL_SECTION_TITLES[i] for i in [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,18,24,25]],
+    ReportComplexity.COMPREHENSIVE: ALL_SECTION_TITLES
+}
+
+# Drafts cover these sections at outline level in a single LLM call
+DRAFT_SECTION_TITLES = [ALL_SECTION_TITLES[i] for i in [0,1,2,4,5,11,14,6]]
+
+# Custom reports are priced per selected section at the basic tier's rate, plus a small
+# base fee, so a custom report never costs more than a tier covering its sections
+CUSTOM_REPORT_BASE_TOKENS = 200
+CUSTOM_REPORT_TOKENS_PER_SECTION = (
+    (REPORT_TOKEN_REQUIREMENTS[ReportComplexity.BASIC] - CUSTOM_REPORT_BASE_TOKENS)
+    // len(SECTION_MAPPING[ReportComplexity.BASIC])
+)  # 135
+
+# Share of the price taken off reports generated through the offline bulk LLM path
+OFFLINE_REPORT_DISCOUNT = 0.5
+
+
+def get_report_sections(complexity: ReportComplexity, sections: Optional[List[str]] = None) -> List[str]:
+    """Section titles generated for a report, in canonical report order"""
+    if complexity == ReportComplexity.CUSTOM:
+        selected = set(sections or [])
+        return [title for title in ALL_SECTION_TITLES if title in selected]
+    return SECTION_MAPPING.get(complexity, [])
+
+
+def get_report_token_requirement(complexity: ReportComplexity, sections: Optional[List[str]] = None,
+                                 offline: bool = False) -> int:
+    """Tokens charged for a report; custom reports scale with the number of sections picked"""
+    if complexity == ReportComplexity.CUSTOM:
+        selected = get_report_sections(complexity, sections)
+        tokens = CUSTOM_REPORT_BASE_TOKENS + len(selected) * CUSTOM_REPORT_TOKENS_PER_SECTION
+        # Never more than the cheapest tier that includes every selected section
+        covering = [REPORT_TOKEN_REQUIREMENTS[tier] for tier, titles in SECTION_MAPPING.items()
+                    if set(selected) <= set(titles)]
+        tokens = min([tokens, *covering])
+    else:
+        tokens = REPORT_TOKEN_REQUIREMENTS.get(complexity, 2500)
+    if offline:
+        tokens = int(tokens * (1 - OFFLINE_REPORT_DISCOUNT))
+    return tokens
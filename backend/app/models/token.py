@@ -1,6 +1,7 @@
-from beanie import Document
+from beanie import Document, Indexed
 from pydantic import Field
-from typing import Optional
+from pymongo import ASCENDING, IndexModel
+from typing import Dict, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -93,23 +94,67 @@ class TokenTransaction(Document):
             "status",
             "created_at",
             [("user_id", 1), ("created_at", -1)],
+            # One transaction per order, so a purchase can only be credited once
+            IndexModel(
+                [("razorpay_order_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"razorpay_order_id": {"$type": "string"}},
+            ),
+            "razorpay_payment_id",
+        ]
+
+
+class WebhookEventStatus(str, Enum):
+    RECEIVED = "received"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
+
+class RazorpayWebhookEvent(Document):
+    """A verified Razorpay webhook delivery, stored before it is processed"""
+    event_id: Indexed(str, unique=True) = Field(..., description="X-Razorpay-Event-Id, or a hash of the body")
+    event: str = Field(..., description="Event type, e.g. payment.captured")
+    body: str = Field(..., description="Raw request body as signed by Razorpay")
+
+    status: WebhookEventStatus = WebhookEventStatus.RECEIVED
+    attempts: int = 0
+    error_message: Optional[str] = None
+
+    # Timestamps
+    received_at: datetime = Field(default_factory=datetime.utcnow)
+    locked_at: Optional[datetime] = None
+    processed_at: Optional[datetime] = None
+
+    class Settings:
+        name = "razorpay_webhook_events"
+        indexes = [
+            [("status", 1), ("received_at", 1)],
         ]
 
 
+# Tokens credited when a user's balance is first created
+SIGNUP_BONUS_TOKENS = 3000
+
+
 class UserTokenBalance(Document):
-    user_id: str = Field(..., description="User ID", unique=True)
+    user_id: Indexed(str, unique=True) = Field(..., description="User ID")
     total_tokens: int = Field(default=0, description="Total tokens purchased")
     used_tokens: int = Field(default=0, description="Tokens used")
     available_tokens: int = Field(default=0, description="Available tokens")
+    reserved_tokens: int = Field(default=0, description="Tokens held for reports still generating")
+    # Open reservations, report id -> tokens held; settled atomically on completion or failure
+    reservations: Dict[str, int] = Field(default_factory=dict)
+    # Purchases credited, order id -> tokens; an order is credited at most once
+    credited_orders: Dict[str, int] = Field(default_factory=dict)
+    # Bumped by every update, so cached copies can tell which is newer
+    version: int = 0
     # Timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Settings:
         name = "user_token_balances"
-        indexes = [
-            "user_id",
-        ]
 
     def add_tokens(self, tokens: int):
         """Add tokens to user balance"""
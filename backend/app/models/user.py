@@ -1,4 +1,5 @@
-from beanie import Document, Indexed
+from beanie import Document, Indexed, UpdateResponse
+from pymongo.errors import DuplicateKeyError
 from pydantic import Field, EmailStr
 from typing import Optional, Dict, Any
 from datetime import datetime
@@ -51,15 +52,55 @@ class User(Document):
         ]
     
     async def get_token_balance(self):
-        """Get user's token balance"""
+        """
+        Get user's token balance, creating it with the signup bonus on first use. Served
+        from the balance cache when possible, otherwise one find-and-upsert round trip;
+        the unique index on user_id keeps it to one document.
+        """
+        from app.models.token import SIGNUP_BONUS_TOKENS, UserTokenBalance
+        from app.services.balance_cache import token_balance_cache
+
+        balance = await token_balance_cache.get(str(self.id))
+        if balance:
+            return balance
+
+        now = datetime.utcnow()
+        upsert = {"$setOnInsert": {
+            "total_tokens": SIGNUP_BONUS_TOKENS,
+            "used_tokens": 0,
+            "available_tokens": SIGNUP_BONUS_TOKENS,
+            "reserved_tokens": 0,
+            "reservations": {},
+            "credited_orders": {},
+            "version": 0,
+            "created_at": now,
+            "updated_at": now,
+        }}
+        try:
+            balance = await UserTokenBalance.find_one({"user_id": str(self.id)}).update(
+                upsert, upsert=True, response_type=UpdateResponse.NEW_DOCUMENT
+            )
+        except DuplicateKeyError:
+            # A concurrent request created the balance first
+            balance = await UserTokenBalance.find_one({"user_id": str(self.id)})
+        await token_balance_cache.set(balance, publish=False)
+        return balance
+
+    async def _update_token_balance(self, query: Dict[str, Any], update: Dict[str, Any]):
+        """
+        Apply one atomic update to the user's balance, bumping its version, and write the
+        new balance through to the cache. None if query matched nothing.
+        """
         from app.models.token import UserTokenBalance
-        
-        balance = await UserTokenBalance.find_one({"user_id": str(self.id)})
-        if not balance:
-            # Create initial balance
-            balance = UserTokenBalance(user_id=str(self.id))
-            balance.add_tokens(3000)
-            await balance.insert()
+        from app.services.balance_cache import token_balance_cache
+
+        update = {**update, "$inc": {**update.get("$inc", {}), "version": 1}}
+        update["$set"] = {**update.get("$set", {}), "updated_at": datetime.utcnow()}
+        balance = await UserTokenBalance.find_one({"user_id": str(self.id), **query}).update(
+            update, response_type=UpdateResponse.NEW_DOCUMENT
+        )
+        if balance:
+            await token_balance_cache.set(balance)
         return balance
     
     async def can_generate_report(self, tokens_required: int) -> bool:
@@ -67,19 +108,62 @@ class User(Document):
         balance = await self.get_token_balance()
         return balance.can_use_tokens(tokens_required)
     
-    async def use_tokens(self, tokens: int) -> bool:
-        """Use tokens for report generation"""
-        balance = await self.get_token_balance()
-        if balance.use_tokens(tokens):
-            await balance.save()
-            return True
-        return False
-    
-    async def add_tokens(self, tokens: int):
-        """Add tokens to user balance"""
-        balance = await self.get_token_balance()
-        balance.add_tokens(tokens)
-        await balance.save()
+    async def reserve_tokens(self, reservations: Dict[str, int]) -> bool:
+        """
+        Hold tokens for one or more reports (report id -> tokens) in a single conditional
+        $inc, so concurrent requests can't overdraw the balance. False if too few are available.
+        """
+        total = sum(reservations.values())
+        query = {"available_tokens": {"$gte": total}}
+        update = {
+            "$inc": {"available_tokens": -total, "reserved_tokens": total},
+            "$set": {f"reservations.{report_id}": tokens for report_id, tokens in reservations.items()},
+        }
+        balance = await self._update_token_balance(query, update)
+        if balance is None:
+            # The balance may not exist yet for a new user
+            await self.get_token_balance()
+            balance = await self._update_token_balance(query, update)
+        return balance is not None
+
+    async def settle_tokens(self, report_id: str, tokens_reserved: int, tokens_consumed: int) -> bool:
+        """
+        Close a report's reservation: tokens_consumed become used, the rest return to the
+        available balance. One conditional update; False if the reservation was already settled.
+        """
+        balance = await self._update_token_balance(
+            {f"reservations.{report_id}": tokens_reserved},
+            {
+                "$inc": {
+                    "reserved_tokens": -tokens_reserved,
+                    "used_tokens": tokens_consumed,
+                    "available_tokens": tokens_reserved - tokens_consumed,
+                },
+                "$unset": {f"reservations.{report_id}": ""},
+            },
+        )
+        return balance is not None
+
+    async def commit_tokens(self, report_id: str, tokens: int) -> bool:
+        """Charge a completed report's reserved tokens"""
+        return await self.settle_tokens(report_id, tokens, tokens)
+
+    async def release_tokens(self, report_id: str, tokens: int, tokens_consumed: int = 0) -> bool:
+        """Return a failed or cancelled report's reserved tokens, less any consumed share"""
+        return await self.settle_tokens(report_id, tokens, tokens_consumed)
+
+    async def add_tokens(self, tokens: int, order_id: Optional[str] = None) -> bool:
+        """
+        Add tokens to user balance. With order_id the order is recorded in the same update
+        and credited at most once; False if it was already credited.
+        """
+        await self.get_token_balance()
+        query = {}
+        update = {"$inc": {"total_tokens": tokens, "available_tokens": tokens}}
+        if order_id:
+            query = {f"credited_orders.{order_id}": {"$exists": False}}
+            update["$set"] = {f"credited_orders.{order_id}": tokens}
+        return await self._update_token_balance(query, update) is not None
     
     def update_last_login(self):
         """Update last login timestamp"""
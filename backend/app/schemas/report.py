@@ -1,7 +1,29 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, validator
+from typing import Dict, List, Optional
 from datetime import datetime
-from app.models.report import ReportStatus, ReportType, ReportComplexity
+from app.models.report import ReportStatus, ReportType, ReportComplexity, ALL_SECTION_TITLES
+from app.models.document import DocumentStatus
+
+MAX_BATCH_REPORTS = 50
+
+
+def validate_custom_sections(sections: Optional[List[str]], complexity: Optional[ReportComplexity]):
+    if complexity != ReportComplexity.CUSTOM:
+        if sections:
+            raise ValueError('Sections can only be chosen for custom reports')
+        return None
+    if not sections:
+        raise ValueError('Choose at least one section for a custom report')
+    unknown = [title for title in sections if title not in ALL_SECTION_TITLES]
+    if unknown:
+        raise ValueError(f'Unknown sections: {", ".join(unknown)}')
+    return list(dict.fromkeys(sections))
+
+
+def validate_offline_complexity(offline: bool, complexity: Optional[ReportComplexity]):
+    if offline and complexity == ReportComplexity.DRAFT:
+        raise ValueError('Draft reports are always generated right away')
+    return offline
 
 
 class ReportCreate(BaseModel):
@@ -11,6 +33,46 @@ class ReportCreate(BaseModel):
     complexity: ReportComplexity = Field(
         ReportComplexity.BASIC, description="Report complexity level"
     )
+    sections: Optional[List[str]] = Field(
+        None, description="Section titles to generate for a custom report"
+    )
+    allow_deferred: bool = Field(
+        False, description="Queue the report even when generation is over capacity"
+    )
+    offline: bool = Field(
+        False, description="Generate at a discount through the offline bulk path (may take hours)"
+    )
+    document_ids: List[str] = Field(
+        default_factory=list, description="Uploaded supporting documents to use as context"
+    )
+
+    @validator('sections', always=True)
+    def validate_sections(cls, v, values):
+        return validate_custom_sections(v, values.get('complexity'))
+
+    @validator('offline')
+    def validate_offline(cls, v, values):
+        return validate_offline_complexity(v, values.get('complexity'))
+
+    @validator('document_ids')
+    def validate_document_ids(cls, v):
+        return list(dict.fromkeys(v))
+
+
+class ReportUpgrade(BaseModel):
+    complexity: ReportComplexity = Field(
+        ReportComplexity.ADVANCED, description="Full report complexity to upgrade a draft to"
+    )
+    sections: Optional[List[str]] = Field(
+        None, description="Section titles to generate for a custom report"
+    )
+    allow_deferred: bool = Field(
+        False, description="Queue the report even when generation is over capacity"
+    )
+
+    @validator('sections', always=True)
+    def validate_sections(cls, v, values):
+        return validate_custom_sections(v, values.get('complexity'))
 
 
 class ReportResponse(BaseModel):
@@ -21,7 +83,9 @@ class ReportResponse(BaseModel):
     idea: Optional[str] = None
     pdf_url: Optional[str] = None
     complexity: Optional[ReportComplexity] = None
+    sections: Optional[List[str]] = None
     tokens_used: Optional[int] = None
+    estimated_completion_at: Optional[datetime] = None
     message: Optional[str] = None
 
 
@@ -29,4 +93,64 @@ class ReportListResponse(BaseModel):
     reports: list[ReportResponse]
     total: int
     page: int
-    pages: int
\ No newline at end of file
+    pages: int
+
+
+class ReportBatchCreate(BaseModel):
+    ideas: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_REPORTS, description="Technology ideas, one report each"
+    )
+    name: Optional[str] = Field(None, max_length=200, description="Label for the batch")
+    complexity: ReportComplexity = Field(
+        ReportComplexity.BASIC, description="Report complexity level for every report"
+    )
+    sections: Optional[List[str]] = Field(
+        None, description="Section titles to generate for custom reports"
+    )
+    allow_deferred: bool = Field(
+        False, description="Queue the batch even when generation is over capacity"
+    )
+    offline: bool = Field(
+        False, description="Generate at a discount through the offline bulk path (may take hours)"
+    )
+
+    @validator('ideas', each_item=True)
+    def validate_idea(cls, v):
+        if not 50 <= len(v) <= 10000:
+            raise ValueError('Each idea must be between 50 and 10000 characters')
+        return v
+
+    @validator('sections', always=True)
+    def validate_sections(cls, v, values):
+        return validate_custom_sections(v, values.get('complexity'))
+
+    @validator('offline')
+    def validate_offline(cls, v, values):
+        return validate_offline_complexity(v, values.get('complexity'))
+
+
+class ReportBatchResponse(BaseModel):
+    id: str
+    name: Optional[str] = None
+    status: str
+    complexity: ReportComplexity
+    total_reports: int
+    status_counts: Dict[str, int]
+    progress: float
+    tokens_used: int
+    reports: List[ReportResponse]
+    created_at: datetime
+    download_url: Optional[str] = None
+    message: Optional[str] = None
+
+
+class SupportingDocumentResponse(BaseModel):
+    id: str
+    filename: str
+    file_type: str
+    file_size: int
+    status: DocumentStatus
+    page_count: Optional[int] = None
+    text_chars: Optional[int] = None
+    error_message: Optional[str] = None
+    created_at: datetime
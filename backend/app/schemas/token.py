@@ -11,6 +11,8 @@ class TokenPackageResponse(BaseModel):
     price_inr: float
     price_usd: float
     description: str
+    # Precomputed checkout price per currency, in major units
+    prices: Dict[str, float] = {}
 
 class TokenPurchaseCreate(BaseModel):
     package_id: str
@@ -31,6 +33,7 @@ class UserTokenBalanceResponse(BaseModel):
     total_tokens: int
     used_tokens: int
     available_tokens: int
+    reserved_tokens: int = 0
     updated_at: datetime
 
 class TokenTransactionResponse(BaseModel):
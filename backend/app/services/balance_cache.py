@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.models.token import UserTokenBalance
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "token_balance:"
+INVALIDATION_CHANNEL = "token_balance:invalidate"
+
+# Set the cached balance only if it is newer than the one already there, so a slow
+# writer can't overwrite a later mutation. ARGV: payload, version, ttl seconds.
+SET_IF_NEWER = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local cached = cjson.decode(current)['version']
+    if cached and tonumber(cached) >= tonumber(ARGV[2]) then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+return 1
+"""
+
+
+class TokenBalanceCache:
+    """
+    Two-tier read cache for token balances, written through on every atomic balance
+    update (each update bumps the balance version and returns the new document).
+
+    Redis holds the shared copy; each worker keeps a short-lived local copy in front of
+    it, in an LRU of at most BALANCE_CACHE_LOCAL_SIZE users. A write publishes the user
+    id, and every other worker drops its local copy, so reads in any worker see the new
+    balance without a database round trip. Redis calls time out quickly and their errors
+    disable caching for the call rather than failing it. After repeated errors a breaker
+    sends reads straight to the database for a while; writes still try Redis, since a
+    skipped write would leave a stale shared copy for other workers to read.
+    """
+
+    def __init__(self):
+        self._worker_id = uuid.uuid4().hex
+        self._local: "OrderedDict[str, Tuple[float, UserTokenBalance]]" = OrderedDict()
+        self._client: Optional[redis.Redis] = None
+        self._set_if_newer = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _redis(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=settings.BALANCE_CACHE_REDIS_TIMEOUT_SECONDS,
+                socket_timeout=settings.BALANCE_CACHE_REDIS_TIMEOUT_SECONDS,
+            )
+            self._set_if_newer = self._client.register_script(SET_IF_NEWER)
+        return self._client
+
+    def _reads_enabled(self) -> bool:
+        return settings.BALANCE_CACHE_ENABLED and time.monotonic() >= self._open_until
+
+    def _record_success(self):
+        self._failures = 0
+
+    def _record_failure(self):
+        self._failures += 1
+        if self._failures >= settings.BALANCE_CACHE_BREAKER_FAILURES:
+            logger.warning(f"Balance cache reads bypassed for {settings.BALANCE_CACHE_BREAKER_SECONDS}s "
+                           f"after {self._failures} Redis errors")
+            self._open_until = time.monotonic() + settings.BALANCE_CACHE_BREAKER_SECONDS
+            self._failures = 0
+            # Invalidations can't be delivered while Redis is down
+            self._local.clear()
+
+    def _get_local(self, user_id: str) -> Optional[UserTokenBalance]:
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return entry[1]
+
+    def _set_local(self, balance: UserTokenBalance):
+        self._local[balance.user_id] = (time.monotonic() + settings.BALANCE_CACHE_LOCAL_TTL_SECONDS, balance)
+        self._local.move_to_end(balance.user_id)
+        while len(self._local) > settings.BALANCE_CACHE_LOCAL_SIZE:
+            self._local.popitem(last=False)
+
+    async def start(self):
+        """Listen for invalidations published by other workers"""
+        if settings.BALANCE_CACHE_ENABLED and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _listen(self):
+        # A dedicated connection without a read timeout, since the channel can be idle for long
+        client = redis.from_url(settings.REDIS_URL,
+                                socket_connect_timeout=settings.BALANCE_CACHE_REDIS_TIMEOUT_SECONDS,
+                                health_check_interval=30)
+        try:
+            while True:
+                pubsub = client.pubsub()
+                try:
+                    await pubsub.subscribe(INVALIDATION_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        worker_id, _, user_id = message["data"].decode().partition(":")
+                        if worker_id != self._worker_id:
+                            self._local.pop(user_id, None)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Entries written while disconnected may have been missed
+                    logger.warning(f"Balance cache invalidation listener failed, retrying: {e}")
+                    self._local.clear()
+                    await asyncio.sleep(settings.BALANCE_CACHE_LOCAL_TTL_SECONDS)
+                finally:
+                    await pubsub.aclose()
+        finally:
+            await client.aclose()
+
+    async def get(self, user_id: str) -> Optional[UserTokenBalance]:
+        if not self._reads_enabled():
+            return None
+
+        balance = self._get_local(user_id)
+        if balance is not None:
+            return balance
+
+        try:
+            payload = await self._redis().get(KEY_PREFIX + user_id)
+            self._record_success()
+        except Exception as e:
+            logger.warning(f"Balance cache read failed for user {user_id}: {e}")
+            self._record_failure()
+            payload = None
+        if payload is None:
+            return None
+
+        balance = UserTokenBalance.model_validate_json(payload)
+        self._set_local(balance)
+        return balance
+
+    async def set(self, balance: UserTokenBalance, publish: bool = True):
+        """
+        Write a balance just read from or written to the database. Only writes publish an
+        invalidation (publish=False for a read-miss fill, which changes nothing).
+        """
+        if not settings.BALANCE_CACHE_ENABLED:
+            return
+
+        cached = self._local.get(balance.user_id)
+        if not cached or cached[1].version <= balance.version:
+            self._set_local(balance)
+        try:
+            client = self._redis()
+            await self._set_if_newer(
+                keys=[KEY_PREFIX + balance.user_id],
+                args=[balance.model_dump_json(), balance.version, settings.BALANCE_CACHE_TTL_SECONDS],
+            )
+            if publish:
+                await client.publish(INVALIDATION_CHANNEL, f"{self._worker_id}:{balance.user_id}")
+            self._record_success()
+        except Exception as e:
+            logger.warning(f"Balance cache write failed for user {balance.user_id}: {e}")
+            self._record_failure()
+            await self.invalidate(balance.user_id)
+
+    async def invalidate(self, user_id: str):
+        self._local.pop(user_id, None)
+        if not settings.BALANCE_CACHE_ENABLED:
+            return
+        try:
+            client = self._redis()
+            await client.delete(KEY_PREFIX + user_id)
+            await client.publish(INVALIDATION_CHANNEL, f"{self._worker_id}:{user_id}")
+            self._record_success()
+        except Exception as e:
+            logger.warning(f"Balance cache invalidation failed for user {user_id}: {e}")
+            self._record_failure()
+
+
+token_balance_cache = TokenBalanceCache()
@@ -0,0 +1,220 @@
+import asyncio
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Set, Tuple
+
+from app.core.config import settings
+
+from app.models.report import ReportBatch, ReportBatchStatus, ReportGenerationMode, ReportLog, ReportStatus
+from app.models.user import User
+from app.services.patent_corpus import retrieve_patents
+from app.services.patent_details import enrich_patents
+from app.services.report_scheduler import report_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Preparations rerun by recovery, referenced until they finish
+_recovery_tasks: Set[asyncio.Task] = set()
+
+
+def normalize_search_query(query: str) -> str:
+    """Queries with the same keywords in any order or case share one patent search"""
+    return " ".join(sorted(query.lower().split()))
+
+
+def extract_queries(ideas: List[str]) -> List[str]:
+    """One LLM call for the patent search keywords of every idea. Blocking; run it in an executor."""
+    # Imported lazily, like the report engine in the reports router
+    from app.services.report_generator import PDFReportGenerator
+
+    generator = PDFReportGenerator()
+    return generator.extract_search_queries(generator.initialize_openai_client(), ideas)
+
+
+def search_serpapi(query: str) -> list:
+    from app.services.report_generator import PDFReportGenerator
+
+    return PDFReportGenerator().search_patents_by_query(query)
+
+
+async def research_ideas(ideas: List[str]) -> Tuple[List[str], Dict[str, list]]:
+    """
+    Shared research for one or more ideas: one LLM call extracts search keywords for every
+    idea, then each unique query is looked up in the patent corpus, with SerpApi filling gaps,
+    and the distinct patents found are enriched with their details in one concurrent pass.
+    Returns the query per idea and the patents per normalized query.
+    """
+    loop = asyncio.get_event_loop()
+    queries = await loop.run_in_executor(None, extract_queries, ideas)
+
+    unique_queries = {}
+    for query in queries:
+        unique_queries.setdefault(normalize_search_query(query), query)
+    results = await asyncio.gather(*(retrieve_patents(query, search_serpapi) for query in unique_queries.values()))
+
+    distinct = {}
+    for patents in results:
+        for patent in patents:
+            if patent.get("patent_number"):
+                distinct.setdefault(patent["patent_number"], patent)
+    try:
+        enriched = {patent["patent_number"]: patent for patent in await enrich_patents(list(distinct.values()))}
+    except Exception as e:
+        logger.error(f"Patent detail enrichment failed, continuing with search results: {e}")
+        enriched = distinct
+    patents_by_query = {
+        key: [enriched.get(patent.get("patent_number"), patent) for patent in patents]
+        for key, patents in zip(unique_queries.keys(), results)
+    }
+
+    logger.info(f"Research: {len(ideas)} ideas, {len(unique_queries)} unique patent searches")
+    return queries, patents_by_query
+
+
+async def fail_pending_batch_reports(batch: ReportBatch, error_message: str):
+    """Fail and refund the reports of a batch that never reached the scheduler"""
+    user = await User.get(batch.user_id)
+    unqueued = {"batch_id": str(batch.id), "status": ReportStatus.PENDING, "virtual_finish": None, "bulk_job_id": None}
+    for report in await ReportLog.find(unqueued).to_list():
+        result = await ReportLog.find_one({"_id": report.id, **unqueued}).update({"$set": {
+            "status": ReportStatus.FAILED,
+            "error_message": error_message,
+            "updated_at": datetime.utcnow(),
+        }})
+        if result.modified_count and user:
+            try:
+                await user.release_tokens(str(report.id), report.tokens_used)
+            except Exception as refund_error:
+                logger.error(f"Failed to refund tokens for user {batch.user_id} on report {report.id}: {refund_error}")
+
+
+async def prepare_batch(batch_id: str):
+    """
+    Run the shared batch research, then hand every report to the scheduler. Safe to rerun
+    after an interrupted run: reports already researched or enqueued are skipped.
+    """
+    batch = await ReportBatch.get(batch_id)
+    if not batch:
+        logger.error(f"Report batch not found - batch_id: {batch_id}")
+        return
+
+    try:
+        user = await User.get(batch.user_id)
+        reports = await ReportLog.find({"batch_id": batch_id}).sort([("created_at", 1)]).to_list()
+
+        to_research = [r for r in reports if "prefetched_patents" not in r.metadata]
+        try:
+            queries, patents_by_query = await research_ideas([r.idea for r in to_research]) if to_research else ([], {})
+            batch.unique_queries = batch.unique_queries or len(patents_by_query)
+            for report, query in zip(to_research, queries):
+                await ReportLog.find_one({"_id": report.id}).update({"$set": {
+                    "metadata.search_query": query,
+                    "metadata.prefetched_patents": patents_by_query[normalize_search_query(query)],
+                }})
+        except Exception as e:
+            # Reports fall back to their own patent search
+            logger.error(f"Shared research failed for batch {batch_id}: {e}")
+
+        # Offline reports are left for the bulk LLM pipeline to collect
+        for report in reports:
+            report = await ReportLog.get(report.id)
+            if (report and report.status == ReportStatus.PENDING and report.virtual_finish is None
+                    and report.generation_mode == ReportGenerationMode.STANDARD):
+                await report_scheduler.enqueue(report, user)
+
+        batch.status = ReportBatchStatus.QUEUED
+        logger.info(f"Report batch {batch_id} queued with {len(reports)} reports")
+    except Exception as e:
+        logger.error(f"Failed to prepare report batch {batch_id}: {e}")
+        batch.status = ReportBatchStatus.FAILED
+        batch.error_message = str(e)
+        await fail_pending_batch_reports(batch, "Batch preparation failed")
+
+    batch.updated_at = datetime.utcnow()
+    await batch.save()
+
+
+async def recover_stale_batches():
+    """
+    prepare_batch runs as a request background task, so a worker that dies mid-preparation
+    leaves its batch PREPARING and the reports unqueued with their tokens reserved. Batches
+    preparing longer than BATCH_PREPARE_TIMEOUT_SECONDS are prepared again, up to
+    BATCH_MAX_PREPARE_RETRIES times, then failed with their unqueued reports refunded.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.BATCH_PREPARE_TIMEOUT_SECONDS)
+    stale = await ReportBatch.find({"status": ReportBatchStatus.PREPARING, "updated_at": {"$lt": cutoff}}).to_list()
+    for batch in stale:
+        # Conditional on the stale timestamp, so only one worker recovers each batch
+        claim = {"_id": batch.id, "status": ReportBatchStatus.PREPARING, "updated_at": batch.updated_at}
+        now = datetime.utcnow()
+        if batch.prepare_retries < settings.BATCH_MAX_PREPARE_RETRIES:
+            result = await ReportBatch.find_one(claim).update(
+                {"$set": {"updated_at": now}, "$inc": {"prepare_retries": 1}})
+            if result.modified_count:
+                logger.warning(f"Report batch {batch.id} stalled while preparing, preparing it again")
+                task = asyncio.create_task(prepare_batch(str(batch.id)))
+                _recovery_tasks.add(task)
+                task.add_done_callback(_recovery_tasks.discard)
+            continue
+
+        error_message = "Batch preparation was interrupted"
+        result = await ReportBatch.find_one(claim).update({"$set": {
+            "status": ReportBatchStatus.FAILED,
+            "error_message": error_message,
+            "updated_at": now,
+        }})
+        if result.modified_count:
+            logger.warning(f"Report batch {batch.id} stalled while preparing again, failing its unqueued reports")
+            await fail_pending_batch_reports(batch, error_message)
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink that lets zipfile output be streamed chunk by chunk"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files: List[Tuple[str, str]], extra: Dict[str, str], chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Stream a ZIP of (archive name, file path) entries plus small in-memory text files,
+    without buffering the archive. PDFs are already compressed, so they are stored as is.
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for arcname, path in files:
+            with archive.open(arcname, mode="w", force_zip64=True) as entry, open(path, "rb") as source:
+                while chunk := source.read(chunk_size):
+                    entry.write(chunk)
+                    yield buffer.pop()
+            yield buffer.pop()
+        for arcname, content in extra.items():
+            archive.writestr(arcname, content, compress_type=zipfile.ZIP_DEFLATED)
+    yield buffer.pop()
+
+
+def build_batch_summary(batch: ReportBatch, reports: List[ReportLog]) -> str:
+    return json.dumps({
+        "batch_id": str(batch.id),
+        "name": batch.name,
+        "complexity": batch.complexity.value,
+        "reports": [
+            {"id": str(r.id), "title": r.title, "status": r.status.value, "error": r.error_message}
+            for r in reports
+        ],
+    }, indent=2)
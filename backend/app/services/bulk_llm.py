@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bulk job states reported by every backend
+BULK_PENDING = "pending"
+BULK_COMPLETED = "completed"
+BULK_FAILED = "failed"
+
+
+def build_bulk_request(custom_id: str, model: str, prompt: str, temperature: float, max_tokens: int = 4096) -> Dict[str, Any]:
+    """One line of a bulk request file, in the OpenAI Batch API format"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+    }
+
+
+def write_bulk_request_file(path: str, requests: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request) + "\n")
+
+
+def parse_bulk_output(lines) -> Dict[str, Dict[str, Any]]:
+    """Map custom_id to {"content", "usage"} or {"error"} from Batch API output lines"""
+    results = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        if row.get("error") or response.get("status_code") != 200:
+            results[row["custom_id"]] = {"error": str(row.get("error") or response.get("body"))}
+            continue
+        body = response["body"]
+        usage = body.get("usage") or {}
+        results[row["custom_id"]] = {
+            "content": body["choices"][0]["message"]["content"] or "",
+            "usage": {key: usage.get(key, 0) for key in ("prompt_tokens", "completion_tokens", "total_tokens")},
+        }
+    return results
+
+
+class BulkLLMBackend(ABC):
+    """
+    Asynchronous bulk LLM submission: upload a request file, poll the job, fetch results.
+    Methods block on network or disk; call them from an executor.
+    """
+    name = "base"
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """Submit a request file and return the provider's job id"""
+
+    @abstractmethod
+    def poll(self, job_id: str) -> str:
+        """Return BULK_PENDING, BULK_COMPLETED or BULK_FAILED"""
+
+    @abstractmethod
+    def fetch_results(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return results keyed by custom_id for a completed job"""
+
+
+class OpenAIBatchBackend(BulkLLMBackend):
+    """OpenAI Batch API: discounted pricing, separate rate limits, results within 24 hours"""
+    name = "openai"
+
+    def __init__(self):
+        import openai
+        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted OpenAI batch {batch.id} from {input_path}")
+        return batch.id
+
+    def poll(self, job_id: str) -> str:
+        batch = self.client.batches.retrieve(job_id)
+        if batch.status == "completed":
+            return BULK_COMPLETED
+        if batch.status in ("failed", "expired", "cancelled"):
+            return BULK_FAILED
+        return BULK_PENDING
+
+    def fetch_results(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        batch = self.client.batches.retrieve(job_id)
+        results = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if file_id:
+                results.update(parse_bulk_output(self.client.files.content(file_id).text.splitlines()))
+        return results
+
+
+class LocalFileBatchBackend(BulkLLMBackend):
+    """
+    File-based stand-in for development and tests. Each job is a directory under
+    BULK_LLM_WORK_DIR/local holding input.jsonl; the job completes once output.jsonl
+    (Batch API output format) exists. With BULK_LLM_LOCAL_COMPLETE_AFTER_SECONDS set,
+    placeholder output is written automatically after that delay.
+    """
+    name = "local"
+
+    def __init__(self):
+        self.root = os.path.join(settings.BULK_LLM_WORK_DIR, "local")
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def submit(self, input_path: str) -> str:
+        job_id = f"local-{uuid.uuid4().hex}"
+        os.makedirs(self._job_dir(job_id), exist_ok=True)
+        shutil.copyfile(input_path, os.path.join(self._job_dir(job_id), "input.jsonl"))
+        logger.info(f"Submitted local bulk job {job_id} from {input_path}")
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        job_dir = self._job_dir(job_id)
+        input_path = os.path.join(job_dir, "input.jsonl")
+        output_path = os.path.join(job_dir, "output.jsonl")
+        if os.path.exists(output_path):
+            return BULK_COMPLETED
+        if not os.path.exists(input_path):
+            return BULK_FAILED
+
+        delay = settings.BULK_LLM_LOCAL_COMPLETE_AFTER_SECONDS
+        if delay is not None and time.time() - os.path.getmtime(input_path) >= delay:
+            self._write_placeholder_output(input_path, output_path)
+            return BULK_COMPLETED
+        return BULK_PENDING
+
+    def fetch_results(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        with open(os.path.join(self._job_dir(job_id), "output.jsonl"), encoding="utf-8") as f:
+            return parse_bulk_output(f)
+
+    @staticmethod
+    def _write_placeholder_output(input_path: str, output_path: str):
+        with open(input_path, encoding="utf-8") as source, open(output_path + ".tmp", "w", encoding="utf-8") as out:
+            for line in source:
+                request = json.loads(line)
+                content = f"<h2>Placeholder section</h2><p>Generated offline for {request['custom_id']}.</p>"
+                out.write(json.dumps({
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": {
+                        "choices": [{"message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    }},
+                    "error": None,
+                }) + "\n")
+        os.replace(output_path + ".tmp", output_path)
+
+
+BULK_LLM_BACKENDS = {
+    OpenAIBatchBackend.name: OpenAIBatchBackend,
+    LocalFileBatchBackend.name: LocalFileBatchBackend,
+}
+
+
+def get_bulk_backend(name: str = None) -> BulkLLMBackend:
+    name = name or settings.BULK_LLM_BACKEND
+    if name not in BULK_LLM_BACKENDS:
+        raise ValueError(f"Unknown bulk LLM backend: {name}")
+    return BULK_LLM_BACKENDS[name]()
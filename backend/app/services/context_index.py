@@ -0,0 +1,101 @@
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by can for from has have in into is it its of on or that the their
+this to was were which will with within without not no our your we you they these those
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+def chunk_text(text: str, chunk_words: int, overlap_words: int) -> List[str]:
+    """Split text into overlapping windows of roughly chunk_words words"""
+    words = text.split()
+    if not words:
+        return []
+    step = max(chunk_words - overlap_words, 1)
+    return [" ".join(words[start:start + chunk_words]) for start in range(0, max(len(words) - overlap_words, 1), step)]
+
+
+@dataclass
+class ContextChunk:
+    source: str
+    text: str
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a small in-memory corpus, backed by an inverted index
+    (term -> [(chunk index, term frequency)]), so a query only touches the
+    postings of its own terms. Built once per report and queried per section.
+    """
+
+    def __init__(self, chunks: List[ContextChunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lengths: List[int] = []
+        for index, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk.text))
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((index, frequency))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.idf = {
+            term: math.log(1 + (len(chunks) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def _score(self, terms: List[str]) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.average_length or 1))
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query: str, k: int, context: Optional[str] = None,
+               context_weight: float = 0.2) -> List[Tuple[float, ContextChunk]]:
+        """
+        Top-k chunks for the query. Terms from context (e.g. the report topic) break ties
+        between chunks matching the query, and rank chunks on their own when no chunk
+        matches a generic query such as "Executive Summary".
+        """
+        scores = self._score(tokenize(query))
+        context_scores = self._score(list(set(tokenize(context or "")))) if context else {}
+        if scores:
+            for index in scores:
+                scores[index] += context_weight * context_scores.get(index, 0.0)
+        else:
+            scores = context_scores
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(score, self.chunks[index]) for index, score in ranked if score > 0]
+
+
+def build_report_context_index(documents: List[Tuple[str, str]], patents: list,
+                               chunk_words: int, overlap_words: int) -> BM25Index:
+    """Index a report's supporting documents (filename, text) and patent snippets and abstracts"""
+    chunks = []
+    for filename, text in documents:
+        chunks.extend(ContextChunk(filename, chunk) for chunk in chunk_text(text, chunk_words, overlap_words))
+    for patent in patents or []:
+        snippet = " ".join(str(patent.get(key) or "") for key in ("title", "assignee", "snippet", "abstract")).strip()
+        if snippet:
+            chunks.append(ContextChunk(f"Patent {patent.get('patent_number') or ''}".strip(), snippet))
+    return BM25Index(chunks)
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import uuid
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+
+from app.core.config import settings
+from app.models.document import DocumentStatus, SupportingDocument
+
+logger = logging.getLogger(__name__)
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Text extraction runs in one process per document, so a document that hangs the parser
+# can be killed; at most DOCUMENT_EXTRACTION_WORKERS run at once
+_extraction_slots: Optional[asyncio.Semaphore] = None
+_extraction_processes: Set[multiprocessing.Process] = set()
+
+
+class DocumentTooLargeError(Exception):
+    """Raised while streaming an upload once it exceeds MAX_FILE_SIZE."""
+
+
+def get_document_path(content_hash: str, file_type: str) -> str:
+    """Uploads are content addressed, so identical files are stored once"""
+    return os.path.join(settings.DOCUMENTS_STORAGE_PATH, f"{content_hash}.{file_type}")
+
+
+def get_text_cache_path(content_hash: str) -> str:
+    return os.path.join(settings.DOCUMENTS_STORAGE_PATH, f"{content_hash}.txt.cache")
+
+
+def get_extraction_slots() -> asyncio.Semaphore:
+    global _extraction_slots
+    if _extraction_slots is None:
+        _extraction_slots = asyncio.Semaphore(settings.DOCUMENT_EXTRACTION_WORKERS)
+    return _extraction_slots
+
+
+def shutdown_extractions():
+    """Kill extraction processes still running"""
+    for process in list(_extraction_processes):
+        process.kill()
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def store_upload(temp_path: str, path: str):
+    """Move a finished upload to its content-addressed path, unless that content is stored already"""
+    if os.path.exists(path):
+        remove_file(temp_path)
+    else:
+        os.replace(temp_path, path)
+
+
+async def save_upload_stream(stream: AsyncIterator[bytes], file_type: str) -> Tuple[str, int, str]:
+    """
+    Write an upload to disk chunk by chunk while hashing it, enforcing MAX_FILE_SIZE as
+    bytes arrive. Returns (path, size, sha256); the body is never held in memory.
+    """
+    os.makedirs(settings.DOCUMENTS_STORAGE_PATH, exist_ok=True)
+    temp_path = os.path.join(settings.DOCUMENTS_STORAGE_PATH, f".upload-{uuid.uuid4().hex}")
+    hasher = hashlib.sha256()
+    size = 0
+    # Disk writes go through the default executor so a slow disk doesn't stall the event loop
+    loop = asyncio.get_running_loop()
+    try:
+        f = await loop.run_in_executor(None, open, temp_path, "wb")
+        try:
+            async for chunk in stream:
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise DocumentTooLargeError(f"Upload exceeds {settings.MAX_FILE_SIZE} bytes")
+                hasher.update(chunk)
+                await loop.run_in_executor(None, f.write, chunk)
+        finally:
+            await loop.run_in_executor(None, f.close)
+    except BaseException:
+        remove_file(temp_path)
+        raise
+
+    content_hash = hasher.hexdigest()
+    path = get_document_path(content_hash, file_type)
+    await loop.run_in_executor(None, store_upload, temp_path, path)
+    return path, size, content_hash
+
+
+def extract_text(path: str, file_type: str) -> Tuple[str, Optional[int]]:
+    """Extract plain text and page count from a document. Runs in an extraction process."""
+    if file_type == "pdf":
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(path)
+        pages = [page.extract_text() or "" for page in reader.pages]
+        return "\n\n".join(pages), len(pages)
+
+    if file_type == "docx":
+        paragraphs = []
+        with zipfile.ZipFile(path) as docx, docx.open("word/document.xml") as xml:
+            for _, element in ElementTree.iterparse(xml):
+                if element.tag == f"{WORD_NAMESPACE}p":
+                    paragraphs.append("".join(node.text or "" for node in element.iter(f"{WORD_NAMESPACE}t")))
+                    element.clear()
+        return "\n".join(paragraphs), None
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read(), None
+
+
+def _extract_text_in_child(path: str, file_type: str, connection):
+    try:
+        connection.send((extract_text(path, file_type), None))
+    except Exception as e:
+        connection.send((None, repr(e)))
+    finally:
+        connection.close()
+
+
+def run_extraction_process(path: str, file_type: str, timeout: float) -> Tuple[str, Optional[int]]:
+    """
+    Run extract_text in a process of its own and kill it if it has no result within
+    timeout. Blocking; run it in an executor.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_extract_text_in_child, args=(path, file_type, sender), daemon=True)
+    _extraction_processes.add(process)
+    try:
+        process.start()
+        sender.close()
+        # The result is read before joining, so a large text can't fill the pipe and block the child
+        if not receiver.poll(timeout):
+            raise TimeoutError(f"Text extraction took longer than {timeout:.0f}s")
+        result, error = receiver.recv()
+        if error:
+            raise RuntimeError(error)
+        return result
+    except EOFError:
+        process.join()
+        raise RuntimeError(f"Extraction process exited with code {process.exitcode}")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+        _extraction_processes.discard(process)
+
+
+def write_text_cache(cache_path: str, text: str):
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, cache_path)
+
+
+async def extract_document_text(document_id: str):
+    """Extract a document's text in its own process and cache it by content hash"""
+    document = await SupportingDocument.get(document_id)
+    if not document:
+        return
+
+    cache_path = get_text_cache_path(document.content_hash)
+    try:
+        loop = asyncio.get_event_loop()
+        async with get_extraction_slots():
+            text, page_count = await loop.run_in_executor(
+                None,
+                run_extraction_process,
+                get_document_path(document.content_hash, document.file_type),
+                document.file_type,
+                settings.DOCUMENT_EXTRACTION_TIMEOUT_SECONDS,
+            )
+        if not text.strip():
+            raise ValueError("No text could be extracted from the document")
+
+        await loop.run_in_executor(None, write_text_cache, cache_path, text)
+
+        document.status = DocumentStatus.READY
+        document.page_count = page_count
+        document.text_chars = len(text)
+        logger.info(f"Extracted {len(text)} characters from document {document.id} ({document.filename})")
+    except Exception as e:
+        logger.error(f"Text extraction failed for document {document.id}: {e!r}")
+        document.status = DocumentStatus.FAILED
+        document.error_message = "Could not extract text from this document"
+
+    document.updated_at = datetime.utcnow()
+    await document.save()
+
+
+async def find_cached_extraction(content_hash: str) -> Optional[SupportingDocument]:
+    """An earlier upload of the same content whose extracted text is still cached"""
+    cached = await SupportingDocument.find_one({"content_hash": content_hash, "status": DocumentStatus.READY})
+    if cached and os.path.exists(get_text_cache_path(content_hash)):
+        return cached
+    return None
+
+
+def load_supporting_documents(documents: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """(filename, text) pairs read from the text cache for (filename, content hash) pairs"""
+    loaded = []
+    for filename, content_hash in documents:
+        with open(get_text_cache_path(content_hash), encoding="utf-8") as f:
+            loaded.append((filename, f.read(settings.DOCUMENT_INDEX_MAX_CHARS)))
+    return loaded
+
+
+async def get_report_documents(document_ids: List[str]) -> List[Tuple[str, str]]:
+    """Extracted text of a report's supporting documents, for its context index"""
+    if not document_ids:
+        return []
+    documents = [await SupportingDocument.get(document_id) for document_id in document_ids]
+    ready = [(d.filename, d.content_hash) for d in documents if d and d.status == DocumentStatus.READY]
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, load_supporting_documents, ready)
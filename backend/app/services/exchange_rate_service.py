@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EXCHANGE_RATE_API_URL = "https://v6.exchangerate-api.com/v6/{api_key}/latest/{base}"
+
+# Pricing is canonical in INR, so its table is fetched at startup
+DEFAULT_BASE_CURRENCIES = ("INR",)
+
+
+class ExchangeRateService:
+    """
+    Conversion rates for checkout, never fetched on the request path. Each base currency's
+    full conversion_rates table is fetched once and kept in memory; a background task
+    refreshes tables older than EXCHANGE_RATE_REFRESH_SECONDS. Every successful fetch is
+    also written to EXCHANGE_RATE_CACHE_PATH, and those last-known-good rates are loaded
+    at startup and served (however old) when the API is unavailable. Workers share that
+    file: a worker whose table goes stale first adopts a newer one another worker wrote,
+    so they mostly serve the same table (and the same catalog ETag).
+    """
+
+    def __init__(self):
+        # base currency -> (fetched_at unix time, rates)
+        self._tables: Dict[str, Tuple[float, Dict[str, float]]] = {}
+        self._refreshing: Set[str] = set()
+        # Refreshes started from get_rate, referenced until done so they aren't collected
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._refresh_listeners: List[Callable[[], Awaitable[None]]] = []
+
+    async def start(self):
+        self._load_persisted()
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        for task in self._refresh_tasks:
+            task.cancel()
+
+    def add_refresh_listener(self, listener: Callable[[], Awaitable[None]]):
+        """Await listener() after every successful refresh"""
+        self._refresh_listeners.append(listener)
+
+    async def _run_loop(self):
+        while True:
+            try:
+                for base in set(DEFAULT_BASE_CURRENCIES) | set(self._tables):
+                    if not self._is_stale(base):
+                        continue
+                    adopted = self._load_persisted()
+                    if self._is_stale(base):
+                        await self.refresh(base)
+                    elif base in adopted:
+                        await self._notify_refresh_listeners()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Exchange rate refresh round failed: {e}")
+            await asyncio.sleep(min(settings.EXCHANGE_RATE_REFRESH_SECONDS, 300))
+
+    def _is_stale(self, base: str) -> bool:
+        table = self._tables.get(base)
+        return table is None or time.time() - table[0] > settings.EXCHANGE_RATE_REFRESH_SECONDS
+
+    def _load_persisted(self) -> Set[str]:
+        """Adopt persisted tables newer than the ones in memory; returns their base currencies"""
+        try:
+            with open(settings.EXCHANGE_RATE_CACHE_PATH, encoding="utf-8") as f:
+                persisted = json.load(f)
+            tables = {base: (table["fetched_at"], table["rates"]) for base, table in persisted.items()}
+        except FileNotFoundError:
+            return set()
+        except (OSError, ValueError, KeyError, AttributeError, TypeError) as e:
+            logger.warning(f"Could not load persisted exchange rates: {e}")
+            return set()
+        adopted = {base for base, table in tables.items()
+                   if base not in self._tables or table[0] > self._tables[base][0]}
+        for base in adopted:
+            self._tables[base] = tables[base]
+        if adopted:
+            logger.info(f"Loaded last-known exchange rates for {', '.join(sorted(adopted))}")
+        return adopted
+
+    def _persist(self):
+        path = settings.EXCHANGE_RATE_CACHE_PATH
+        temp_path = f"{path}.{uuid.uuid4().hex}"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({base: {"fetched_at": fetched_at, "rates": rates}
+                           for base, (fetched_at, rates) in self._tables.items()}, f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist exchange rates: {e}")
+
+    async def refresh(self, base: str):
+        """Fetch base's conversion table; on failure the previous table stays in use"""
+        if base in self._refreshing or not settings.EXCHANGE_RATE_API_KEY:
+            return
+        self._refreshing.add(base)
+        try:
+            url = EXCHANGE_RATE_API_URL.format(api_key=settings.EXCHANGE_RATE_API_KEY, base=base)
+            async with httpx.AsyncClient(timeout=settings.EXCHANGE_RATE_TIMEOUT_SECONDS) as client:
+                response = await client.get(url)
+            response.raise_for_status()
+            data = response.json()
+            if data.get("result") != "success" or not data.get("conversion_rates"):
+                raise ValueError(f"Unexpected response: {data.get('error-type') or data.get('result')}")
+            self._tables[base] = (time.time(), data["conversion_rates"])
+            self._persist()
+            logger.info(f"Refreshed {len(data['conversion_rates'])} exchange rates for {base}")
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Exchange rate refresh failed for {base}: {e}")
+            return
+        finally:
+            self._refreshing.discard(base)
+        await self._notify_refresh_listeners()
+
+    async def _notify_refresh_listeners(self):
+        for listener in self._refresh_listeners:
+            try:
+                await listener()
+            except Exception as e:
+                logger.error(f"Exchange rate refresh listener failed: {e}")
+
+    def get_fetched_at(self, base_currency: str) -> Optional[float]:
+        """When base_currency's table in use was fetched (unix time), or None if there is none"""
+        table = self._tables.get(base_currency)
+        return table[0] if table else None
+
+    def get_rate(self, base_currency: str, target_currency: str) -> Optional[float]:
+        """
+        Rate from the cached table, or None if no table for base_currency has been fetched
+        yet. A stale table is still used while a background refresh runs.
+        """
+        if base_currency == target_currency:
+            return 1.0
+        if self._is_stale(base_currency) and base_currency not in self._refreshing:
+            task = asyncio.get_event_loop().create_task(self.refresh(base_currency))
+            self._refresh_tasks.add(task)
+            task.add_done_callback(self._refresh_tasks.discard)
+        table = self._tables.get(base_currency)
+        if table is None:
+            return None
+        return table[1].get(target_currency)
+
+
+exchange_rate_service = ExchangeRateService()
@@ -0,0 +1,131 @@
+import ipaddress
+import logging
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY = "INR"  # primary market, also used for local and private addresses
+
+IP_API_URL = "http://ip-api.com/json/{ip}?fields=status,message,currency"
+
+# ISO 3166 country -> ISO 4217 currency, for countries a country-level GeoIP database returns
+COUNTRY_CURRENCIES = {
+    "AE": "AED", "AF": "AFN", "AL": "ALL", "AM": "AMD", "AO": "AOA", "AR": "ARS", "AT": "EUR",
+    "AU": "AUD", "AZ": "AZN", "BA": "BAM", "BD": "BDT", "BE": "EUR", "BG": "BGN", "BH": "BHD",
+    "BN": "BND", "BO": "BOB", "BR": "BRL", "BT": "BTN", "BW": "BWP", "BY": "BYN", "CA": "CAD",
+    "CH": "CHF", "CL": "CLP", "CN": "CNY", "CO": "COP", "CR": "CRC", "CY": "EUR", "CZ": "CZK",
+    "DE": "EUR", "DK": "DKK", "DO": "DOP", "DZ": "DZD", "EC": "USD", "EE": "EUR", "EG": "EGP",
+    "ES": "EUR", "ET": "ETB", "FI": "EUR", "FJ": "FJD", "FR": "EUR", "GB": "GBP", "GE": "GEL",
+    "GH": "GHS", "GR": "EUR", "GT": "GTQ", "HK": "HKD", "HN": "HNL", "HR": "EUR", "HU": "HUF",
+    "ID": "IDR", "IE": "EUR", "IL": "ILS", "IN": "INR", "IQ": "IQD", "IS": "ISK", "IT": "EUR",
+    "JM": "JMD", "JO": "JOD", "JP": "JPY", "KE": "KES", "KG": "KGS", "KH": "KHR", "KR": "KRW",
+    "KW": "KWD", "KZ": "KZT", "LA": "LAK", "LB": "LBP", "LK": "LKR", "LT": "EUR", "LU": "EUR",
+    "LV": "EUR", "MA": "MAD", "MD": "MDL", "MK": "MKD", "MM": "MMK", "MN": "MNT", "MO": "MOP",
+    "MT": "EUR", "MU": "MUR", "MV": "MVR", "MX": "MXN", "MY": "MYR", "MZ": "MZN", "NA": "NAD",
+    "NG": "NGN", "NI": "NIO", "NL": "EUR", "NO": "NOK", "NP": "NPR", "NZ": "NZD", "OM": "OMR",
+    "PA": "PAB", "PE": "PEN", "PG": "PGK", "PH": "PHP", "PK": "PKR", "PL": "PLN", "PR": "USD",
+    "PT": "EUR", "PY": "PYG", "QA": "QAR", "RO": "RON", "RS": "RSD", "RU": "RUB", "RW": "RWF",
+    "SA": "SAR", "SE": "SEK", "SG": "SGD", "SI": "EUR", "SK": "EUR", "SN": "XOF", "SV": "USD",
+    "TH": "THB", "TN": "TND", "TR": "TRY", "TT": "TTD", "TW": "TWD", "TZ": "TZS", "UA": "UAH",
+    "UG": "UGX", "US": "USD", "UY": "UYU", "UZ": "UZS", "VE": "VES", "VN": "VND", "ZA": "ZAR",
+    "ZM": "ZMW", "ZW": "USD",
+}
+
+
+def get_ip_prefix(address) -> str:
+    """The /24 (IPv4) or /48 (IPv6) containing address, which shares its GeoIP record"""
+    prefix_length = 24 if address.version == 4 else 48
+    return str(ipaddress.ip_network(f"{address}/{prefix_length}", strict=False))
+
+
+class CurrencyResolver:
+    """
+    Checkout currency from the client IP. Looked up in a local MaxMind-format country
+    database (GEOIP_DATABASE_PATH, memory-mapped, read with the optional maxminddb package)
+    and cached in an LRU keyed by /24 or /48 prefix, so repeat lookups cost a dict access.
+    ip-api.com is only asked when the local database has no answer (GEOIP_REMOTE_FALLBACK).
+    Only real answers are cached: an address that falls back to DEFAULT_CURRENCY (e.g.
+    after a remote timeout) is looked up again next time.
+    """
+
+    def __init__(self):
+        self._reader = None
+        self._reader_loaded = False
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def _get_reader(self):
+        if not self._reader_loaded:
+            self._reader_loaded = True
+            path = settings.GEOIP_DATABASE_PATH
+            if path and os.path.exists(path):
+                try:
+                    import maxminddb
+
+                    self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+                    logger.info(f"Loaded GeoIP database {path}")
+                except Exception as e:
+                    logger.warning(f"Could not open GeoIP database {path}: {e}")
+            else:
+                logger.warning("No GeoIP database found (run download_geoip_database.py); "
+                               "currency detection relies on the remote fallback")
+        return self._reader
+
+    def lookup_local(self, ip: str) -> Optional[str]:
+        """Currency for ip from the local database, or None if it has no answer"""
+        reader = self._get_reader()
+        if reader is None:
+            return None
+        try:
+            record = reader.get(ip) or {}
+        except ValueError:
+            return None
+        country = (record.get("country") or record.get("registered_country") or {}).get("iso_code")
+        return COUNTRY_CURRENCIES.get(country)
+
+    async def lookup_remote(self, ip: str) -> Optional[str]:
+        try:
+            async with httpx.AsyncClient(timeout=settings.GEOIP_REMOTE_TIMEOUT_SECONDS) as client:
+                response = await client.get(IP_API_URL.format(ip=ip))
+            response.raise_for_status()
+            data = response.json()
+            if data.get("status") == "success" and data.get("currency"):
+                return data["currency"]
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning(f"IP geolocation failed for IP {ip}: {e}")
+        return None
+
+    def _remember(self, prefix: str, currency: str):
+        self._cache[prefix] = currency
+        if len(self._cache) > settings.GEOIP_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def get_currency(self, ip: str) -> str:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return DEFAULT_CURRENCY
+        if address.is_private or address.is_loopback:
+            return DEFAULT_CURRENCY  # Local dev and internal addresses default to INR
+
+        prefix = get_ip_prefix(address)
+        currency = self._cache.get(prefix)
+        if currency is not None:
+            self._cache.move_to_end(prefix)
+            return currency
+
+        currency = self.lookup_local(ip)
+        if currency is None and settings.GEOIP_REMOTE_FALLBACK:
+            currency = await self.lookup_remote(ip)
+        if currency is None:
+            return DEFAULT_CURRENCY
+        self._remember(prefix, currency)
+        return currency
+
+
+currency_resolver = CurrencyResolver()
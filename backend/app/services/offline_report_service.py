@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.models.report import (
+    BulkJobStatus,
+    BulkLLMJob,
+    ReportBatch,
+    ReportBatchStatus,
+    ReportGenerationMode,
+    ReportLog,
+    ReportStatus,
+    get_report_sections,
+)
+from app.models.user import User
+from app.services.batch_service import normalize_search_query, research_ideas
+from app.services.bulk_llm import (
+    BULK_COMPLETED,
+    BULK_PENDING,
+    build_bulk_request,
+    get_bulk_backend,
+    write_bulk_request_file,
+)
+from app.services.document_service import get_report_documents
+from app.services.report_scheduler import report_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Offline reports waiting to be collected into a bulk request file
+UNCOLLECTED = {
+    "generation_mode": ReportGenerationMode.OFFLINE,
+    "status": ReportStatus.PENDING,
+    "bulk_job_id": None,
+}
+
+
+def build_section_requests(reports: List[Tuple[str, str, Any, Optional[List[str]], List[Tuple[str, str]]]],
+                           patents_by_report: Dict[str, list]) -> List[Dict[str, Any]]:
+    """
+    Bulk requests for every section of every report, keyed "<report id>:<section number>".
+    Blocking (imports the report engine); run it in an executor.
+    """
+    from app.services.report_generator import PDFReportGenerator, ReportConfig
+
+    requests = []
+    for report_id, idea, complexity, sections, documents in reports:
+        config = ReportConfig(topic=idea, output_dir=settings.REPORTS_STORAGE_PATH)
+        patents = patents_by_report[report_id]
+        context_index = PDFReportGenerator.build_context_index(patents, documents)
+        for number, title in enumerate(get_report_sections(complexity, sections), start=1):
+            prompt = PDFReportGenerator.build_prompt_for_report_section(idea, title, number, patents, context_index)
+            requests.append(build_bulk_request(f"{report_id}:{number}", config.model, prompt, config.temperature))
+    return requests
+
+
+class OfflineReportPipeline:
+    """
+    Deferred generation through a bulk LLM API. Pending offline reports are collected
+    into one request file per round (research is shared like a report batch), submitted
+    to the bulk backend and polled. Once results arrive the reports go back to the
+    scheduler, which assembles the PDF from the precomputed sections without calling
+    the LLM again. If a bulk job fails, its reports fall back to live generation; if its
+    worker dies while collecting, the job is failed and its reports collected again.
+    """
+
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if not settings.OFFLINE_REPORTS_ENABLED:
+            return
+        self._loop_task = asyncio.create_task(self._run_loop())
+        logger.info(f"Offline report pipeline started with the '{settings.BULK_LLM_BACKEND}' bulk backend")
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        logger.info("Offline report pipeline stopped")
+
+    async def _run_loop(self):
+        while True:
+            try:
+                await self.recover_stale_jobs()
+                await self.collect_pending_reports()
+                await self.poll_submitted_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Offline report pipeline round failed: {e}")
+            await asyncio.sleep(settings.BULK_LLM_POLL_SECONDS)
+
+    async def recover_stale_jobs(self):
+        """
+        Fail jobs stuck collecting past BULK_LLM_COLLECT_TIMEOUT_SECONDS (their worker died
+        between claiming reports and submitting) and release their reports for the next
+        round. If the dead worker did submit, that provider job is abandoned.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.BULK_LLM_COLLECT_TIMEOUT_SECONDS)
+        stale = await BulkLLMJob.find(
+            {"status": BulkJobStatus.COLLECTING, "created_at": {"$lt": cutoff}}
+        ).to_list()
+        for job in stale:
+            claimed = await BulkLLMJob.find_one({"_id": job.id, "status": BulkJobStatus.COLLECTING}).update({"$set": {
+                "status": BulkJobStatus.FAILED,
+                "error_message": "Collection was interrupted",
+                "completed_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+            }})
+            if not claimed.modified_count:
+                continue
+            released = await ReportLog.find(
+                {"bulk_job_id": str(job.id), "status": ReportStatus.PENDING}
+            ).update({"$set": {"bulk_job_id": None, "updated_at": datetime.utcnow()}})
+            logger.warning(f"Recovered bulk job {job.id} stuck collecting: "
+                           f"released {released.modified_count} reports")
+
+    async def _ready_reports(self) -> List[ReportLog]:
+        """Uncollected offline reports, oldest first, up to the bulk file size limit"""
+        candidates = await ReportLog.find(UNCOLLECTED).sort([("created_at", 1)]).limit(500).to_list()
+
+        # Batch reports wait for the batch's shared research
+        batch_ids = {PydanticObjectId(r.batch_id) for r in candidates if r.batch_id}
+        preparing = set()
+        if batch_ids:
+            batches = await ReportBatch.find(
+                {"_id": {"$in": list(batch_ids)}, "status": ReportBatchStatus.PREPARING}
+            ).to_list()
+            preparing = {str(b.id) for b in batches}
+
+        ready, request_count = [], 0
+        for report in candidates:
+            if report.batch_id in preparing:
+                continue
+            section_count = len(get_report_sections(report.complexity, report.sections))
+            if ready and request_count + section_count > settings.BULK_LLM_MAX_REQUESTS_PER_FILE:
+                break
+            ready.append(report)
+            request_count += section_count
+        return ready
+
+    async def collect_pending_reports(self):
+        """Claim pending offline reports and submit their section prompts as one bulk job"""
+        candidates = await self._ready_reports()
+        if not candidates:
+            return
+
+        job = BulkLLMJob(backend=settings.BULK_LLM_BACKEND)
+        await job.insert()
+        reports = []
+        for report in candidates:
+            result = await ReportLog.find_one({"_id": report.id, **UNCOLLECTED}).update(
+                {"$set": {"bulk_job_id": str(job.id), "updated_at": datetime.utcnow()}}
+            )
+            if result.modified_count:
+                reports.append(report)
+        if not reports:
+            await job.delete()
+            return
+
+        loop = asyncio.get_event_loop()
+        try:
+            # Shared research, skipping reports whose batch already fetched patents
+            patents_by_report = {
+                str(r.id): r.metadata["prefetched_patents"] for r in reports if "prefetched_patents" in r.metadata
+            }
+            to_research = [r for r in reports if str(r.id) not in patents_by_report]
+            if to_research:
+                queries, patents_by_query = await research_ideas([r.idea for r in to_research])
+                for report, query in zip(to_research, queries):
+                    patents_by_report[str(report.id)] = patents_by_query[normalize_search_query(query)]
+                    await ReportLog.find_one({"_id": report.id}).update({"$set": {
+                        "metadata.search_query": query,
+                        "metadata.prefetched_patents": patents_by_report[str(report.id)],
+                    }})
+
+            report_inputs = [
+                (str(r.id), r.idea, r.complexity, r.sections, await get_report_documents(r.document_ids))
+                for r in reports
+            ]
+            requests = await loop.run_in_executor(None, build_section_requests, report_inputs, patents_by_report)
+            job.input_path = os.path.join(settings.BULK_LLM_WORK_DIR, f"{job.id}.jsonl")
+            await loop.run_in_executor(None, write_bulk_request_file, job.input_path, requests)
+
+            backend = get_bulk_backend(job.backend)
+            job.provider_job_id = await loop.run_in_executor(None, backend.submit, job.input_path)
+            job.status = BulkJobStatus.SUBMITTED
+            job.report_ids = [str(r.id) for r in reports]
+            job.request_count = len(requests)
+            job.submitted_at = datetime.utcnow()
+            logger.info(f"Submitted bulk job {job.id} ({job.provider_job_id}): "
+                        f"{len(reports)} reports, {len(requests)} section requests")
+        except Exception as e:
+            logger.error(f"Failed to submit bulk job {job.id}: {e}")
+            job.status = BulkJobStatus.FAILED
+            job.error_message = str(e)
+            job.report_ids = [str(r.id) for r in reports]
+
+        # Only if the job wasn't recovered as stale meanwhile; its reports were released then
+        finished = await BulkLLMJob.find_one({"_id": job.id, "status": BulkJobStatus.COLLECTING}).update({"$set": {
+            "status": job.status,
+            "provider_job_id": job.provider_job_id,
+            "input_path": job.input_path,
+            "report_ids": job.report_ids,
+            "request_count": job.request_count,
+            "submitted_at": job.submitted_at,
+            "error_message": job.error_message,
+            "updated_at": datetime.utcnow(),
+        }})
+        if not finished.modified_count:
+            logger.warning(f"Bulk job {job.id} was recovered while collecting; its results will be ignored")
+            return
+        if job.status == BulkJobStatus.FAILED:
+            await self.resume_reports(job, {})
+
+    async def poll_submitted_jobs(self):
+        """Check submitted bulk jobs and resume the reports of any that finished"""
+        loop = asyncio.get_event_loop()
+        for job in await BulkLLMJob.find({"status": BulkJobStatus.SUBMITTED}).to_list():
+            backend = get_bulk_backend(job.backend)
+            try:
+                state = await loop.run_in_executor(None, backend.poll, job.provider_job_id)
+            except Exception as e:
+                logger.warning(f"Failed to poll bulk job {job.id}: {e}")
+                continue
+            if state == BULK_PENDING:
+                continue
+
+            # Claim the job so only one worker resumes its reports
+            finished_status = BulkJobStatus.COMPLETED if state == BULK_COMPLETED else BulkJobStatus.FAILED
+            claimed = await BulkLLMJob.find_one({"_id": job.id, "status": BulkJobStatus.SUBMITTED}).update(
+                {"$set": {"status": finished_status, "completed_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+            )
+            if not claimed.modified_count:
+                continue
+
+            results = {}
+            if state == BULK_COMPLETED:
+                try:
+                    results = await loop.run_in_executor(None, backend.fetch_results, job.provider_job_id)
+                except Exception as e:
+                    logger.error(f"Failed to fetch results of bulk job {job.id}: {e}")
+            else:
+                logger.warning(f"Bulk job {job.id} ({job.provider_job_id}) failed, falling back to live generation")
+            await self.resume_reports(job, results)
+
+    async def resume_reports(self, job: BulkLLMJob, results: Dict[str, Dict[str, Any]]):
+        """
+        Attach bulk results to each report and hand it to the scheduler for assembly.
+        Sections without a result are generated live when the report runs.
+        """
+        resumed = 0
+        for report_id in job.report_ids:
+            report = await ReportLog.get(report_id)
+            if not report or report.status != ReportStatus.PENDING:
+                continue
+
+            section_results = {}
+            for number, title in enumerate(get_report_sections(report.complexity, report.sections), start=1):
+                result = results.get(f"{report_id}:{number}")
+                if result and "content" in result:
+                    section_results[title] = result
+                elif result:
+                    logger.warning(f"Bulk request failed for report {report_id} section {number}: {result['error']}")
+
+            report.metadata["section_results"] = section_results
+            report.metadata["bulk_job_id"] = str(job.id)
+            user = await User.get(report.user_id)
+            await report_scheduler.enqueue(report, user)
+            resumed += 1
+
+        logger.info(f"Resumed {resumed} reports from bulk job {job.id}")
+
+    async def get_metrics(self) -> dict:
+        """Offline report backlog across all workers"""
+        return {
+            "uncollected_reports": await ReportLog.find(UNCOLLECTED).count(),
+            "submitted_jobs": await BulkLLMJob.find({"status": BulkJobStatus.SUBMITTED}).count(),
+        }
+
+
+offline_report_pipeline = OfflineReportPipeline()
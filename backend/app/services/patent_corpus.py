@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import math
+from datetime import datetime
+from typing import Callable, List
+
+from app.core.config import settings
+from app.models.patent import PatentRecord
+from app.services.context_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+PATENT_FIELDS = ("patent_number", "patent_id", "title", "assignee", "inventor", "grant_status", "filing_date", "link", "snippet")
+
+
+def get_patent_keywords(patent: dict, query: str) -> List[str]:
+    text = " ".join(str(patent.get(key) or "") for key in ("title", "assignee", "snippet"))
+    return sorted(set(tokenize(text)) | set(tokenize(query)))
+
+
+async def search_corpus(query: str, limit: int = None) -> list:
+    """
+    Patents in the local corpus matching most of the query's terms, best matches first.
+    The multikey index on keywords serves the lookup.
+    """
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return []
+    min_matches = max(min(2, len(terms)), math.ceil(len(terms) * settings.PATENT_CORPUS_MIN_TERM_MATCH))
+    rows = await PatentRecord.find({"keywords": {"$in": terms}}).aggregate([
+        {"$addFields": {"matches": {"$size": {"$setIntersection": ["$keywords", terms]}}}},
+        {"$match": {"matches": {"$gte": min_matches}}},
+        {"$sort": {"matches": -1, "times_retrieved": -1, "last_seen": -1}},
+        {"$limit": limit or settings.PATENT_SEARCH_RESULTS},
+    ]).to_list()
+    return [{key: row.get(key) for key in PATENT_FIELDS} for row in rows]
+
+
+async def add_to_corpus(patents: list, query: str):
+    """Upsert retrieved patents, merging in the query terms that found them"""
+    now = datetime.utcnow()
+    for patent in patents:
+        if not patent.get("patent_number"):
+            continue
+        fields = {key: patent.get(key) for key in PATENT_FIELDS if key != "patent_number"}
+        await PatentRecord.find_one({"patent_number": patent["patent_number"]}).upsert(
+            {
+                "$set": {**fields, "last_seen": now},
+                "$addToSet": {
+                    "keywords": {"$each": get_patent_keywords(patent, query)},
+                    "queries": query,
+                },
+                "$inc": {"times_retrieved": 1},
+            },
+            on_insert=PatentRecord(
+                patent_number=patent["patent_number"],
+                keywords=get_patent_keywords(patent, query),
+                queries=[query],
+                times_retrieved=1,
+                first_seen=now,
+                last_seen=now,
+                **fields,
+            ),
+        )
+
+
+async def retrieve_patents(query: str, fetch: Callable[[str], list]) -> list:
+    """
+    Patents for a search query: the local corpus first, falling back to fetch (the blocking
+    SerpApi search, run in an executor) only when the corpus has too few matches.
+    """
+    local = await search_corpus(query)
+    if len(local) >= settings.PATENT_CORPUS_MIN_RESULTS:
+        logger.info(f"Patent corpus hit for '{query}': {len(local)} patents")
+        return local
+
+    loop = asyncio.get_event_loop()
+    fetched = await loop.run_in_executor(None, fetch, query)
+    try:
+        await add_to_corpus(fetched, query)
+    except Exception as e:
+        logger.error(f"Failed to add patents to the corpus: {e}")
+
+    # Fresh results first, topped up with local matches not already included
+    seen = {patent.get("patent_number") for patent in fetched}
+    merged = fetched + [patent for patent in local if patent["patent_number"] not in seen]
+    logger.info(f"Patent corpus miss for '{query}': {len(local)} local, {len(fetched)} from SerpApi")
+    return merged[:settings.PATENT_SEARCH_RESULTS]
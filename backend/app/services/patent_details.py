@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.models.patent import PatentRecord
+
+logger = logging.getLogger(__name__)
+
+SERPAPI_SEARCH_URL = "https://serpapi.com/search.json"
+
+# Detail fields merged into patent data for the IP sections
+DETAIL_FIELDS = ("abstract", "claims", "cpc_codes")
+
+
+def parse_patent_details(data: dict) -> Dict[str, object]:
+    """Keep the parts of a google_patents_details response that fit in a section prompt"""
+    claims = [str(claim).strip() for claim in data.get("claims") or [] if str(claim).strip()]
+    cpc_codes = []
+    for classification in data.get("classifications") or []:
+        code = classification.get("code")
+        if code and code not in cpc_codes:
+            cpc_codes.append(code)
+    return {
+        "abstract": (data.get("abstract") or "").strip()[:settings.PATENT_DETAIL_ABSTRACT_CHARS] or None,
+        "claims": [claim[:settings.PATENT_DETAIL_CLAIM_CHARS] for claim in claims[:settings.PATENT_DETAIL_MAX_CLAIMS]],
+        "cpc_codes": cpc_codes[:10],
+    }
+
+
+async def fetch_patent_details(client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                               patent: dict) -> Optional[Dict[str, object]]:
+    """Fetch one patent's abstract, claims and classifications; None on timeout or error"""
+    patent_id = patent.get("patent_id") or f"patent/{patent['patent_number']}/en"
+    params = {"engine": "google_patents_details", "patent_id": patent_id, "api_key": settings.SERPAPI_API_KEY}
+    async with semaphore:
+        try:
+            response = await asyncio.wait_for(
+                client.get(SERPAPI_SEARCH_URL, params=params),
+                timeout=settings.PATENT_DETAIL_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            return parse_patent_details(response.json())
+        except (asyncio.TimeoutError, httpx.HTTPError, ValueError) as e:
+            logger.warning(f"Patent details unavailable for {patent['patent_number']}: {e!r}")
+            return None
+
+
+async def save_patent_details(patent: dict, details: Dict[str, object]):
+    """Cache details on the corpus record; CPC codes also become corpus keywords"""
+    now = datetime.utcnow()
+    cpc_keywords = [code.lower() for code in details["cpc_codes"]]
+    await PatentRecord.find_one({"patent_number": patent["patent_number"]}).upsert(
+        {
+            "$set": {**details, "details_fetched_at": now},
+            "$addToSet": {"keywords": {"$each": cpc_keywords}},
+        },
+        on_insert=PatentRecord(
+            patent_number=patent["patent_number"],
+            title=patent.get("title"),
+            keywords=cpc_keywords,
+            details_fetched_at=now,
+            **details,
+        ),
+    )
+
+
+async def enrich_patents(patents: List[dict]) -> List[dict]:
+    """
+    Add abstracts, claims and CPC codes to patent data. Cached details come from the
+    patent corpus; the rest are fetched concurrently (bounded by PATENT_DETAIL_CONCURRENCY,
+    each call under its own timeout), so the stage costs about one round trip.
+    Patents whose details can't be fetched are returned unchanged.
+    """
+    numbers = list({patent["patent_number"] for patent in patents if patent.get("patent_number")})
+    if not numbers or not settings.SERPAPI_API_KEY:
+        return patents
+
+    fresh_after = datetime.utcnow() - timedelta(days=settings.PATENT_DETAIL_CACHE_DAYS)
+    cached = await PatentRecord.find(
+        {"patent_number": {"$in": numbers}, "details_fetched_at": {"$gte": fresh_after}}
+    ).to_list()
+    details = {record.patent_number: {key: getattr(record, key) for key in DETAIL_FIELDS} for record in cached}
+
+    missing = {patent["patent_number"]: patent for patent in patents
+               if patent.get("patent_number") and patent["patent_number"] not in details}
+    if missing:
+        started = asyncio.get_event_loop().time()
+        semaphore = asyncio.Semaphore(settings.PATENT_DETAIL_CONCURRENCY)
+        async with httpx.AsyncClient() as client:
+            results = await asyncio.gather(
+                *(fetch_patent_details(client, semaphore, patent) for patent in missing.values()))
+        for patent, result in zip(missing.values(), results):
+            if result:
+                details[patent["patent_number"]] = result
+                try:
+                    await save_patent_details(patent, result)
+                except Exception as e:
+                    logger.error(f"Failed to cache patent details for {patent['patent_number']}: {e}")
+        logger.info(f"Fetched details for {sum(1 for r in results if r)}/{len(missing)} patents in "
+                    f"{asyncio.get_event_loop().time() - started:.1f}s ({len(cached)} cached)")
+
+    return [{**patent, **details.get(patent.get("patent_number"), {})} for patent in patents]
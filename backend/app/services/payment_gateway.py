@@ -0,0 +1,78 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import razorpay
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# One Razorpay client per worker, so its keep-alive connections are reused across requests
+_razorpay_client: Optional[razorpay.Client] = None
+# Threads for the SDK's blocking calls, kept apart from the default executor's other work
+_gateway_pool: Optional[ThreadPoolExecutor] = None
+
+
+class GatewaySession(requests.Session):
+    """A requests session that applies RAZORPAY_TIMEOUT_SECONDS to every call"""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", settings.RAZORPAY_TIMEOUT_SECONDS)
+        return super().request(method, url, **kwargs)
+
+
+def get_razorpay_client() -> razorpay.Client:
+    global _razorpay_client
+    if _razorpay_client is None:
+        session = GatewaySession()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.RAZORPAY_POOL_SIZE)
+        session.mount("https://", adapter)
+        _razorpay_client = razorpay.Client(
+            session=session,
+            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+        )
+    return _razorpay_client
+
+
+def get_gateway_pool() -> ThreadPoolExecutor:
+    global _gateway_pool
+    if _gateway_pool is None:
+        _gateway_pool = ThreadPoolExecutor(
+            max_workers=settings.RAZORPAY_POOL_SIZE, thread_name_prefix="razorpay"
+        )
+    return _gateway_pool
+
+
+def shutdown_payment_gateway():
+    global _razorpay_client, _gateway_pool
+    if _gateway_pool is not None:
+        _gateway_pool.shutdown(wait=False, cancel_futures=True)
+        _gateway_pool = None
+    if _razorpay_client is not None:
+        _razorpay_client.session.close()
+        _razorpay_client = None
+
+
+async def call_gateway(method, *args, **kwargs):
+    """Run a blocking Razorpay SDK method on the gateway pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_gateway_pool(), functools.partial(method, *args, **kwargs))
+
+
+async def create_order(order_data: dict) -> dict:
+    return await call_gateway(get_razorpay_client().order.create, order_data)
+
+
+async def fetch_payment_and_order(payment_id: str, order_id: str) -> Tuple[dict, dict]:
+    """Fetch a payment and its order concurrently"""
+    client = get_razorpay_client()
+    payment, order = await asyncio.gather(
+        call_gateway(client.payment.fetch, payment_id),
+        call_gateway(client.order.fetch, order_id),
+    )
+    return payment, order
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from beanie import UpdateResponse
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.models.token import (
+    RazorpayWebhookEvent,
+    TokenPackage,
+    TokenTransaction,
+    TokenTransactionStatus,
+    WebhookEventStatus,
+)
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+async def complete_token_purchase(
+    order_id: str,
+    payment_id: Optional[str] = None,
+    amount_paid: Optional[int] = None,
+    signature: Optional[str] = None,
+    user_id: Optional[str] = None,
+    package: Optional[TokenPackage] = None,
+) -> Optional[TokenTransaction]:
+    """
+    Credit an order's tokens and complete its transaction, at most once per order: both
+    verify-payment and the webhook land here. The credit comes first and is keyed by the
+    order id in the same balance update, so it happens once however many calls race; the
+    transaction is completed after it. A call that fails in between leaves the transaction
+    open, and the retry completes it without crediting again. Orders without a transaction
+    from checkout are inserted when user_id and package are known; the unique order index
+    stops a second insert. Returns the transaction if this call credited it.
+    """
+    transaction = await TokenTransaction.find_one({"razorpay_order_id": order_id})
+    if transaction is None:
+        if user_id is None or package is None:
+            return None
+        transaction = TokenTransaction(
+            user_id=user_id,
+            package_id=str(package.id),
+            package_name=package.name,
+            tokens_purchased=package.tokens,
+            amount_paid=amount_paid or 0,
+            razorpay_order_id=order_id,
+        )
+        try:
+            await transaction.insert()
+        except DuplicateKeyError:
+            # Inserted by the other path in the meantime
+            transaction = await TokenTransaction.find_one({"razorpay_order_id": order_id})
+    if transaction.status == TokenTransactionStatus.COMPLETED:
+        return None
+
+    user = await User.get(transaction.user_id)
+    if not user:
+        logger.error(f"User not found for transaction {transaction.id}")
+        return None
+    credited = await user.add_tokens(transaction.tokens_purchased, order_id=order_id)
+
+    now = datetime.utcnow()
+    fields = {"status": TokenTransactionStatus.COMPLETED, "completed_at": now, "updated_at": now}
+    if payment_id:
+        fields["razorpay_payment_id"] = payment_id
+    if amount_paid is not None:
+        fields["amount_paid"] = amount_paid
+    if signature:
+        fields["razorpay_signature"] = signature
+    completed = await TokenTransaction.find_one(
+        {"_id": transaction.id, "status": {"$ne": TokenTransactionStatus.COMPLETED}}
+    ).update({"$set": fields}, response_type=UpdateResponse.NEW_DOCUMENT)
+
+    if not credited:
+        return None
+    logger.info(f"Added {transaction.tokens_purchased} tokens to user {user.email} for order {order_id}")
+    return completed or transaction
+
+
+def get_entity(payload: dict, name: str) -> dict:
+    """Razorpay nests each entity as payload[name]["entity"]"""
+    wrapper = payload.get(name) or {}
+    return wrapper.get("entity", wrapper)
+
+
+async def handle_token_payment_captured(payload: dict):
+    """Handle successful token payment capture"""
+    payment = get_entity(payload, "payment")
+    payment_id = payment.get("id")
+    order_id = payment.get("order_id")
+    logger.info(f"Token payment captured: {payment_id} for order: {order_id}, amount: {payment.get('amount')}")
+
+    if not order_id:
+        logger.warning(f"Captured payment {payment_id} has no order")
+        return
+    if not await complete_token_purchase(order_id, payment_id, payment.get("amount")):
+        logger.info(f"Order {order_id} was already credited or has no transaction")
+
+
+async def handle_token_payment_failed(payload: dict):
+    """Handle failed token payment; a completed order stays completed"""
+    payment = get_entity(payload, "payment")
+    payment_id = payment.get("id")
+    order_id = payment.get("order_id")
+    logger.info(f"Token payment failed: {payment_id} for order: {order_id}")
+    logger.info(f"Error: {payment.get('error_code')} - {payment.get('error_description')}")
+
+    result = await TokenTransaction.find_one(
+        {"razorpay_order_id": order_id, "status": TokenTransactionStatus.PENDING}
+    ).update({"$set": {
+        "status": TokenTransactionStatus.FAILED,
+        "razorpay_payment_id": payment_id,
+        "updated_at": datetime.utcnow(),
+    }})
+    if not result.modified_count:
+        logger.info(f"No pending transaction to fail for order {order_id}")
+
+
+async def handle_token_order_paid(payload: dict):
+    """Handle when a token order is fully paid"""
+    order = get_entity(payload, "order")
+    payment = get_entity(payload, "payment")
+    order_id = order.get("id")
+    logger.info(f"Token order paid: {order_id}, paid: {order.get('amount_paid')}, due: {order.get('amount_due')}")
+
+    if order.get("amount_due") == 0:
+        if await complete_token_purchase(order_id, payment.get("id"), order.get("amount_paid")):
+            logger.info(f"Token order {order_id} completed via order.paid webhook")
+
+
+WEBHOOK_HANDLERS = {
+    "payment.captured": handle_token_payment_captured,
+    "payment.failed": handle_token_payment_failed,
+    "order.paid": handle_token_order_paid,
+}
+
+
+def get_webhook_event_id(header_event_id: Optional[str], body: bytes) -> str:
+    """Razorpay's event id, or a hash of the body when the header is missing"""
+    return header_event_id or hashlib.sha256(body).hexdigest()
+
+
+async def store_webhook_event(event_id: str, body: bytes) -> bool:
+    """Persist a verified delivery; False if this event was already received"""
+    event = json.loads(body).get("event") or "unknown"
+    try:
+        await RazorpayWebhookEvent(event_id=event_id, event=event, body=body.decode()).insert()
+    except DuplicateKeyError:
+        logger.info(f"Duplicate Razorpay webhook {event_id} ({event})")
+        return False
+    logger.info(f"Received Razorpay webhook {event_id} ({event})")
+    return True
+
+
+class WebhookInbox:
+    """
+    Processes stored webhook events off the request path. Every worker runs one; an
+    event is claimed with a conditional update, so only one worker processes it.
+    Failed events are retried with exponential backoff up to WEBHOOK_MAX_ATTEMPTS, and
+    claims older than WEBHOOK_LOCK_SECONDS (a worker died mid-event) are taken over.
+    Handlers are idempotent, so a retried event can't credit an order twice.
+    """
+
+    def __init__(self):
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._loop_task = asyncio.create_task(self._run_loop())
+        logger.info("Webhook inbox started")
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        logger.info("Webhook inbox stopped")
+
+    def notify(self):
+        """Process newly stored events now rather than at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run_loop(self):
+        while True:
+            try:
+                await self.process_pending_events()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook inbox round failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_pending_events(self):
+        now = datetime.utcnow()
+        candidates = await RazorpayWebhookEvent.find({"$or": [
+            {"status": WebhookEventStatus.RECEIVED},
+            {"status": WebhookEventStatus.FAILED, "attempts": {"$lt": settings.WEBHOOK_MAX_ATTEMPTS}},
+            {"status": WebhookEventStatus.PROCESSING,
+             "locked_at": {"$lt": now - timedelta(seconds=settings.WEBHOOK_LOCK_SECONDS)}},
+        ]}).sort([("received_at", 1)]).limit(100).to_list()
+
+        for event in candidates:
+            if event.status == WebhookEventStatus.FAILED:
+                backoff = settings.WEBHOOK_POLL_SECONDS * 2 ** event.attempts
+                if event.locked_at and event.locked_at > now - timedelta(seconds=backoff):
+                    continue
+            claimed = await RazorpayWebhookEvent.find_one(
+                {"_id": event.id, "status": event.status, "attempts": event.attempts}
+            ).update({
+                "$set": {"status": WebhookEventStatus.PROCESSING, "locked_at": datetime.utcnow()},
+                "$inc": {"attempts": 1},
+            })
+            if claimed.modified_count:
+                await self.process_event(event)
+
+    async def process_event(self, event: RazorpayWebhookEvent):
+        try:
+            webhook_data = json.loads(event.body)
+            handler = WEBHOOK_HANDLERS.get(event.event)
+            if handler:
+                await handler(webhook_data.get("payload", {}))
+            else:
+                logger.info(f"Unhandled webhook event: {event.event}")
+            update = {"status": WebhookEventStatus.PROCESSED, "processed_at": datetime.utcnow(), "error_message": None}
+        except Exception as e:
+            logger.error(f"Webhook event {event.event_id} ({event.event}) failed: {e}")
+            update = {"status": WebhookEventStatus.FAILED, "error_message": str(e)}
+        await RazorpayWebhookEvent.find_one({"_id": event.id}).update({"$set": update})
+
+
+webhook_inbox = WebhookInbox()
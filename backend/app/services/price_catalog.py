@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.models.token import TokenPackage
+from app.schemas.token import TokenPackageResponse
+from app.services.exchange_rate_service import exchange_rate_service
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LocalizedPrice:
+    currency: str
+    amount: int  # smallest currency unit, as Razorpay expects
+    exchange_rate: float  # INR -> currency; 1.0 for the stored INR and USD fallback prices
+    price_inr: float  # the package price this was computed from
+
+
+def localize_price(package: TokenPackage, currency: str) -> LocalizedPrice:
+    """
+    INR uses the stored price exactly; other currencies convert price_inr with the cached
+    rates. Without a rate the stored USD price is used instead.
+    """
+    if currency == "INR":
+        return LocalizedPrice("INR", int(package.price_inr * 100), 1.0, package.price_inr)
+    exchange_rate = exchange_rate_service.get_rate("INR", currency)
+    if exchange_rate is None:
+        return LocalizedPrice("USD", int(package.price_usd * 100), 1.0, package.price_inr)
+    return LocalizedPrice(currency, int((package.price_inr * exchange_rate) * 100), exchange_rate, package.price_inr)
+
+
+class PriceCatalog:
+    """
+    Localized prices for every active token package in PRICE_CATALOG_CURRENCIES, computed
+    once and served from memory. Rebuilt when exchange rates refresh and when the packages
+    change (checked every PRICE_CATALOG_REFRESH_SECONDS, since packages are edited by
+    scripts outside the API). The serialized /tokens/packages response and its ETag are
+    built with the catalog. The ETag is derived from the packages and the fetched_at of
+    the rate table, not from the converted amounts, so workers on the same table agree;
+    a worker still on an older table serves a different ETag until it adopts the new one.
+    """
+
+    def __init__(self):
+        self.packages: List[TokenPackage] = []
+        self.prices: Dict[str, Dict[str, LocalizedPrice]] = {}
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self._fingerprint: Optional[str] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        exchange_rate_service.add_refresh_listener(self.rebuild)
+        self._loop_task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    async def _run_loop(self):
+        while True:
+            try:
+                await self.rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Price catalog rebuild failed: {e}")
+            await asyncio.sleep(settings.PRICE_CATALOG_REFRESH_SECONDS)
+
+    async def rebuild(self, force: bool = False):
+        """Recompute the catalog if the active packages or the rates changed"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            packages = await TokenPackage.find({"is_active": True}).sort([("sort_order", 1)]).to_list()
+            prices = {
+                str(package.id): {currency: localize_price(package, currency)
+                                  for currency in settings.PRICE_CATALOG_CURRENCIES}
+                for package in packages
+            }
+            responses = [
+                TokenPackageResponse(
+                    id=str(package.id),
+                    name=package.name,
+                    package_type=package.package_type,
+                    tokens=package.tokens,
+                    price_inr=package.price_inr,
+                    price_usd=package.price_usd,
+                    description=package.description,
+                    prices={
+                        currency: price.amount / 100
+                        for currency, price in prices[str(package.id)].items()
+                        if price.currency == currency
+                    },
+                ).model_dump(mode="json")
+                for package in packages
+            ]
+            body = json.dumps(responses, separators=(",", ":"), sort_keys=True).encode()
+            package_fingerprint = json.dumps(
+                [package.model_dump(mode="json") for package in packages], sort_keys=True, default=str)
+            fingerprint = hashlib.sha256(
+                f"{package_fingerprint}|{exchange_rate_service.get_fetched_at('INR')}".encode()).hexdigest()
+            if fingerprint == self._fingerprint and not force:
+                return
+
+            self.packages, self.prices, self.body = packages, prices, body
+            self.etag = f'"{fingerprint[:32]}"'
+            self._fingerprint = fingerprint
+            logger.info(f"Price catalog built: {len(packages)} packages x "
+                        f"{len(settings.PRICE_CATALOG_CURRENCIES)} currencies")
+
+    async def get_body(self) -> bytes:
+        if self.body is None:
+            await self.rebuild()
+        return self.body
+
+    async def get_price(self, package: TokenPackage, currency: str) -> LocalizedPrice:
+        """
+        The precomputed price of package in currency. The catalog is rebuilt first if it
+        is missing the package or was computed from an older price; currencies outside the
+        catalog are converted directly (USD only when there is no rate for them).
+        """
+        package_prices = self.prices.get(str(package.id))
+        if package_prices is None or any(p.price_inr != package.price_inr for p in package_prices.values()):
+            await self.rebuild(force=True)
+            package_prices = self.prices.get(str(package.id)) or {}
+        price = package_prices.get(currency)
+        if price is None or price.price_inr != package.price_inr:
+            # Outside the catalog, not an active package, or still out of date: price it directly
+            price = localize_price(package, currency)
+        return price
+
+
+price_catalog = PriceCatalog()
@@ -1,11 +1,17 @@
 import os
 import sys
 import json
+import functools
+import html
 import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+from typing import Callable, Optional, Dict, Any, List, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
 
 # Required Libraries (install via pip: openai weasyprint serpapi)
@@ -15,14 +21,18 @@ from weasyprint.text.fonts import FontConfiguration
 from serpapi import GoogleSearch
 
 from app.core.config import settings
+from app.models.report import DRAFT_SECTION_TITLES, get_report_sections
+from app.services.context_index import BM25Index, build_report_context_index
 
 
 # --- 1. Enumeration for Report Complexity ---
 class ReportComplexity(str, Enum):
     """Defines the complexity levels for the report."""
+    DRAFT = "draft"
     BASIC = "basic"
     ADVANCED = "advanced"
     COMPREHENSIVE = "comprehensive"
+    CUSTOM = "custom"
 
 
 # --- 2. Logging Configuration ---
@@ -37,7 +47,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-# --- 3. Report Configuration Dataclass ---
+# --- 3. Cancellation ---
+class ReportCancelledError(Exception):
+    """Raised inside the generator when a report is cancelled mid-generation."""
+
+
+class SectionAttemptAborted(Exception):
+    """Raised inside a section attempt that lost a hedged race."""
+
+
+# --- 4. Report Configuration Dataclass ---
 @dataclass
 class ReportConfig:
     """Configuration class for report generation"""
@@ -50,7 +69,97 @@ class ReportConfig:
     font_family: str = "Times New Roman"
 
 
-# --- 4. The Main Merged Report Generator Class ---
+# --- 5. PDF Size Optimization Presets ---
+# Image options passed to WeasyPrint's HTML.render(): since WeasyPrint 59 images are
+# loaded, recompressed and downsampled at render time, so they have no effect on
+# write_pdf(). Font subsetting and stream compression are already WeasyPrint's defaults.
+PDF_OPTIMIZATION_PRESETS: Dict[str, Dict[str, Any]] = {
+    "none": {},
+    "screen": {"optimize_images": True, "jpeg_quality": 60, "dpi": 96},
+    "ebook": {"optimize_images": True, "jpeg_quality": 75, "dpi": 150},
+    "print": {"optimize_images": True, "jpeg_quality": 90, "dpi": 300},
+}
+
+# --- 6. Hedged Section Requests ---
+class SectionLatencyTracker:
+    """
+    Rolling window of section completion latencies, used to pick the hedge delay. Primary
+    attempts that lose to a hedge or hit the deadline are recorded at the time they were
+    abandoned (a lower bound), so slow calls keep pushing the percentile up.
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait before sending a duplicate request (the configured latency percentile)."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < settings.SECTION_HEDGE_MIN_SAMPLES:
+            return settings.SECTION_HEDGE_DEFAULT_DELAY_SECONDS
+        index = min(int(len(samples) * settings.SECTION_HEDGE_PERCENTILE), len(samples) - 1)
+        return max(samples[index], settings.SECTION_HEDGE_MIN_DELAY_SECONDS)
+
+
+# Shared across reports in this process so the delay tracks provider latency
+section_latency = SectionLatencyTracker()
+
+
+@dataclass
+class _SectionAttempt:
+    """One in-flight completion for a section (the primary or its hedge)."""
+    label: str
+    abort_event: threading.Event = field(default_factory=threading.Event)
+    started_at: float = field(default_factory=time.monotonic)
+    chunks_received: int = 0
+    stream: Any = None
+    finished: bool = False
+
+    def abort(self):
+        """Signals the attempt to stop and closes its stream, unblocking a read that is stalled."""
+        self.abort_event.set()
+        stream = self.stream
+        if stream is not None and not self.finished:
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"Closing {self.label} stream failed: {e}")
+
+
+def _new_hedge_stats() -> Dict[str, Any]:
+    return {"sections": 0, "hedges_fired": 0, "hedge_wins": 0, "hedges_over_budget": 0, "deadline_exceeded": 0,
+            "extra_prompt_tokens": 0, "extra_completion_tokens": 0}
+
+
+# --- 7. Prompt Token Estimation ---
+@functools.lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Local tokenizer for the model, or None when tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, estimating prompt tokens from text length")
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_prompt_tokens(text: str, model: str) -> int:
+    """Counts prompt tokens locally, without an API call (~4 characters per token as a fallback)."""
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# --- 8. The Main Merged Report Generator Class ---
 class PDFReportGenerator:
     """
     Generates professional PDF reports by combining dynamic complexity levels
@@ -63,6 +172,20 @@ class PDFReportGenerator:
         self.serpapi_api_key = settings.SERPAPI_API_KEY  # Replace with your key if not using env vars
         self.font_config = FontConfiguration()
         self._total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self._pdf_stats: Dict[str, Any] = {}
+        self._hedge_stats: Dict[str, Any] = _new_hedge_stats()
+        self._cancel_event: Optional[threading.Event] = None
+        self.sections_total = 0
+        self.sections_completed = 0
+        self.token_estimate: Optional[Dict[str, Any]] = None
+        self._token_budget: Optional[int] = None
+        self._section_max_tokens = settings.REPORT_SECTION_MAX_TOKENS
+
+    def _check_cancelled(self):
+        """Stops generation between steps once cancellation has been requested."""
+        if self._cancel_event is not None and self._cancel_event.is_set():
+            raise ReportCancelledError(
+                f"Report cancelled after {self.sections_completed}/{self.sections_total} sections")
 
     def initialize_openai_client(self) -> openai.OpenAI:
         """Initializes the OpenAI client with proper error handling."""
@@ -99,20 +222,48 @@ class PDFReportGenerator:
             logger.error(f"Could not extract keywords: {e}")
             return topic  # Fallback to using the original topic
 
-    def search_for_patents(self, client: openai.OpenAI, topic: str) -> list:
-        """Searches for real patents using the SerpApi Google Patents API."""
+    def extract_search_queries(self, client: openai.OpenAI, topics: List[str]) -> List[str]:
+        """
+        Extracts patent search keywords for many topics in a single LLM call (used for batches).
+        Falls back to one call per topic if the batched response cannot be used.
+        """
+        if len(topics) == 1:
+            return [self._get_search_query_from_topic(client, topics[0])]
+        logger.info(f"Extracting search keywords for {len(topics)} topics in one call...")
+        numbered = "\n".join(f"{i}. {topic}" for i, topic in enumerate(topics))
+        try:
+            response = client.chat.completions.create(
+                model="gpt-4-turbo",
+                messages=[
+                    {"role": "system",
+                     "content": "You are a patent search expert. For each numbered topic, extract a concise, effective search query (3-5 keywords) for the Google Patents database. Respond with a JSON object {\"queries\": [...]} holding one keyword string per topic, in the same order."},
+                    {"role": "user", "content": numbered}
+                ],
+                temperature=0.0,
+                max_tokens=30 * len(topics) + 50,
+                response_format={"type": "json_object"}
+            )
+            queries = json.loads(response.choices[0].message.content).get("queries", [])
+            if len(queries) == len(topics):
+                return [str(query).strip().replace('"', '') for query in queries]
+            logger.warning(f"Batched keyword extraction returned {len(queries)} queries for {len(topics)} topics")
+        except Exception as e:
+            logger.error(f"Batched keyword extraction failed: {e}")
+        return [self._get_search_query_from_topic(client, topic) for topic in topics]
+
+    def search_patents_by_query(self, search_query: str) -> list:
+        """Searches for real patents matching a keyword query using the SerpApi Google Patents API."""
         if not self.serpapi_api_key:
             logger.warning("SERPAPI_API_KEY not found. Skipping patent search.")
             return []
 
-        search_query = self._get_search_query_from_topic(client, topic)
         logger.info(f"Searching for patents with SerpApi using query: '{search_query}'")
 
         params = {
             "engine": "google_patents",
             "q": search_query,
             "api_key": self.serpapi_api_key,
-            "num": 10
+            "num": settings.PATENT_SEARCH_RESULTS
         }
         try:
             search_client = GoogleSearch(params)
@@ -124,12 +275,14 @@ class PDFReportGenerator:
             verified_patents = [
                 {
                     "patent_number": item.get("publication_number"),
+                    "patent_id": item.get("patent_id"),
                     "title": item.get("title"),
                     "assignee": item.get("assignee"),
                     "inventor": item.get("inventor"),
                     "grant_status": item.get("grant_status", "N/A"),
                     "filing_date": item.get("filing_date", "N/A"),
-                    "link": item.get("link")
+                    "link": item.get("link"),
+                    "snippet": item.get("snippet")
                 }
                 for item in patent_results
             ]
@@ -140,6 +293,44 @@ class PDFReportGenerator:
             logger.error(f"SerpApi search failed: {e}", exc_info=True)
             return []
 
+    def search_for_patents(self, client: openai.OpenAI, topic: str) -> list:
+        """Searches for real patents related to a report topic."""
+        if not self.serpapi_api_key:
+            logger.warning("SERPAPI_API_KEY not found. Skipping patent search.")
+            return []
+
+        search_query = self._get_search_query_from_topic(client, topic)
+        return self.search_patents_by_query(search_query)
+
+    @staticmethod
+    def build_context_index(patents: list, documents: Optional[List[Tuple[str, str]]] = None) -> BM25Index:
+        """BM25 index over the report's supporting documents and patent snippets, built once per report."""
+        index = build_report_context_index(documents or [], patents, settings.CONTEXT_CHUNK_WORDS,
+                                           settings.CONTEXT_CHUNK_OVERLAP_WORDS)
+        logger.info(f"Built report context index with {len(index)} chunks")
+        return index
+
+    @classmethod
+    def build_prompt_for_report_section(cls, topic: str, section_title: str, section_number: int,
+                                        patents: list, context_index: Optional[BM25Index] = None) -> str:
+        """
+        Prompt for one report section; only the IP-related sections get the patent data.
+        The chunks of supporting context most relevant to the section title are appended.
+        """
+        data = patents if any(k in section_title for k in ["IP", "Patent", "Appendices"]) else None
+        prompt = cls.build_prompt_for_section(topic, section_title, section_number, data=data)
+        hits = context_index.search(section_title, settings.CONTEXT_TOP_K, context=topic) if context_index else []
+        if hits:
+            excerpts = "\n\n".join(f"[{chunk.source}] {chunk.text}" for _, chunk in hits)
+            prompt += f"""
+                Relevant excerpts from the submitter's supporting documents and related patents.
+                Treat them as evidence where relevant, but do not copy long passages verbatim:
+                ```text
+                {excerpts}
+                ```
+                """
+        return prompt
+
     @staticmethod
     def build_prompt_for_section(topic: str, section_title: str, section_number: int,
                                  data: Optional[Any] = None) -> str:
@@ -213,7 +404,7 @@ class PDFReportGenerator:
                     {sec_num}.3 Ideal Customer/End User Profiles
                     Define target customers and end users by industry vertical, organizational role, institution type, and geography in a detailed manner. Differentiate between buyers vs. users and government vs. private sector. Support profiles with industry-specific challenges or workflows that the technology directly solves. Use a table with at least the following columns: Customer Segment, Pain Point, Adoption Context, Strategic Benefit, Solution Fit, Value Proposition, TRL, IP/Regulatory Status, Revenue Opportunity, Implementation Barrier, Key Decision Maker, Go-to-Market Approach, Pilot Possibility, Funding Mechanism, Competition Landscape, and Scalability Potential. Avoid hypothetical personas and use authentic, anonymized industry archetypes based on documented use cases. The output must use only clean, semantic HTML5 tags and be fully compatible with WeasyPrint PDF rendering. Do not use speculative language.
                     """,
-            "IP Snapshot": "Present the provided patent data in a clear, analytical table. For each patent, include its number, title, assignee, inventor, grant status and filling date. Provide expert analysis on the implications of this patent landscape based on the given data.",
+            "IP Snapshot": "Present the provided patent data in a clear, analytical table. For each patent, include its number, title, assignee, inventor, grant status and filling date. Where an abstract, claims or CPC codes are provided, use them to characterise what each patent covers. Provide expert analysis on the implications of this patent landscape based on the given data.",
             "Next Steps & Development Suggestions": """
                     Provide a significantly more detailed and expanded explanation for this section. Elaborate on each point, offering deeper context, more thorough analysis, and comprehensive descriptions to create a more in-depth version of the report.
 
@@ -481,32 +672,212 @@ class PDFReportGenerator:
         else:
             return base_prompt
 
-    def generate_html_for_section(self, client: openai.OpenAI, config: ReportConfig, prompt: str) -> str:
+    def _run_section_attempt(self, client: openai.OpenAI, config: ReportConfig, prompt: str,
+                             attempt: _SectionAttempt) -> Tuple[str, Any]:
+        """
+        Streams one completion attempt and returns (content, usage).
+        Streaming lets a cancelled report or a losing hedge abort the request mid-flight.
+        """
+        stream = client.chat.completions.create(
+            model=config.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=config.temperature,
+            max_tokens=self._section_max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=openai.Timeout(settings.SECTION_DEADLINE_SECONDS, read=settings.SECTION_STREAM_IDLE_SECONDS)
+        )
+        attempt.stream = stream
+        content_parts = []
+        usage = None
+        try:
+            for chunk in stream:
+                self._check_cancelled()
+                if attempt.abort_event.is_set():
+                    raise SectionAttemptAborted(f"{attempt.label} attempt aborted")
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content_parts.append(chunk.choices[0].delta.content)
+                    attempt.chunks_received += 1
+        finally:
+            # Closing the stream drops the HTTP connection and aborts the completion
+            stream.close()
+        return "".join(content_parts), usage
+
+    def _generate_with_hedging(self, client: openai.OpenAI, config: ReportConfig, prompt: str,
+                               prompt_tokens: int = 0) -> Tuple[str, Any]:
+        """
+        Runs a section completion under a hard deadline. If it is still running after the
+        p95-based hedge delay, a duplicate request is sent and the first to finish wins,
+        unless the token budget can't cover a second full attempt. Tokens billed to the
+        attempts that didn't win count against the budget.
+        """
+        started = time.monotonic()
+        deadline = started + settings.SECTION_DEADLINE_SECONDS
+        hedge_delay = section_latency.hedge_delay() if settings.SECTION_HEDGE_ENABLED else None
+        self._hedge_stats["sections"] += 1
+
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="section-attempt")
+        attempts = [_SectionAttempt("primary")]
+        futures = {executor.submit(self._run_section_attempt, client, config, prompt, attempts[0]): attempts[0]}
+        last_error: Optional[Exception] = None
+        winner: Optional[_SectionAttempt] = None
+        winner_usage = None
+        timed_out = False
+        try:
+            while futures:
+                self._check_cancelled()
+                now = time.monotonic()
+                if now >= deadline:
+                    self._hedge_stats["deadline_exceeded"] += 1
+                    timed_out = True
+                    raise TimeoutError(f"Section exceeded its {settings.SECTION_DEADLINE_SECONDS:.0f}s deadline")
+
+                hedge_due = hedge_delay is not None and len(attempts) == 1
+                if hedge_due and now - started >= hedge_delay and not self._can_afford_hedge(prompt_tokens):
+                    logger.info(f"Section still running after {hedge_delay:.1f}s, no budget for a hedged request")
+                    self._hedge_stats["hedges_over_budget"] += 1
+                    hedge_delay = None
+                    continue
+                if hedge_due and now - started >= hedge_delay:
+                    logger.info(f"Section still running after {hedge_delay:.1f}s, sending hedged request")
+                    hedge = _SectionAttempt("hedge")
+                    attempts.append(hedge)
+                    futures[executor.submit(self._run_section_attempt, client, config, prompt, hedge)] = hedge
+                    self._hedge_stats["hedges_fired"] += 1
+                    continue
+
+                # Wake up for the hedge, the deadline, or at least every second to notice cancellation
+                timeout = min(deadline - now, 1.0)
+                if hedge_due:
+                    timeout = min(timeout, started + hedge_delay - now)
+                done, _ = wait(futures, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    attempt = futures.pop(future)
+                    attempt.finished = True
+                    error = future.exception()
+                    if error is None:
+                        content, usage = future.result()
+                        section_latency.record(time.monotonic() - attempt.started_at)
+                        if attempt.label == "hedge":
+                            self._hedge_stats["hedge_wins"] += 1
+                        winner, winner_usage = attempt, usage
+                        return content, usage
+                    if isinstance(error, ReportCancelledError):
+                        raise error
+                    logger.warning(f"Section {attempt.label} attempt failed: {error}")
+                    last_error = error
+
+            raise last_error or RuntimeError("All section attempts failed")
+        finally:
+            for attempt in attempts:
+                attempt.abort()
+            executor.shutdown(wait=False)
+            primary = attempts[0]
+            if not primary.finished and (winner is not None or timed_out):
+                section_latency.record(min(time.monotonic() - primary.started_at, settings.SECTION_DEADLINE_SECONDS))
+            self._record_attempt_cost(attempts, winner, winner_usage.prompt_tokens if winner_usage else prompt_tokens)
+
+    def _record_attempt_cost(self, attempts: List[_SectionAttempt], winner: Optional[_SectionAttempt],
+                             prompt_tokens: int):
+        """Estimate tokens spent by attempts that didn't win: the full prompt plus the chunks streamed so far."""
+        for attempt in attempts:
+            if attempt is winner:
+                continue
+            self._hedge_stats["extra_prompt_tokens"] += prompt_tokens
+            self._hedge_stats["extra_completion_tokens"] += attempt.chunks_received
+
+    def _can_afford_hedge(self, prompt_tokens: int) -> bool:
+        """Whether the budget covers a second attempt at the section, both running to the completion cap."""
+        if self._token_budget is None:
+            return True
+        attempt_tokens = prompt_tokens + self._section_max_tokens
+        return self._token_budget - self._llm_tokens_used() >= 2 * attempt_tokens
+
+    def generate_html_for_section(self, client: openai.OpenAI, config: ReportConfig, prompt: str,
+                                  prompt_tokens: int = 0) -> str:
         """Generates HTML for a single section and tracks token usage."""
         try:
-            response = client.chat.completions.create(
-                model=config.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=config.temperature,
-                max_tokens=4096
-            )
-            usage = response.usage
-            self._total_usage["prompt_tokens"] += usage.prompt_tokens
-            self._total_usage["completion_tokens"] += usage.completion_tokens
-            self._total_usage["total_tokens"] += usage.total_tokens
-            logger.info(f"Section Token Usage - Prompt: {usage.prompt_tokens}, Completion: {usage.completion_tokens}")
-            return response.choices[0].message.content.strip() + "\n"
+            content, usage = self._generate_with_hedging(client, config, prompt, prompt_tokens)
+            if usage:
+                self._total_usage["prompt_tokens"] += usage.prompt_tokens
+                self._total_usage["completion_tokens"] += usage.completion_tokens
+                self._total_usage["total_tokens"] += usage.total_tokens
+                logger.info(f"Section Token Usage - Prompt: {usage.prompt_tokens}, Completion: {usage.completion_tokens}")
+            return content.strip() + "\n"
+        except ReportCancelledError:
+            raise
         except Exception as e:
             logger.error(f"Failed to generate section content: {e}")
             return f"<h2>Error: Content Generation Failed</h2><p>Could not generate content for this section due to an API error: {e.__class__.__name__}</p>\n"
 
-    def convert_html_to_pdf(self, html_content: str, output_path: Path) -> Path:
-        """Converts the final HTML to a PDF using WeasyPrint."""
+    def estimate_report_tokens(self, config: ReportConfig, prompts: Dict[str, str]) -> Dict[str, Any]:
+        """Estimates LLM tokens for the sections still to generate: tokenized prompts plus expected completions."""
+        prompt_tokens = {title: count_prompt_tokens(prompt, config.model) for title, prompt in prompts.items()}
+        completion_tokens = len(prompts) * settings.REPORT_EXPECTED_COMPLETION_TOKENS
+        estimate = {
+            "prompt_tokens": sum(prompt_tokens.values()),
+            "completion_tokens": completion_tokens,
+            "total_tokens": sum(prompt_tokens.values()) + completion_tokens,
+            "section_prompt_tokens": prompt_tokens,
+        }
+        logger.info(f"Estimated {estimate['total_tokens']} LLM tokens for {len(prompts)} sections "
+                    f"({estimate['prompt_tokens']} prompt)")
+        return estimate
+
+    def _llm_tokens_used(self) -> int:
+        """Tokens billed so far, including the losing attempts of hedged sections."""
+        return (self._total_usage["total_tokens"] + self._hedge_stats["extra_prompt_tokens"]
+                + self._hedge_stats["extra_completion_tokens"])
+
+    def _fit_section_to_budget(self, prompt_tokens: int) -> bool:
+        """Caps the next section's completion to the remaining budget; False once the budget is exhausted."""
+        if self._token_budget is None:
+            self._section_max_tokens = settings.REPORT_SECTION_MAX_TOKENS
+            return True
+        remaining = self._token_budget - self._llm_tokens_used() - prompt_tokens
+        if remaining < settings.REPORT_MIN_SECTION_COMPLETION_TOKENS:
+            return False
+        self._section_max_tokens = min(settings.REPORT_SECTION_MAX_TOKENS, remaining)
+        return True
+
+    def use_precomputed_section(self, result: Dict[str, Any]) -> str:
+        """Returns HTML for a section generated ahead of time (e.g. by the offline bulk path)."""
+        for key, value in (result.get("usage") or {}).items():
+            if key in self._total_usage:
+                self._total_usage[key] += value
+        return result["content"].strip() + "\n"
+
+    def convert_html_to_pdf(self, html_content: str, output_path: Path, preset: Optional[str] = None) -> Path:
+        """Converts the final HTML to a size-optimized PDF using WeasyPrint."""
         pdf_path = output_path.with_suffix(".pdf")
+        preset_name = (preset or settings.PDF_OPTIMIZATION_PRESET).lower()
+        if preset_name not in PDF_OPTIMIZATION_PRESETS:
+            logger.warning(f"Unknown PDF optimization preset '{preset_name}', using 'ebook'")
+            preset_name = "ebook"
+        options = PDF_OPTIMIZATION_PRESETS[preset_name]
         try:
-            HTML(string=html_content, base_url=str(output_path.parent)).write_pdf(pdf_path,
-                                                                                  font_config=self.font_config)
-            logger.info(f"PDF successfully generated: {pdf_path}")
+            source = HTML(string=html_content, base_url=str(output_path.parent))
+            # A fresh image cache per render: identical assets (e.g. watermark.png) are
+            # decoded once and embedded as a single XObject, and nothing outlives the report
+            source.render(font_config=self.font_config, cache={}, **options).write_pdf(pdf_path)
+
+            optimized_size = pdf_path.stat().st_size
+            # Optimization is applied while rendering, so measuring the unoptimized size
+            # means rendering again; off by default, leaving original_size None (not measured)
+            original_size = None if options else optimized_size
+            if options and settings.PDF_MEASURE_ORIGINAL_SIZE:
+                original_size = len(source.render(font_config=self.font_config, cache={}).write_pdf())
+
+            self._pdf_stats = {
+                "preset": preset_name,
+                "original_size": original_size,
+                "optimized_size": optimized_size,
+            }
+            size_change = f"{original_size} -> {optimized_size}" if original_size is not None else f"{optimized_size}"
+            logger.info(f"PDF successfully generated: {pdf_path} ({preset_name} preset, {size_change} bytes)")
             return pdf_path
         except Exception as e:
             logger.error(f"PDF generation failed: {e}")
@@ -527,46 +898,159 @@ class PDFReportGenerator:
                 "model": config.model,
                 "temperature": config.temperature,
             },
-            "usage": self._total_usage
+            "usage": self._total_usage,
+            "pdf_optimization": self._pdf_stats,
+            "hedging": self._hedge_stats
+        }
+
+    def generate_draft_report(self, config: ReportConfig, output_path: Path) -> Dict[str, Any]:
+        """
+        Generates a condensed, outline-level draft with a single structured call on a fast
+        model and renders it with a lightweight template. Meant to finish in seconds.
+        """
+        self.sections_total = 1
+        client = self.initialize_openai_client()
+        section_list = "\n".join(f"- {title}" for title in DRAFT_SECTION_TITLES)
+        prompt = f"""
+                You are a senior RTTP expert giving a quick first read on a technology idea.
+                The topic is: '{config.topic}'
+                Write a condensed, outline-level assessment covering exactly these sections:
+                {section_list}
+
+                Respond with a JSON object of the form:
+                {{"value_proposition": "one sentence",
+                  "sections": [{{"title": "section title", "summary": "2-3 sentences", "points": ["3-5 short insights"]}}],
+                  "verdict": "2-3 sentences on overall readiness and the main open question"}}
+                Be specific to the topic. Do not invent patents, figures or citations.
+                """
+
+        self._check_cancelled()
+        response = client.chat.completions.create(
+            model=settings.DRAFT_REPORT_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=config.temperature,
+            max_tokens=2000,
+            response_format={"type": "json_object"},
+            timeout=settings.DRAFT_REPORT_TIMEOUT_SECONDS
+        )
+        usage = response.usage
+        self._total_usage["prompt_tokens"] += usage.prompt_tokens
+        self._total_usage["completion_tokens"] += usage.completion_tokens
+        self._total_usage["total_tokens"] += usage.total_tokens
+        draft = json.loads(response.choices[0].message.content)
+        self.sections_completed = 1
+        self._check_cancelled()
+
+        sections_html = []
+        for section in draft.get("sections", []):
+            points = "".join(f"<li>{html.escape(str(point))}</li>" for point in section.get("points", []))
+            sections_html.append(
+                f"<h2>{html.escape(str(section.get('title', '')))}</h2>"
+                f"<p>{html.escape(str(section.get('summary', '')))}</p><ul>{points}</ul>")
+
+        css_styles = f"""
+                    @page {{ size: A4; margin: 1.8cm; }}
+                    body {{ font-family: '{config.font_family}', serif; font-size: 10.5pt; line-height: 1.45; color: #333; }}
+                    h1 {{ font-size: 20pt; color: {config.primary_color}; margin-bottom: 0.2cm; }}
+                    h2 {{ font-size: 13pt; color: {config.secondary_color}; border-bottom: 1px solid {config.primary_color};
+                          margin-top: 0.8cm; page-break-after: avoid; }}
+                    .meta {{ color: #777; font-size: 9pt; }}
+                    .value-proposition {{ font-size: 12pt; font-style: italic; margin: 0.5cm 0; }}
+                    .verdict {{ border-left: 3px solid {config.primary_color}; padding-left: 0.4cm; margin-top: 0.8cm; }}
+                    ul {{ padding-left: 20px; }}
+                    """
+        final_html = (
+            f'<!DOCTYPE html><html lang="en"><head><meta charset="UTF-8">'
+            f'<title>Draft Assessment: {html.escape(config.topic[:50])}...</title>'
+            f'<style>{css_styles}</style></head><body>'
+            f'<h1>Draft Technology Assessment</h1>'
+            f'<div class="meta">Generated on: {datetime.now().strftime("%B %d, %Y")} &middot; '
+            f'Outline-level draft; upgrade for the full analysis.</div>'
+            f'<div class="value-proposition">{html.escape(str(draft.get("value_proposition", "")))}</div>'
+            f'{"".join(sections_html)}'
+            f'<div class="verdict"><h2>Verdict</h2><p>{html.escape(str(draft.get("verdict", "")))}</p></div>'
+            f'</body></html>'
+        )
+
+        html_path = output_path.with_suffix(".html")
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(final_html)
+
+        pdf_path = self.convert_html_to_pdf(final_html, html_path, preset="screen")
+        metadata = self.generate_report_metadata(config, html_path, pdf_path, ReportComplexity.DRAFT)
+        metadata["config"]["model"] = settings.DRAFT_REPORT_MODEL
+        logger.info("Draft report generation completed")
+        return {
+            "html": html_path,
+            "pdf": pdf_path,
+            "metadata": metadata
         }
 
-    def generate_complete_report(self, topic: str, output_path_str: str, complexity: ReportComplexity) -> Dict[
-        str, Any]:
+    def generate_complete_report(self, topic: str, output_path_str: str, complexity: ReportComplexity,
+                                 cancel_event: Optional[threading.Event] = None,
+                                 sections: Optional[List[str]] = None,
+                                 patents: Optional[list] = None,
+                                 section_results: Optional[Dict[str, Dict[str, Any]]] = None,
+                                 token_budget: Optional[int] = None,
+                                 supporting_documents: Optional[List[Tuple[str, str]]] = None,
+                                 on_token_estimate: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
         Main method to generate a complete report based on topic, path, and complexity.
+        For CUSTOM complexity, only the chosen sections are generated. Patents retrieved
+        ahead of time (e.g. once for a whole batch) skip the per-report patent search, and
+        section_results ({title: {"content", "usage"}}) already generated offline skip the LLM.
+        With token_budget set, sections stop being generated once the report's LLM usage
+        would exceed it; the remaining sections get a short notice instead. Uploaded
+        supporting_documents ((filename, text) pairs) and patent snippets are indexed once,
+        and each section prompt gets only the excerpts relevant to its title.
+        on_token_estimate is called with the LLM token estimate before the first section call.
+        If cancel_event is set, generation stops before the next section (or mid-stream)
+        and the PDF is not rendered; ReportCancelledError is raised.
         """
         # 1. --- SETUP AND CONFIGURATION ---
         logger.info(f"Starting report generation for topic: '{topic[:100]}...' with complexity: {complexity.value}")
         self._total_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        self._pdf_stats = {}
+        self._hedge_stats = _new_hedge_stats()
+        self._cancel_event = cancel_event
+        self.sections_completed = 0
+        self.token_estimate = None
+        self._token_budget = token_budget
+        section_results = section_results or {}
 
         output_path = Path(output_path_str)
         output_dir = output_path.parent
         output_dir.mkdir(parents=True, exist_ok=True)
         config = ReportConfig(topic=topic, output_dir=str(output_dir))
 
-        # --- DEFINE REPORT STRUCTURE (NUMBER-LESS) ---
-        ALL_SECTION_TITLES = [
-            "Executive Summary", "Problem / Opportunity Statement", "Technology Overview",
-            "Unique Selling Proposition (USP) & Key Benefits", "Applications & Use-Cases", "IP Snapshot",
-            "Next Steps & Development Suggestions", "Expanded Executive Summary",
-            "Problem & Solution Fit (Validated Background)", "Technical Feasibility & TRL", "IP Summary & Landscape",
-            "Market Signals & Traction", "Competitive Intelligence", "Regulatory & Compliance Overview",
-            "Risk Summary & Open Questions", "Business Case & Commercial Viability", "Market Analysis & Forecasts",
-            "Business Models", "Financial Overview & ROI Projection", "Funding Strategy", "Licensing & Exit Strategy",
-            "Team & Strategic Resource Planning", "Implementation Roadmap", "Appendices", "Conclusion", "References"
-        ]
-
-        SECTION_MAPPING = {
-            ReportComplexity.BASIC: [ALL_SECTION_TITLES[i] for i in [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,24,25]],
-            ReportComplexity.ADVANCED: [ALL_SECTION_TITLES[i] for i in [0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,15,16,18,24,25]],
-            ReportComplexity.COMPREHENSIVE: ALL_SECTION_TITLES
-        }
-        report_structure = SECTION_MAPPING[complexity]
+        if complexity == ReportComplexity.DRAFT:
+            return self.generate_draft_report(config, output_path)
+
+        report_structure = get_report_sections(complexity, sections)
+        if not report_structure:
+            raise ValueError(f"No sections to generate for '{complexity.value}' report")
+        self.sections_total = len(report_structure)
         logger.info(f"Generating {len(report_structure)} sections for '{complexity.value}' report.")
 
         client = self.initialize_openai_client()
         logger.info("--- Phase 1: Retrieving patent data ---")
-        verified_patents = self.search_for_patents(client, topic)
+        self._check_cancelled()
+        if patents is not None:
+            logger.info(f"Using {len(patents)} prefetched patents")
+            verified_patents = patents
+        else:
+            verified_patents = self.search_for_patents(client, topic)
+
+        # Build every prompt up front so the report's LLM usage can be estimated before any call
+        context_index = self.build_context_index(verified_patents, supporting_documents)
+        prompts = {
+            title: self.build_prompt_for_report_section(topic, title, i + 1, verified_patents, context_index)
+            for i, title in enumerate(report_structure) if title not in section_results
+        }
+        self.token_estimate = self.estimate_report_tokens(config, prompts)
+        if on_token_estimate is not None:
+            on_token_estimate(self.token_estimate)
+        sections_skipped = []
 
         logger.info("--- Phase 2: Generating report HTML structure ---")
         css_styles = f"""
@@ -732,16 +1216,26 @@ class PDFReportGenerator:
         # --- Generate Content for Each Section with DYNAMIC numbering ---
         logger.info("--- Phase 3: Generating content section by section ---")
         for i, title in enumerate(report_structure):
+            self._check_cancelled()
             section_number = i + 1
             section_id = f"section-{section_number}"
             logger.info(f"Generating section {section_number}: {title}...")
 
-            data_to_pass = verified_patents if any(k in title for k in ["IP", "Patent", "Appendices"]) else None
-            prompt = self.build_prompt_for_section(topic, title, section_number, data=data_to_pass)
-            section_content = self.generate_html_for_section(client, config, prompt)
+            if title in section_results:
+                section_content = self.use_precomputed_section(section_results[title])
+            elif sections_skipped or not self._fit_section_to_budget(self.token_estimate["section_prompt_tokens"][title]):
+                logger.warning(f"LLM token budget of {token_budget} exhausted, skipping section {section_number}")
+                sections_skipped.append(title)
+                section_content = (f"<h2>{section_number}. {html.escape(title)}</h2><p>This section was not "
+                                   f"generated because the report reached its AI usage limit.</p>\n")
+            else:
+                section_content = self.generate_html_for_section(
+                    client, config, prompts[title], self.token_estimate["section_prompt_tokens"][title])
 
             html_parts.append(f'<section id="{section_id}">{section_content}</section>')
+            self.sections_completed += 1
 
+        self._check_cancelled()
         html_parts.append("</body></html>")
         final_html = "".join(html_parts)
 
@@ -753,6 +1247,12 @@ class PDFReportGenerator:
 
         pdf_path = self.convert_html_to_pdf(final_html, html_path)
         metadata = self.generate_report_metadata(config, html_path, pdf_path, complexity)
+        metadata["token_budget"] = {
+            "budget": token_budget,
+            "estimated_tokens": self.token_estimate["total_tokens"],
+            "used_tokens": self._llm_tokens_used(),
+            "sections_skipped": sections_skipped,
+        }
 
         logger.info("🎉 Report generation completed successfully!")
         return {
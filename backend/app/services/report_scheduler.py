@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import statistics
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.models.report import (
+    ReportLog,
+    ReportStatus,
+    ReportComplexity,
+    ReportGenerationMode,
+    SECTION_MAPPING,
+    get_report_sections,
+)
+from app.models.token import TokenTransaction, TokenTransactionStatus
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+ReportRunner = Callable[[str, str, str, str, str], Awaitable[None]]
+
+
+@dataclass
+class QueueEstimate:
+    """Predicted queueing and completion time for a new report"""
+    queue_depth: int
+    wait_seconds: float
+    completion_seconds: float
+    admitted: bool
+    retry_after_seconds: int = 0
+
+
+class ReportScheduler:
+    """
+    Fair-share scheduler in front of report execution.
+
+    Pending reports in Mongo are the queue, so every API worker shares it. Each
+    report gets a weighted fair queuing finish tag when it is enqueued
+    (self-clocked: start = max(system virtual time, user's last tag), finish =
+    start + sections / class weight), which interleaves users and lets paid
+    users and short reports through sooner. Workers dispatch in tag order,
+    skip users already at their concurrency cap, and let reports waiting longer
+    than REPORT_STARVATION_SECONDS jump the queue. Drafts are dispatched the same
+    way from their own REPORT_DRAFT_SLOTS, with their own per-user cap, so a draft
+    only ever waits behind other drafts. A dispatched report holds a lease its worker
+    renews; reports whose lease lapses are recovered by any worker.
+    """
+
+    def __init__(self):
+        self._runner: Optional[ReportRunner] = None
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_drafts: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._section_seconds: Optional[float] = None
+        self._section_seconds_at = 0.0
+        self._recovered_at = 0.0
+
+    async def start(self, runner: ReportRunner):
+        """Start dispatching reports in this worker using runner(report_id, idea, complexity, email, name)"""
+        self._runner = runner
+        self._wakeup = asyncio.Event()
+        try:
+            await self.recover_stale_reports()
+        except Exception as e:
+            logger.error(f"Report recovery failed at startup: {e}")
+        self._loop_task = asyncio.create_task(self._dispatch_loop())
+        logger.info(f"Report scheduler started with {settings.REPORT_MAX_CONCURRENT_JOBS} slots "
+                    f"and {settings.REPORT_DRAFT_SLOTS} draft slots")
+
+    async def stop(self):
+        """Stop dispatching; reports already running are left to finish"""
+        if self._loop_task:
+            self._loop_task.cancel()
+            self._loop_task = None
+        logger.info("Report scheduler stopped")
+
+    def notify(self):
+        """Wake the dispatcher after a report is enqueued or a slot frees up"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def get_priority_class(self, user: User) -> str:
+        """Users who have purchased tokens are scheduled in the paid class"""
+        paid = await TokenTransaction.find_one({
+            "user_id": str(user.id),
+            "status": TokenTransactionStatus.COMPLETED,
+        })
+        return "paid" if paid else "standard"
+
+    async def enqueue(self, report: ReportLog, user: User):
+        """Assign the report's priority class and fair-share finish tag, then wake the dispatcher"""
+        # System virtual time: the tag of the report dispatched most recently
+        last_dispatched = await ReportLog.find(
+            {"dispatched_at": {"$ne": None}, "virtual_finish": {"$ne": None}}
+        ).sort([("dispatched_at", -1)]).limit(1).to_list()
+        system_time = last_dispatched[0].virtual_finish if last_dispatched else 0.0
+
+        if report.complexity == ReportComplexity.DRAFT:
+            # Drafts are a single fast LLM call: tagged at the current virtual time they go
+            # ahead of queued full reports, but are claimed like any other report, within
+            # the worker's slots and the user's cap
+            report.priority_class = "draft"
+            report.virtual_finish = system_time
+        else:
+            priority_class = await self.get_priority_class(user)
+            weight = settings.REPORT_PRIORITY_WEIGHTS.get(priority_class, 1.0)
+            cost = len(get_report_sections(report.complexity, report.sections)) or 1
+
+            # A user's reports queue behind their own earlier reports
+            user_last = await ReportLog.find(
+                {"user_id": report.user_id, "status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]},
+                 "virtual_finish": {"$ne": None}}
+            ).sort([("virtual_finish", -1)]).limit(1).to_list()
+            user_time = user_last[0].virtual_finish if user_last else 0.0
+
+            report.priority_class = priority_class
+            report.virtual_finish = max(system_time, user_time) + cost / weight
+        await report.save()
+        logger.info(f"Enqueued report {report.id} ({report.priority_class}, finish tag {report.virtual_finish:.2f})")
+        self.notify()
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                if time.monotonic() - self._recovered_at >= settings.REPORT_RECOVERY_SECONDS:
+                    await self.recover_stale_reports()
+                await self._dispatch_available()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Report scheduler dispatch failed: {e}")
+
+            # Poll as well, so reports enqueued or freed on other workers are picked up
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.REPORT_SCHEDULER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _dispatch_available(self):
+        for drafts, slots in ((True, settings.REPORT_DRAFT_SLOTS), (False, settings.REPORT_MAX_CONCURRENT_JOBS)):
+            while self._running_count(drafts) < slots:
+                report = await self._claim_next(drafts)
+                if report is None:
+                    break
+                self._start_job(report)
+
+    def _running_count(self, drafts: bool) -> int:
+        if drafts:
+            return len(self._running_drafts)
+        return len(self._running) - len(self._running_drafts)
+
+    def _start_job(self, report: ReportLog):
+        async def run():
+            lease = asyncio.create_task(self._renew_lease(report))
+            try:
+                user = await User.get(report.user_id)
+                await self._runner(
+                    str(report.id),
+                    report.idea,
+                    report.complexity,
+                    user.email if user else "",
+                    user.name if user else "",
+                )
+            finally:
+                lease.cancel()
+                self._running.pop(str(report.id), None)
+                self._running_drafts.discard(str(report.id))
+                self.notify()
+
+        if report.complexity == ReportComplexity.DRAFT:
+            self._running_drafts.add(str(report.id))
+        self._running[str(report.id)] = asyncio.create_task(run())
+
+    async def _renew_lease(self, report: ReportLog):
+        """Renew the lease of a report while its job runs in this worker"""
+        while True:
+            await asyncio.sleep(settings.REPORT_HEARTBEAT_SECONDS)
+            try:
+                await ReportLog.find_one(
+                    {"_id": report.id, "status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]}}
+                ).update({"$set": {"heartbeat_at": datetime.utcnow()}})
+            except Exception as e:
+                logger.warning(f"Failed to renew the lease of report {report.id}: {e}")
+
+    async def recover_stale_reports(self):
+        """
+        Recover reports whose worker stopped renewing their lease (deploy, crash, OOM):
+        requeue them, or after REPORT_MAX_DISPATCH_ATTEMPTS dispatches fail them and
+        release their tokens. Reports still running after REPORT_JOB_TIMEOUT_SECONDS are
+        asked to cancel, which refunds the sections not generated. Report batches whose
+        preparation stalled are recovered too, since their reports never reach enqueue.
+        """
+        self._recovered_at = time.monotonic()
+        now = datetime.utcnow()
+        lease_expired = now - timedelta(seconds=settings.REPORT_LEASE_SECONDS)
+        abandoned = await ReportLog.find({
+            "status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]},
+            "dispatched_at": {"$lt": lease_expired},
+            "$or": [{"heartbeat_at": None}, {"heartbeat_at": {"$lt": lease_expired}}],
+        }).to_list()
+
+        for report in abandoned:
+            # Conditional on the lapsed lease, so only one worker recovers each report
+            claim = {"_id": report.id, "status": report.status, "heartbeat_at": report.heartbeat_at}
+            if report.cancel_requested:
+                update = {"status": ReportStatus.CANCELLED, "tokens_refunded": report.tokens_used, "cancelled_at": now}
+            elif report.dispatch_attempts < settings.REPORT_MAX_DISPATCH_ATTEMPTS:
+                update = {"status": ReportStatus.PENDING, "dispatched_at": None, "heartbeat_at": None}
+            else:
+                update = {"status": ReportStatus.FAILED, "error_message": "Report generation was interrupted"}
+            result = await ReportLog.find_one(claim).update({"$set": {**update, "updated_at": now}})
+            if not result.modified_count:
+                continue
+
+            if update["status"] == ReportStatus.PENDING:
+                logger.warning(f"Requeued report {report.id}: its worker stopped renewing the lease")
+                self.notify()
+                continue
+            logger.warning(f"Report {report.id} abandoned after {report.dispatch_attempts} dispatches, "
+                           f"marked {update['status'].value}")
+            await report.release_upgraded_draft()
+            try:
+                user = await User.get(report.user_id)
+                if user and await user.release_tokens(str(report.id), report.tokens_used):
+                    logger.info(f"Refunded {report.tokens_used} tokens for abandoned report {report.id}")
+            except Exception as e:
+                logger.error(f"Failed to refund tokens for user {report.user_id} on report {report.id}: {e}")
+
+        overdue = await ReportLog.find({
+            "status": ReportStatus.PROCESSING,
+            "cancel_requested": {"$ne": True},
+            "dispatched_at": {"$lt": now - timedelta(seconds=settings.REPORT_JOB_TIMEOUT_SECONDS)},
+        }).to_list()
+        for report in overdue:
+            await ReportLog.find_one({"_id": report.id, "status": ReportStatus.PROCESSING}).update(
+                {"$set": {"cancel_requested": True, "updated_at": now}}
+            )
+            logger.warning(f"Report {report.id} exceeded REPORT_JOB_TIMEOUT_SECONDS, cancelling it")
+
+        # Imported here: batch_service enqueues through this module
+        from app.services.batch_service import recover_stale_batches
+        await recover_stale_batches()
+
+    @staticmethod
+    def _kind(drafts: bool) -> dict:
+        """Query for drafts, or for every other report"""
+        return {"complexity": ReportComplexity.DRAFT if drafts else {"$ne": ReportComplexity.DRAFT}}
+
+    async def _active_counts(self, user_ids: Iterable[str], drafts: bool = False) -> Dict[str, int]:
+        """Reports (or drafts) dispatched and still running (lease held) per user, across all workers"""
+        lease_valid = datetime.utcnow() - timedelta(seconds=settings.REPORT_LEASE_SECONDS)
+        rows = await ReportLog.find({
+            **self._kind(drafts),
+            "user_id": {"$in": list(user_ids)},
+            "status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]},
+            "dispatched_at": {"$ne": None},
+            "heartbeat_at": {"$gte": lease_valid},
+        }).aggregate([{"$group": {"_id": "$user_id", "count": {"$sum": 1}}}]).to_list()
+        return {row["_id"]: row["count"] for row in rows}
+
+    async def _candidates(self, drafts: bool = False) -> List[ReportLog]:
+        """Starving reports (or drafts) first, oldest first, then the rest in finish-tag order"""
+        # Reports get a finish tag once enqueued. Rows without one (batch reports still
+        # being prepared, offline reports awaiting bulk results, reports created before
+        # the scheduler) are never dispatched from here.
+        queued = {"status": ReportStatus.PENDING, "dispatched_at": None, "virtual_finish": {"$ne": None},
+                  **self._kind(drafts)}
+        starving_before = datetime.utcnow() - timedelta(seconds=settings.REPORT_STARVATION_SECONDS)
+        starving = await ReportLog.find(
+            {**queued, "created_at": {"$lt": starving_before}}
+        ).sort([("created_at", 1)]).limit(20).to_list()
+        fair = await ReportLog.find(queued).sort([("virtual_finish", 1), ("created_at", 1)]).limit(100).to_list()
+
+        seen = {report.id for report in starving}
+        return starving + [report for report in fair if report.id not in seen]
+
+    async def _claim_next(self, drafts: bool = False) -> Optional[ReportLog]:
+        candidates = await self._candidates(drafts)
+        if not candidates:
+            return None
+
+        active = await self._active_counts({report.user_id for report in candidates}, drafts)
+        user_cap = settings.REPORT_MAX_CONCURRENT_DRAFTS_PER_USER if drafts else settings.REPORT_MAX_CONCURRENT_PER_USER
+        for report in candidates:
+            if active.get(report.user_id, 0) >= user_cap:
+                continue
+
+            now = datetime.utcnow()
+            wait_seconds = (now - report.created_at).total_seconds()
+            # Atomic claim so only one worker dispatches each report
+            result = await ReportLog.find_one(
+                {"_id": report.id, "status": ReportStatus.PENDING, "dispatched_at": None}
+            ).update({
+                "$set": {"dispatched_at": now, "heartbeat_at": now, "queue_wait_seconds": wait_seconds},
+                "$inc": {"dispatch_attempts": 1},
+            })
+            if result.modified_count:
+                report.dispatched_at = now
+                report.heartbeat_at = now
+                report.dispatch_attempts += 1
+                report.queue_wait_seconds = wait_seconds
+                logger.info(f"Dispatching report {report.id} after {wait_seconds:.1f}s in queue")
+                return report
+        return None
+
+    async def get_section_seconds(self) -> float:
+        """Median observed generation time per section over recent reports, cached for a minute"""
+        if self._section_seconds is not None and time.monotonic() - self._section_seconds_at < 60:
+            return self._section_seconds
+
+        recent = await ReportLog.find(
+            {"status": ReportStatus.COMPLETED, "generation_time": {"$ne": None}}
+        ).sort([("completed_at", -1)]).limit(50).to_list()
+        per_section = [
+            report.generation_time / len(get_report_sections(report.complexity, report.sections))
+            for report in recent
+            if get_report_sections(report.complexity, report.sections)
+        ]
+        self._section_seconds = (
+            statistics.median(per_section) if per_section else settings.REPORT_DEFAULT_SECTION_SECONDS
+        )
+        self._section_seconds_at = time.monotonic()
+        return self._section_seconds
+
+    async def estimate(self, complexity, sections: Optional[List[str]] = None) -> QueueEstimate:
+        """Predict when a new report of this complexity would finish, and whether to admit it"""
+        if complexity == ReportComplexity.DRAFT:
+            return await self._estimate_draft()
+
+        # Offline reports wait on the bulk LLM path and drafts on their own slots, not on live capacity
+        rows = await ReportLog.find(
+            {"status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]},
+             "generation_mode": {"$ne": ReportGenerationMode.OFFLINE}, **self._kind(False)}
+        ).aggregate(
+            [{"$group": {
+                "_id": {"status": "$status", "complexity": "$complexity"},
+                "count": {"$sum": 1},
+                "custom_sections": {"$sum": {"$size": {"$ifNull": ["$sections", []]}}},
+            }}]
+        ).to_list()
+
+        queue_depth = 0
+        backlog_sections = 0.0
+        for row in rows:
+            if row["_id"]["complexity"] == ReportComplexity.CUSTOM:
+                row_sections = row["custom_sections"]
+            else:
+                row_sections = len(SECTION_MAPPING.get(row["_id"]["complexity"], [])) * row["count"]
+            if row["_id"]["status"] == ReportStatus.PENDING:
+                queue_depth += row["count"]
+                backlog_sections += row_sections
+            else:
+                # Running reports are on average half done
+                backlog_sections += row_sections / 2
+
+        section_seconds = await self.get_section_seconds()
+        capacity = max(settings.REPORT_MAX_CONCURRENT_JOBS * settings.REPORT_WORKER_COUNT, 1)
+        wait_seconds = backlog_sections * section_seconds / capacity
+        completion_seconds = wait_seconds + len(get_report_sections(complexity, sections)) * section_seconds
+        return self._admit(queue_depth, wait_seconds, completion_seconds)
+
+    async def _estimate_draft(self) -> QueueEstimate:
+        """
+        Drafts queue only behind other drafts, for the draft slots. Each takes at most
+        DRAFT_REPORT_TIMEOUT_SECONDS, so a draft waits one such round for every full set
+        of slots ahead of it (running drafts included).
+        """
+        drafts = {**self._kind(True), "status": {"$in": [ReportStatus.PENDING, ReportStatus.PROCESSING]}}
+        queue_depth = await ReportLog.find({**drafts, "dispatched_at": None}).count()
+        in_system = await ReportLog.find(drafts).count()
+        capacity = max(settings.REPORT_DRAFT_SLOTS * settings.REPORT_WORKER_COUNT, 1)
+        wait_seconds = (in_system // capacity) * settings.DRAFT_REPORT_TIMEOUT_SECONDS
+        return self._admit(queue_depth, wait_seconds, wait_seconds + settings.DRAFT_REPORT_TIMEOUT_SECONDS)
+
+    @staticmethod
+    def _admit(queue_depth: int, wait_seconds: float, completion_seconds: float) -> QueueEstimate:
+        """Admit a new report unless the queue is over its depth or wait limit"""
+        over_depth = queue_depth >= settings.REPORT_MAX_QUEUE_DEPTH
+        over_wait = wait_seconds > settings.REPORT_MAX_QUEUE_WAIT_SECONDS
+        retry_after = 0
+        if over_depth or over_wait:
+            excess_seconds = max(
+                wait_seconds - settings.REPORT_MAX_QUEUE_WAIT_SECONDS,
+                (queue_depth - settings.REPORT_MAX_QUEUE_DEPTH + 1) * wait_seconds / max(queue_depth, 1),
+            )
+            retry_after = max(int(excess_seconds), settings.REPORT_MIN_RETRY_AFTER_SECONDS)
+
+        return QueueEstimate(
+            queue_depth=queue_depth,
+            wait_seconds=wait_seconds,
+            completion_seconds=completion_seconds,
+            admitted=not (over_depth or over_wait),
+            retry_after_seconds=retry_after,
+        )
+
+    async def get_metrics(self) -> dict:
+        """Queue depth and wait-time metrics across all workers"""
+        queued = {"status": ReportStatus.PENDING, "dispatched_at": None}
+        depth_rows = await ReportLog.find(queued).aggregate(
+            [{"$group": {"_id": "$priority_class", "count": {"$sum": 1}}}]
+        ).to_list()
+        oldest = await ReportLog.find(queued).sort([("created_at", 1)]).limit(1).to_list()
+        processing = await ReportLog.find({"status": ReportStatus.PROCESSING}).count()
+
+        recent = await ReportLog.find(
+            {"queue_wait_seconds": {"$ne": None}}
+        ).sort([("dispatched_at", -1)]).limit(200).to_list()
+        waits = sorted(report.queue_wait_seconds for report in recent)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(int(len(waits) * p), len(waits) - 1)], 1)
+
+        return {
+            "queue_depth": sum(row["count"] for row in depth_rows),
+            "queue_depth_by_class": {row["_id"] or "standard": row["count"] for row in depth_rows},
+            "processing": processing,
+            "running_in_worker": len(self._running),
+            "oldest_wait_seconds": (
+                round((datetime.utcnow() - oldest[0].created_at).total_seconds(), 1) if oldest else 0
+            ),
+            "wait_seconds_p50": percentile(0.5),
+            "wait_seconds_p95": percentile(0.95),
+        }
+
+
+report_scheduler = ReportScheduler()
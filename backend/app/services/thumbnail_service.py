@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import uuid
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pages to preview: the cover and the first content page after the table of contents
+THUMBNAIL_PAGES = ("cover", "first-page")
+
+# pypdfium2 (PDFium) is not thread-safe, so renders from the post-generation stage and
+# the endpoint backfill are serialized
+_pdfium_lock = threading.Lock()
+
+THUMBNAIL_MEDIA_TYPES = {
+    "webp": "image/webp",
+    "png": "image/png",
+}
+
+
+def get_thumbnail_path(pdf_path: str, page: str, fmt: str) -> str:
+    """Thumbnails are cached next to the PDF artifact, e.g. reports/<id>.cover.webp"""
+    base, _ = os.path.splitext(pdf_path)
+    return f"{base}.{page}.{fmt}"
+
+
+def iter_bookmarks(pdf) -> Iterator[Tuple[str, Optional[int]]]:
+    """(title, page index) of each PDF outline entry; pypdfium2 4 yields tuples, 5 bookmark objects"""
+    for item in pdf.get_toc():
+        if hasattr(item, "get_title"):
+            dest = item.get_dest()
+            yield item.get_title(), dest.get_index() if dest else None
+        else:
+            yield item.title, item.page_index
+
+
+def find_first_content_page(pdf) -> int:
+    """
+    Index of the first page after the table of contents, from the PDF outline (WeasyPrint
+    bookmarks every heading), so a table of contents of any length is skipped. Without
+    an outline it is the page after a one-page table of contents.
+    """
+    toc_page = None
+    try:
+        for title, page_index in iter_bookmarks(pdf):
+            if page_index is None:
+                continue
+            if toc_page is None:
+                if title.strip().lower() == "table of contents":
+                    toc_page = page_index
+            elif page_index > toc_page:
+                return page_index
+    except Exception as e:
+        logger.warning(f"Could not read the PDF outline: {e}")
+    return 2
+
+
+def generate_thumbnails(pdf_path: str, fmt: Optional[str] = None) -> Dict[str, str]:
+    """
+    Rasterize the preview pages of a PDF into small thumbnails.
+    Blocking; run it in an executor. Returns a mapping of page name to file path.
+    """
+    fmt = (fmt or settings.THUMBNAIL_FORMAT).lower()
+    if fmt not in THUMBNAIL_MEDIA_TYPES:
+        raise ValueError(f"Unsupported thumbnail format: {fmt}")
+
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        logger.warning("pypdfium2 is not installed, skipping thumbnail generation")
+        return {}
+
+    thumbnails = {}
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page_count = len(pdf)
+            pages = {"cover": 0, "first-page": find_first_content_page(pdf)}
+            for name in THUMBNAIL_PAGES:
+                page = pdf[min(pages[name], page_count - 1)]
+                try:
+                    # Render at the scale needed for the target width, then let Pillow
+                    # downsample with a high quality filter.
+                    scale = (settings.THUMBNAIL_WIDTH * 2) / page.get_width()
+                    image = page.render(scale=scale).to_pil()
+                finally:
+                    page.close()
+
+                image.thumbnail((settings.THUMBNAIL_WIDTH, settings.THUMBNAIL_WIDTH * 2))
+                path = get_thumbnail_path(pdf_path, name, fmt)
+                # Written aside and moved into place: the endpoint serves whatever exists at
+                # path with a long-lived cache header, so it must never see a partial file
+                temp_path = f"{path}.{uuid.uuid4().hex}"
+                if fmt == "webp":
+                    image.save(temp_path, "WEBP", quality=settings.THUMBNAIL_QUALITY, method=6)
+                else:
+                    image.quantize(colors=256).save(temp_path, "PNG", optimize=True)
+                os.replace(temp_path, path)
+                thumbnails[name] = path
+        finally:
+            pdf.close()
+
+    logger.info(f"Generated {len(thumbnails)} thumbnails for {pdf_path}")
+    return thumbnails
+
+
+def delete_thumbnails(pdf_path: str):
+    """Remove any cached thumbnails for a PDF"""
+    for name in THUMBNAIL_PAGES:
+        for fmt in THUMBNAIL_MEDIA_TYPES:
+            path = get_thumbnail_path(pdf_path, name, fmt)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold-start import time and memory of the API app (main:app).
+Compares the default lazy report engine against eagerly importing
+app.services.report_generator, the way the reports router used to.
+
+Usage: python benchmark_import_time.py [--runs 5] [--top 15]
+Requires the same .env as the API (settings are validated on import).
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    "lazy (current)": "import main",
+    "eager report engine": "import main; import app.services.report_generator",
+}
+
+# Print peak RSS from inside the child so only the import itself is measured
+RSS_SNIPPET = (
+    "; import resource, sys; "
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+    "sys.stdout.write(str(rss // 1024 if sys.platform == 'darwin' else rss))"
+)
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once(code: str):
+    """Run one cold interpreter, returning (total_import_us, peak_rss_kb, per_module)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code + RSS_SNIPPET],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative_us = int(match.group(2))
+        depth = len(match.group(3)) // 2
+        name = match.group(4)
+        modules[name] = cumulative_us
+        if depth == 0:
+            total_us += cumulative_us
+    return total_us, int(result.stdout.strip() or 0), modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    results = {}
+    for label, code in SCENARIOS.items():
+        times, rss, modules = [], [], {}
+        for _ in range(args.runs):
+            total_us, rss_kb, modules = run_once(code)
+            times.append(total_us)
+            rss.append(rss_kb)
+        results[label] = (statistics.median(times), statistics.median(rss), modules)
+
+    print(f"\n📊 Import benchmark for main:app ({args.runs} cold runs each, median)")
+    print(f"{'scenario':<24}{'import time (ms)':>18}{'peak RSS (MB)':>16}")
+    for label, (time_us, rss_kb, _) in results.items():
+        print(f"{label:<24}{time_us / 1000:>18.1f}{rss_kb / 1024:>16.1f}")
+
+    lazy_time, lazy_rss, lazy_modules = results["lazy (current)"]
+    eager_time, eager_rss, eager_modules = results["eager report engine"]
+    print(f"\n✅ Saved per worker: {(eager_time - lazy_time) / 1000:.1f} ms cold start, "
+          f"{(eager_rss - lazy_rss) / 1024:.1f} MB RSS")
+
+    deferred = {
+        name: us for name, us in eager_modules.items()
+        if name not in lazy_modules and "." not in name
+    }
+    if deferred:
+        print(f"\n📦 Top-level packages no longer imported at startup (top {args.top}):")
+        for name, us in sorted(deferred.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {name:<30}{us / 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
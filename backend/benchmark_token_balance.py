@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark User.get_token_balance against the find-then-insert it replaced.
+Counts database round trips with a pymongo command listener and times each call,
+for users whose balance already exists (the hot path) and for new users.
+
+Runs against a scratch database (<DATABASE_NAME>_benchmark) that is dropped afterwards.
+With the balance cache enabled, existing users are served from the cache; set
+BALANCE_CACHE_ENABLED=false to measure the upsert on its own.
+
+Usage: python benchmark_token_balance.py [--users 200]
+Requires the same .env as the API (settings are validated on import).
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from beanie import PydanticObjectId, init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.models.token import SIGNUP_BONUS_TOKENS, UserTokenBalance
+from app.models.user import User
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def legacy_get_token_balance(user: User):
+    """The previous implementation: find_one, then insert on a miss"""
+    balance = await UserTokenBalance.find_one({"user_id": str(user.id)})
+    if not balance:
+        balance = UserTokenBalance(user_id=str(user.id))
+        balance.add_tokens(SIGNUP_BONUS_TOKENS)
+        await balance.insert()
+    return balance
+
+
+async def current_get_token_balance(user: User):
+    return await user.get_token_balance()
+
+
+SCENARIOS = {
+    "find + insert (before)": legacy_get_token_balance,
+    "find-and-upsert (current)": current_get_token_balance,
+}
+
+
+async def measure(get_balance, users, counter: CommandCounter):
+    """(median ms per call, round trips per call) over users"""
+    timings = []
+    counter.count = 0
+    for user in users:
+        started = time.perf_counter()
+        await get_balance(user)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), counter.count / len(users)
+
+
+async def run(user_count: int):
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(settings.MONGODB_URL, event_listeners=[counter])
+    database_name = f"{settings.DATABASE_NAME}_benchmark"
+    await init_beanie(database=client[database_name], document_models=[User, UserTokenBalance])
+
+    try:
+        print(f"\n📊 get_token_balance benchmark ({user_count} users per case, median)")
+        print(f"{'scenario':<28}{'case':<10}{'latency (ms)':>14}{'round trips':>14}")
+        results = {}
+        for label, get_balance in SCENARIOS.items():
+            users = [User(id=PydanticObjectId(), name="Benchmark", email="benchmark@example.com")
+                     for _ in range(user_count)]
+            for case in ("new", "existing"):
+                latency, round_trips = await measure(get_balance, users, counter)
+                results[(label, case)] = (latency, round_trips)
+                print(f"{label:<28}{case:<10}{latency:>14.2f}{round_trips:>14.1f}")
+
+        before, after = SCENARIOS
+        for case in ("new", "existing"):
+            saved = results[(before, case)][1] - results[(after, case)][1]
+            faster = results[(before, case)][0] - results[(after, case)][0]
+            print(f"\n✅ {case} users: {saved:.1f} round trips and {faster:.2f} ms saved per call")
+    finally:
+        await client.drop_database(database_name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.users))
+
+
+if __name__ == "__main__":
+    main()
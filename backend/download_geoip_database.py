@@ -0,0 +1,52 @@
+"""
+Download the free DB-IP "IP to Country Lite" database (MaxMind .mmdb format, CC BY 4.0)
+to GEOIP_DATABASE_PATH, which the API reads to pick the checkout currency.
+
+DB-IP publishes a new edition monthly; rerun this (e.g. from a monthly cron or at image
+build) to stay current, then restart the API. A MaxMind GeoLite2-Country.mmdb works too:
+download it with your MaxMind license key and point GEOIP_DATABASE_PATH at it.
+
+Usage:
+    cd backend
+    source .venv/bin/activate
+    python download_geoip_database.py
+"""
+import gzip
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from app.core.config import settings
+
+DBIP_URL = "https://download.db-ip.com/free/dbip-country-lite-{month}.mmdb.gz"
+
+
+def download(path: str):
+    this_month = date.today().replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    # Early in the month the new edition may not be published yet
+    for month in (this_month, last_month):
+        url = DBIP_URL.format(month=month.strftime("%Y-%m"))
+        print(f"Downloading {url}...")
+        response = httpx.get(url, timeout=120.0, follow_redirects=True)
+        if response.status_code == 404:
+            continue
+        response.raise_for_status()
+        temporary_path = f"{path}.download"
+        with open(temporary_path, "wb") as database_file:
+            database_file.write(gzip.decompress(response.content))
+        os.replace(temporary_path, path)
+        print(f"✅ Saved {path} ({os.path.getsize(path)} bytes)")
+        return
+    print("❌ No DB-IP edition found for this or last month")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    if not settings.GEOIP_DATABASE_PATH:
+        print("GEOIP_DATABASE_PATH is not set")
+        sys.exit(1)
+    download(settings.GEOIP_DATABASE_PATH)
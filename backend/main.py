@@ -10,9 +10,18 @@ from app.core.database import init_database
 from app.core.security import setup_security_middleware
 from app.core.rate_limiter import setup_rate_limiting
 from app.api.routes import auth, users, tokens, reports, webhooks, admin, contact
+from app.api.routes import batches, documents
 from app.api.routes import blog
 from app.api.routes import onboarding
 from app.core.exceptions import setup_exception_handlers
+from app.services.report_scheduler import report_scheduler
+from app.services.offline_report_service import offline_report_pipeline
+from app.services.document_service import shutdown_extractions
+from app.services.payment_gateway import shutdown_payment_gateway
+from app.services.balance_cache import token_balance_cache
+from app.services.payment_service import webhook_inbox
+from app.services.exchange_rate_service import exchange_rate_service
+from app.services.price_catalog import price_catalog
 
 # Configure logging
 logging.basicConfig(
@@ -28,11 +37,25 @@ async def lifespan(app: FastAPI):
     logger.info("Starting up Asasy API...")
     await init_database()
     logger.info("Database initialized successfully")
+    await report_scheduler.start(reports.generate_report_background)
+    await offline_report_pipeline.start()
+    await token_balance_cache.start()
+    await webhook_inbox.start()
+    await exchange_rate_service.start()
+    await price_catalog.start()
 
     yield
 
     # Shutdown
     logger.info("Shutting down Asasy API...")
+    await webhook_inbox.stop()
+    await exchange_rate_service.stop()
+    await price_catalog.stop()
+    await offline_report_pipeline.stop()
+    await report_scheduler.stop()
+    shutdown_extractions()
+    shutdown_payment_gateway()
+    await token_balance_cache.stop()
 
 
 # Create FastAPI app
@@ -79,10 +102,23 @@ async def health_check():
     }
 
 
+@app.get("/health/queue")
+async def report_queue_health():
+    """Report queue depth and predicted wait, for autoscaling"""
+    estimate = await report_scheduler.estimate(None)
+    return {
+        "queue_depth": estimate.queue_depth,
+        "estimated_wait_seconds": round(estimate.wait_seconds, 1),
+        "over_capacity": not estimate.admitted,
+    }
+
+
 # API routes
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
 app.include_router(tokens.router, prefix="/tokens", tags=["Tokens"])
+app.include_router(batches.router, prefix="/reports/batch", tags=["Report Batches"])
+app.include_router(documents.router, prefix="/reports/documents", tags=["Supporting Documents"])
 app.include_router(reports.router, prefix="/reports", tags=["Reports"])
 app.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
@@ -0,0 +1,79 @@
+"""
+Run once before deploying the unique index on user_token_balances.user_id.
+
+Removes duplicate balances left by the old find-then-insert race (keeping the oldest,
+which is the one every later update reached) and drops the old non-unique user_id
+index so the API can create the unique one on startup.
+
+The kept balance's version is moved past every removed duplicate's, and each affected
+user's cached balance is dropped from Redis with an invalidation published to running
+workers. If Redis can't be reached (a warning is printed), flush the cached balances
+by hand before relying on them:
+
+    redis-cli --scan --pattern 'token_balance:*' | xargs -r redis-cli del
+
+Usage:
+    cd backend
+    source .venv/bin/activate
+    python migrate_token_balances.py
+"""
+import asyncio
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.services.balance_cache import token_balance_cache
+
+
+async def migrate():
+    print("Connecting to MongoDB...")
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    balances = client[settings.DATABASE_NAME]["user_token_balances"]
+
+    print("\n--- Removing duplicate balances ---")
+    duplicates = balances.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1},
+                    "max_version": {"$max": "$version"}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    removed = 0
+    affected_users = []
+    async for group in duplicates:
+        keep, extra = group["ids"][0], group["ids"][1:]
+        result = await balances.delete_many({"_id": {"$in": extra}})
+        # Newer than any cached copy of a removed duplicate, so the cache can't keep one
+        await balances.update_one(
+            {"_id": keep},
+            {"$set": {"version": (group["max_version"] or 0) + 1, "updated_at": datetime.utcnow()}},
+        )
+        removed += result.deleted_count
+        affected_users.append(group["_id"])
+        print(f"  ✓ User {group['_id']}: kept {keep}, removed {result.deleted_count}")
+    print(f"Removed {removed} duplicate balances")
+
+    print("\n--- Invalidating cached balances ---")
+    for user_id in affected_users:
+        await token_balance_cache.invalidate(user_id)
+    await token_balance_cache.stop()
+    print(f"  ✓ Invalidated {len(affected_users)} cached balances")
+
+    print("\n--- Replacing the user_id index ---")
+    indexes = await balances.index_information()
+    old = indexes.get("user_id_1")
+    if old and not old.get("unique"):
+        await balances.drop_index("user_id_1")
+        print("  ✓ Dropped non-unique user_id_1")
+    await balances.create_index("user_id", unique=True)
+    print("  ✓ Unique user_id_1 in place")
+
+    print("\n✅ Migration complete.")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,81 @@
+"""
+Run once right after deploying token reservations, with the deploy time (UTC) as the cutoff.
+
+Reports created before reservations were charged with a plain deduction, so the ones
+still pending or processing have no reservation: if they failed or were cancelled no
+refund would be made. For each such report created before the cutoff, this moves its
+tokens from used to reserved under a reservation keyed by the report, which the API
+then commits or releases like any other. Available balances don't change.
+
+Safe to rerun: reports that already have a reservation are skipped.
+
+Each backfill bumps the balance version, and the user's cached balance is dropped from
+Redis with an invalidation published to running workers. If Redis can't be reached (a
+warning is printed), flush the cached balances by hand before relying on them:
+
+    redis-cli --scan --pattern 'token_balance:*' | xargs -r redis-cli del
+
+Usage:
+    cd backend
+    source .venv/bin/activate
+    python migrate_token_reservations.py 2026-10-20T09:00:00
+"""
+import asyncio
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.services.balance_cache import token_balance_cache
+
+
+async def migrate(cutoff: datetime):
+    print("Connecting to MongoDB...")
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    database = client[settings.DATABASE_NAME]
+    reports = database["reports"]
+    balances = database["user_token_balances"]
+
+    print(f"\n--- Backfilling reservations for in-flight reports created before {cutoff} ---")
+    in_flight = reports.find({
+        "status": {"$in": ["pending", "processing"]},
+        "tokens_used": {"$gt": 0},
+        "created_at": {"$lt": cutoff},
+    })
+    backfilled = skipped = 0
+    async for report in in_flight:
+        report_id = str(report["_id"])
+        tokens = report["tokens_used"]
+        result = await balances.update_one(
+            {
+                "user_id": report["user_id"],
+                f"reservations.{report_id}": {"$exists": False},
+                "used_tokens": {"$gte": tokens},
+            },
+            {
+                "$inc": {"used_tokens": -tokens, "reserved_tokens": tokens, "version": 1},
+                "$set": {f"reservations.{report_id}": tokens, "updated_at": datetime.utcnow()},
+            },
+        )
+        if result.modified_count:
+            await token_balance_cache.invalidate(report["user_id"])
+            backfilled += 1
+            print(f"  ✓ Report {report_id} ({report['status']}): reserved {tokens} tokens for user {report['user_id']}")
+        else:
+            skipped += 1
+            print(f"  - Report {report_id}: already reserved, or the user's balance has too few used tokens")
+    print(f"Backfilled {backfilled} reservations, skipped {skipped} reports")
+    await token_balance_cache.stop()
+
+    print("\n✅ Migration complete.")
+    client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(migrate(datetime.fromisoformat(sys.argv[1])))
@@ -0,0 +1,64 @@
+"""
+Run once before deploying the unique index on token_transactions.razorpay_order_id.
+
+Before the webhook inbox, verify-payment and the webhooks could each record an order.
+This lists orders with more than one transaction (each may have been credited more
+than once) and stops, so they can be reviewed and merged by hand. With no duplicates
+it creates the unique index the API expects.
+
+Usage:
+    cd backend
+    source .venv/bin/activate
+    python migrate_token_transactions.py
+"""
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+
+
+async def migrate():
+    print("Connecting to MongoDB...")
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    transactions = client[settings.DATABASE_NAME]["token_transactions"]
+
+    print("\n--- Checking for orders with several transactions ---")
+    duplicates = await transactions.aggregate([
+        {"$match": {"razorpay_order_id": {"$type": "string"}}},
+        {"$group": {
+            "_id": "$razorpay_order_id",
+            "transactions": {"$push": {"id": "$_id", "user_id": "$user_id", "tokens": "$tokens_purchased", "status": "$status"}},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]).to_list(None)
+
+    if duplicates:
+        for group in duplicates:
+            print(f"  ✗ Order {group['_id']}:")
+            for transaction in group["transactions"]:
+                print(f"      {transaction['id']} user={transaction['user_id']} "
+                      f"tokens={transaction['tokens']} status={transaction['status']}")
+        print(f"\n❌ {len(duplicates)} orders need review; remove the extra transactions and rerun.")
+        client.close()
+        sys.exit(1)
+
+    print("\n--- Creating the unique order index ---")
+    await transactions.create_index(
+        "razorpay_order_id",
+        unique=True,
+        partialFilterExpression={"razorpay_order_id": {"$type": "string"}},
+    )
+    await transactions.create_index("razorpay_payment_id")
+    print("  ✓ razorpay_order_id (unique) and razorpay_payment_id indexed")
+
+    print("\n✅ Migration complete.")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,62 @@
+"""
+Shared fixtures. Tests that touch the database run against a throwaway database on
+TEST_MONGODB_URL (default: a local MongoDB) and are skipped when it is unreachable.
+"""
+import os
+import uuid
+
+# Settings are read at import time, so test defaults go in before any app import
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("MONGODB_URL", os.environ.get("TEST_MONGODB_URL", "mongodb://localhost:27017"))
+for name in ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "RAZORPAY_KEY_ID", "RAZORPAY_KEY_SECRET",
+             "RAZORPAY_WEBHOOK_SECRET", "OPENAI_API_KEY", "SERPAPI_API_KEY", "EXCHANGE_RATE_API_KEY"):
+    os.environ.setdefault(name, f"test-{name.lower()}")
+os.environ["BALANCE_CACHE_ENABLED"] = "false"
+
+import pytest
+import pytest_asyncio
+from beanie import init_beanie
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.database import DOCUMENT_MODELS
+from app.models.token import TokenPackage, TokenPackageType
+from app.models.user import User
+
+
+@pytest_asyncio.fixture
+async def db():
+    client = AsyncIOMotorClient(os.environ.get("TEST_MONGODB_URL", settings.MONGODB_URL),
+                                serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not available")
+
+    database_name = f"asasy_test_{uuid.uuid4().hex[:12]}"
+    await init_beanie(database=client[database_name], document_models=DOCUMENT_MODELS)
+    yield client[database_name]
+    await client.drop_database(database_name)
+    client.close()
+
+
+@pytest_asyncio.fixture
+async def user(db) -> User:
+    user = User(name="Test User", email=f"{uuid.uuid4().hex[:8]}@example.com")
+    await user.insert()
+    return user
+
+
+@pytest_asyncio.fixture
+async def package(db) -> TokenPackage:
+    package = TokenPackage(
+        name="Starter Report",
+        package_type=TokenPackageType.STARTER,
+        tokens=7500,
+        price_inr=290.0,
+        price_usd=2.99,
+        description="Test package",
+    )
+    await package.insert()
+    return package
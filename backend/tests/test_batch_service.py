@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.models.report import ReportBatch, ReportBatchStatus, ReportComplexity, ReportLog, ReportStatus
+from app.models.token import SIGNUP_BONUS_TOKENS
+from app.services import batch_service
+from app.services.batch_service import recover_stale_batches
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_preparing_batch(user, age_seconds: float, prepare_retries: int = 0) -> ReportBatch:
+    report = ReportLog(
+        id=PydanticObjectId(),
+        user_id=str(user.id),
+        title="Technology Assessment: test",
+        idea="test idea",
+        complexity=ReportComplexity.BASIC,
+        status=ReportStatus.PENDING,
+        tokens_used=2500,
+    )
+    assert await user.reserve_tokens({str(report.id): report.tokens_used})
+    batch = ReportBatch(
+        user_id=str(user.id),
+        tokens_used=report.tokens_used,
+        report_ids=[str(report.id)],
+        prepare_retries=prepare_retries,
+        updated_at=datetime.utcnow() - timedelta(seconds=age_seconds),
+    )
+    await batch.insert()
+    report.batch_id = str(batch.id)
+    await report.insert()
+    return batch
+
+
+async def test_stalled_batch_is_prepared_again(user, mocker):
+    prepare_batch = mocker.patch.object(batch_service, "prepare_batch", mocker.AsyncMock())
+    batch = await create_preparing_batch(user, age_seconds=settings.BATCH_PREPARE_TIMEOUT_SECONDS + 60)
+
+    await recover_stale_batches()
+    await recover_stale_batches()
+
+    prepare_batch.assert_called_once_with(str(batch.id))
+    batch = await ReportBatch.get(batch.id)
+    assert batch.status == ReportBatchStatus.PREPARING
+    assert batch.prepare_retries == 1
+
+
+async def test_batch_stalled_after_retries_is_failed_and_refunded(user):
+    batch = await create_preparing_batch(
+        user, age_seconds=settings.BATCH_PREPARE_TIMEOUT_SECONDS + 60,
+        prepare_retries=settings.BATCH_MAX_PREPARE_RETRIES,
+    )
+
+    await recover_stale_batches()
+
+    batch = await ReportBatch.get(batch.id)
+    assert batch.status == ReportBatchStatus.FAILED
+    report = await ReportLog.get(batch.report_ids[0])
+    assert report.status == ReportStatus.FAILED
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS
+    assert balance.reserved_tokens == 0
+
+
+async def test_batch_still_preparing_is_left_alone(user, mocker):
+    prepare_batch = mocker.patch.object(batch_service, "prepare_batch", mocker.AsyncMock())
+    batch = await create_preparing_batch(user, age_seconds=0)
+
+    await recover_stale_batches()
+
+    prepare_batch.assert_not_called()
+    batch = await ReportBatch.get(batch.id)
+    assert batch.status == ReportBatchStatus.PREPARING
+    assert batch.prepare_retries == 0
@@ -0,0 +1,40 @@
+import time
+
+from app.core.security import create_signed_download_params, verify_download_signature
+
+REPORT_ID = "6532f0c2a1b2c3d4e5f60718"
+
+
+def test_fresh_link_verifies():
+    params = create_signed_download_params(REPORT_ID)
+
+    assert verify_download_signature(REPORT_ID, params["expires"], params["signature"])
+
+
+def test_expired_link_is_rejected(monkeypatch):
+    params = create_signed_download_params(REPORT_ID, expires_in=60)
+
+    monkeypatch.setattr(time, "time", lambda: params["expires"] + 1)
+    assert not verify_download_signature(REPORT_ID, params["expires"], params["signature"])
+
+
+def test_extended_expiry_is_rejected():
+    params = create_signed_download_params(REPORT_ID, expires_in=60)
+
+    assert not verify_download_signature(REPORT_ID, params["expires"] + 3600, params["signature"])
+
+
+def test_link_for_another_report_is_rejected():
+    params = create_signed_download_params(REPORT_ID)
+
+    assert not verify_download_signature("6532f0c2a1b2c3d4e5f60719", params["expires"], params["signature"])
+
+
+def test_tampered_or_missing_signature_is_rejected():
+    params = create_signed_download_params(REPORT_ID)
+    signature = params["signature"]
+    tampered = ("0" if signature[0] != "0" else "1") + signature[1:]
+
+    assert not verify_download_signature(REPORT_ID, params["expires"], tampered)
+    assert not verify_download_signature(REPORT_ID, params["expires"], None)
+    assert not verify_download_signature(REPORT_ID, None, signature)
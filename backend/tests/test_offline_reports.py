@@ -0,0 +1,21 @@
+import pytest
+from fastapi import HTTPException
+
+from app.api.routes.reports import create_and_queue_report
+from app.core.config import settings
+from app.models.report import ReportComplexity, ReportLog
+from app.models.token import SIGNUP_BONUS_TOKENS
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_offline_request_is_rejected_when_the_pipeline_is_disabled(user, monkeypatch):
+    monkeypatch.setattr(settings, "OFFLINE_REPORTS_ENABLED", False)
+
+    with pytest.raises(HTTPException) as error:
+        await create_and_queue_report(user, "An idea long enough to pass validation " * 3,
+                                      ReportComplexity.BASIC, offline=True)
+
+    assert error.value.status_code == 400
+    assert await ReportLog.find({"user_id": str(user.id)}).count() == 0
+    assert (await user.get_token_balance()).available_tokens == SIGNUP_BONUS_TOKENS
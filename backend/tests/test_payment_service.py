@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api.routes.tokens import get_user_token_transactions
+from app.core.config import settings
+from app.models.token import (
+    SIGNUP_BONUS_TOKENS,
+    RazorpayWebhookEvent,
+    TokenTransaction,
+    TokenTransactionStatus,
+    WebhookEventStatus,
+)
+from app.models.user import User
+from app.services.payment_service import (
+    complete_token_purchase,
+    handle_token_payment_captured,
+    store_webhook_event,
+    webhook_inbox,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_pending_transaction(user, package, order_id="order_1") -> TokenTransaction:
+    transaction = TokenTransaction(
+        user_id=str(user.id),
+        package_id=str(package.id),
+        package_name=package.name,
+        tokens_purchased=package.tokens,
+        amount_paid=29000,
+        razorpay_order_id=order_id,
+    )
+    await transaction.insert()
+    return transaction
+
+
+def captured_payload(order_id="order_1", payment_id="pay_1") -> dict:
+    return {"payment": {"entity": {"id": payment_id, "order_id": order_id, "amount": 29000}}}
+
+
+async def available_tokens(user) -> int:
+    return (await user.get_token_balance()).available_tokens
+
+
+async def test_completes_and_credits_once(user, package):
+    await create_pending_transaction(user, package)
+
+    assert await complete_token_purchase("order_1", "pay_1", 29000) is not None
+    assert await complete_token_purchase("order_1", "pay_1", 29000) is None
+
+    transaction = await TokenTransaction.find_one({"razorpay_order_id": "order_1"})
+    assert transaction.status == TokenTransactionStatus.COMPLETED
+    assert transaction.razorpay_payment_id == "pay_1"
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_retry_after_failed_credit_credits_once(user, package, mocker):
+    await create_pending_transaction(user, package)
+    add_tokens = User.add_tokens
+    calls = []
+
+    async def flaky_add_tokens(self, tokens, order_id=None):
+        calls.append(order_id)
+        if len(calls) == 1:
+            raise ConnectionError("balance update failed")
+        return await add_tokens(self, tokens, order_id=order_id)
+
+    mocker.patch.object(User, "add_tokens", flaky_add_tokens)
+
+    with pytest.raises(ConnectionError):
+        await complete_token_purchase("order_1", "pay_1", 29000)
+    transaction = await TokenTransaction.find_one({"razorpay_order_id": "order_1"})
+    assert transaction.status == TokenTransactionStatus.PENDING
+
+    assert await complete_token_purchase("order_1", "pay_1", 29000) is not None
+    assert await complete_token_purchase("order_1", "pay_1", 29000) is None
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_retry_after_credit_completes_without_crediting_again(user, package):
+    await create_pending_transaction(user, package)
+    # The worker credited the order, then died before completing the transaction
+    await user.add_tokens(package.tokens, order_id="order_1")
+
+    assert await complete_token_purchase("order_1", "pay_1", 29000) is None
+
+    transaction = await TokenTransaction.find_one({"razorpay_order_id": "order_1"})
+    assert transaction.status == TokenTransactionStatus.COMPLETED
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_inbox_retries_failed_event_and_credits_once(user, package, mocker, monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_POLL_SECONDS", 0.0)
+    await create_pending_transaction(user, package)
+    body = json.dumps({"event": "payment.captured", "payload": captured_payload()}).encode()
+    assert await store_webhook_event("evt_1", body)
+
+    add_tokens = User.add_tokens
+    calls = []
+
+    async def flaky_add_tokens(self, tokens, order_id=None):
+        calls.append(order_id)
+        if len(calls) == 1:
+            raise ConnectionError("balance update failed")
+        return await add_tokens(self, tokens, order_id=order_id)
+
+    mocker.patch.object(User, "add_tokens", flaky_add_tokens)
+
+    await webhook_inbox.process_pending_events()
+    event = await RazorpayWebhookEvent.find_one({"event_id": "evt_1"})
+    assert event.status == WebhookEventStatus.FAILED
+
+    await webhook_inbox.process_pending_events()
+    await webhook_inbox.process_pending_events()
+    event = await RazorpayWebhookEvent.find_one({"event_id": "evt_1"})
+    assert event.status == WebhookEventStatus.PROCESSED
+    assert event.attempts == 2
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_duplicate_webhook_delivery_is_stored_once(db):
+    body = json.dumps({"event": "payment.captured", "payload": captured_payload()}).encode()
+
+    assert await store_webhook_event("evt_1", body)
+    assert not await store_webhook_event("evt_1", body)
+    assert await RazorpayWebhookEvent.find({"event_id": "evt_1"}).count() == 1
+
+
+async def test_verify_and_webhook_race_credits_once(user, package):
+    await create_pending_transaction(user, package)
+
+    await asyncio.gather(
+        complete_token_purchase("order_1", "pay_1", 29000, "signature", str(user.id), package),
+        handle_token_payment_captured(captured_payload()),
+    )
+
+    transaction = await TokenTransaction.find_one({"razorpay_order_id": "order_1"})
+    assert transaction.status == TokenTransactionStatus.COMPLETED
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_concurrent_verify_without_checkout_transaction_records_one(user, package):
+    results = await asyncio.gather(*(
+        complete_token_purchase("order_2", "pay_2", 29000, "signature", str(user.id), package)
+        for _ in range(5)
+    ))
+
+    assert sum(result is not None for result in results) == 1
+    assert await TokenTransaction.find({"razorpay_order_id": "order_2"}).count() == 1
+    assert await available_tokens(user) == SIGNUP_BONUS_TOKENS + package.tokens
+
+
+async def test_transaction_history_lists_only_completed_purchases(user, package):
+    await create_pending_transaction(user, package, order_id="order_paid")
+    await create_pending_transaction(user, package, order_id="order_abandoned")
+    await complete_token_purchase("order_paid", "pay_1", 29000)
+
+    history = await get_user_token_transactions(current_user=user)
+
+    assert len(history) == 1
+    assert history[0]["status"] == TokenTransactionStatus.COMPLETED
+    assert history[0]["tokens_purchased"] == package.tokens
@@ -0,0 +1,104 @@
+import pytest
+from beanie import PydanticObjectId
+from fastapi import HTTPException
+
+from app.api.routes.reports import calculate_cancellation_refund, cancel_report, finalize_cancelled_report
+from app.models.report import ReportComplexity, ReportLog, ReportStatus
+from app.models.token import SIGNUP_BONUS_TOKENS
+
+
+async def create_reserved_report(user, status: ReportStatus, tokens: int = 2500) -> ReportLog:
+    report = ReportLog(
+        id=PydanticObjectId(),
+        user_id=str(user.id),
+        title="Technology Assessment: test",
+        idea="test idea",
+        complexity=ReportComplexity.BASIC,
+        status=status,
+        tokens_used=tokens,
+    )
+    assert await user.reserve_tokens({str(report.id): tokens})
+    await report.insert()
+    return report
+
+
+@pytest.mark.parametrize("sections_completed, sections_total, expected", [
+    (0, 10, 2500),
+    (3, 10, 1750),
+    (10, 10, 0),
+    (12, 10, 0),  # more progress reported than sections: nothing left to refund
+    (1, 3, 1666),  # rounded down, in the platform's favour
+    (0, 0, 2500),  # cancelled before the structure was known
+])
+def test_refund_covers_sections_not_generated(sections_completed, sections_total, expected):
+    assert calculate_cancellation_refund(2500, sections_completed, sections_total) == expected
+
+
+@pytest.mark.asyncio
+async def test_cancelled_report_keeps_the_consumed_share(user):
+    report = await create_reserved_report(user, ReportStatus.PROCESSING)
+
+    await finalize_cancelled_report(str(report.id), 4, 10)
+
+    report = await ReportLog.get(report.id)
+    assert report.status == ReportStatus.CANCELLED
+    assert report.tokens_refunded == 1500
+    balance = await user.get_token_balance()
+    assert balance.used_tokens == 1000
+    assert balance.reserved_tokens == 0
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS - 1000
+
+
+@pytest.mark.asyncio
+async def test_finalizing_a_cancelled_report_again_refunds_nothing(user):
+    report = await create_reserved_report(user, ReportStatus.PROCESSING)
+
+    await finalize_cancelled_report(str(report.id), 4, 10)
+    await finalize_cancelled_report(str(report.id), 0, 10)
+
+    report = await ReportLog.get(report.id)
+    assert report.tokens_refunded == 1500
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS - 1000
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_pending_report_refunds_in_full(user):
+    report = await create_reserved_report(user, ReportStatus.PENDING)
+
+    response = await cancel_report(str(report.id), current_user=user)
+
+    assert response["tokens_refunded"] == 2500
+    report = await ReportLog.get(report.id)
+    assert report.status == ReportStatus.CANCELLED
+    assert report.cancel_requested
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS
+    assert balance.used_tokens == 0
+
+    with pytest.raises(HTTPException) as error:
+        await cancel_report(str(report.id), current_user=user)
+    assert error.value.status_code == 400
+    assert (await user.get_token_balance()).available_tokens == SIGNUP_BONUS_TOKENS
+
+
+@pytest.mark.asyncio
+async def test_cancelling_an_upgraded_report_lets_the_draft_be_upgraded_again(user):
+    report = await create_reserved_report(user, ReportStatus.PENDING)
+    draft = ReportLog(
+        user_id=str(user.id),
+        title="Draft Assessment: test",
+        idea="test idea",
+        complexity=ReportComplexity.DRAFT,
+        status=ReportStatus.COMPLETED,
+        tokens_used=500,
+        metadata={"upgraded_to": str(report.id)},
+    )
+    await draft.insert()
+    report.metadata["upgraded_from"] = str(draft.id)
+    await report.save()
+
+    await cancel_report(str(report.id), current_user=user)
+
+    draft = await ReportLog.get(draft.id)
+    assert "upgraded_to" not in draft.metadata
@@ -0,0 +1,36 @@
+import random
+
+import pytest
+
+from app.models.report import (
+    ALL_SECTION_TITLES,
+    REPORT_TOKEN_REQUIREMENTS,
+    SECTION_MAPPING,
+    ReportComplexity,
+    get_report_token_requirement,
+)
+
+
+def smallest_covering_tier_price(sections) -> int:
+    """Cheapest tier that includes every section or has at least as many sections"""
+    return min(
+        REPORT_TOKEN_REQUIREMENTS[tier] for tier, titles in SECTION_MAPPING.items()
+        if set(sections) <= set(titles) or len(titles) >= len(sections)
+    )
+
+
+@pytest.mark.parametrize("section_count", range(1, len(ALL_SECTION_TITLES) + 1))
+def test_custom_report_never_costs_more_than_a_covering_tier(section_count):
+    rng = random.Random(section_count)
+    for sections in (ALL_SECTION_TITLES[:section_count], ALL_SECTION_TITLES[-section_count:],
+                     rng.sample(ALL_SECTION_TITLES, section_count)):
+        price = get_report_token_requirement(ReportComplexity.CUSTOM, sections)
+        assert 0 < price <= smallest_covering_tier_price(sections)
+
+
+def test_custom_report_price_grows_with_sections():
+    prices = [get_report_token_requirement(ReportComplexity.CUSTOM, ALL_SECTION_TITLES[:count])
+              for count in range(1, len(SECTION_MAPPING[ReportComplexity.BASIC]) + 1)]
+
+    assert prices == sorted(prices)
+    assert prices[-1] <= REPORT_TOKEN_REQUIREMENTS[ReportComplexity.BASIC]
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from beanie import PydanticObjectId
+
+from app.core.config import settings
+from app.models.report import ReportComplexity, ReportLog, ReportStatus
+from app.models.token import SIGNUP_BONUS_TOKENS
+from app.services.report_scheduler import ReportScheduler
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_dispatched_report(user, heartbeat_age_seconds: float, dispatch_attempts: int = 1) -> ReportLog:
+    report = ReportLog(
+        id=PydanticObjectId(),
+        user_id=str(user.id),
+        title="Technology Assessment: test",
+        idea="test idea",
+        complexity=ReportComplexity.BASIC,
+        status=ReportStatus.PROCESSING,
+        tokens_used=2500,
+        virtual_finish=1.0,
+        dispatched_at=datetime.utcnow() - timedelta(hours=1),
+        heartbeat_at=datetime.utcnow() - timedelta(seconds=heartbeat_age_seconds),
+        dispatch_attempts=dispatch_attempts,
+    )
+    assert await user.reserve_tokens({str(report.id): report.tokens_used})
+    await report.insert()
+    return report
+
+
+async def test_report_with_lapsed_lease_is_requeued(user):
+    report = await create_dispatched_report(user, heartbeat_age_seconds=settings.REPORT_LEASE_SECONDS + 60)
+
+    await ReportScheduler().recover_stale_reports()
+
+    report = await ReportLog.get(report.id)
+    assert report.status == ReportStatus.PENDING
+    assert report.dispatched_at is None
+    balance = await user.get_token_balance()
+    assert balance.reservations == {str(report.id): 2500}
+
+
+async def test_report_out_of_attempts_is_failed_and_refunded(user):
+    report = await create_dispatched_report(
+        user, heartbeat_age_seconds=settings.REPORT_LEASE_SECONDS + 60,
+        dispatch_attempts=settings.REPORT_MAX_DISPATCH_ATTEMPTS,
+    )
+
+    await ReportScheduler().recover_stale_reports()
+    await ReportScheduler().recover_stale_reports()
+
+    report = await ReportLog.get(report.id)
+    assert report.status == ReportStatus.FAILED
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS
+    assert balance.reserved_tokens == 0
+
+
+async def test_report_holding_its_lease_is_left_running(user):
+    report = await create_dispatched_report(user, heartbeat_age_seconds=0)
+
+    await ReportScheduler().recover_stale_reports()
+
+    report = await ReportLog.get(report.id)
+    assert report.status == ReportStatus.PROCESSING
+    assert not report.cancel_requested
+
+
+async def create_report(user, complexity: ReportComplexity, status: ReportStatus, dispatched: bool) -> ReportLog:
+    now = datetime.utcnow()
+    report = ReportLog(
+        id=PydanticObjectId(),
+        user_id=str(user.id),
+        title="Technology Assessment: test",
+        idea="test idea",
+        complexity=complexity,
+        status=status,
+        tokens_used=500,
+        virtual_finish=1.0,
+        dispatched_at=now if dispatched else None,
+        heartbeat_at=now if dispatched else None,
+    )
+    await report.insert()
+    return report
+
+
+async def test_draft_is_dispatched_while_report_slots_are_full(user, monkeypatch, mocker):
+    monkeypatch.setattr(settings, "REPORT_MAX_CONCURRENT_JOBS", 1)
+    scheduler = ReportScheduler()
+    runner = mocker.AsyncMock()
+    scheduler._runner = runner
+    # The user's own report holds the only report slot
+    running = await create_report(user, ReportComplexity.BASIC, ReportStatus.PROCESSING, dispatched=True)
+    scheduler._running[str(running.id)] = asyncio.get_event_loop().create_future()
+    queued = await create_report(user, ReportComplexity.BASIC, ReportStatus.PENDING, dispatched=False)
+    draft = await create_report(user, ReportComplexity.DRAFT, ReportStatus.PENDING, dispatched=False)
+
+    await scheduler._dispatch_available()
+
+    assert (await ReportLog.get(draft.id)).dispatched_at is not None
+    assert (await ReportLog.get(queued.id)).dispatched_at is None
+    await asyncio.gather(*(task for key, task in scheduler._running.items() if key != str(running.id)))
+    runner.assert_awaited_once()
+
+
+async def test_draft_estimate_waits_when_draft_slots_are_full(user, monkeypatch):
+    monkeypatch.setattr(settings, "REPORT_WORKER_COUNT", 1)
+    monkeypatch.setattr(settings, "REPORT_DRAFT_SLOTS", 1)
+    scheduler = ReportScheduler()
+
+    idle = await scheduler.estimate(ReportComplexity.DRAFT)
+    assert idle.wait_seconds == 0
+    assert idle.completion_seconds == settings.DRAFT_REPORT_TIMEOUT_SECONDS
+
+    await create_report(user, ReportComplexity.DRAFT, ReportStatus.PROCESSING, dispatched=True)
+    await create_report(user, ReportComplexity.DRAFT, ReportStatus.PENDING, dispatched=False)
+    busy = await scheduler.estimate(ReportComplexity.DRAFT)
+
+    assert busy.queue_depth == 1
+    assert busy.wait_seconds == 2 * settings.DRAFT_REPORT_TIMEOUT_SECONDS
+    assert busy.completion_seconds == 3 * settings.DRAFT_REPORT_TIMEOUT_SECONDS
+    assert busy.admitted
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from app.models.token import SIGNUP_BONUS_TOKENS
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_concurrent_reservations_cannot_overdraw(user):
+    results = await asyncio.gather(*(user.reserve_tokens({f"report_{i}": 500}) for i in range(10)))
+
+    assert sum(results) == SIGNUP_BONUS_TOKENS // 500
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == 0
+    assert balance.reserved_tokens == SIGNUP_BONUS_TOKENS
+    assert len(balance.reservations) == SIGNUP_BONUS_TOKENS // 500
+
+
+async def test_batch_reservation_is_all_or_nothing(user):
+    assert not await user.reserve_tokens({"report_a": 2000, "report_b": 2000})
+
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS
+    assert balance.reserved_tokens == 0
+    assert balance.reservations == {}
+
+
+async def test_commit_charges_reserved_tokens(user):
+    assert await user.reserve_tokens({"report_1": 500})
+    assert await user.commit_tokens("report_1", 500)
+
+    balance = await user.get_token_balance()
+    assert balance.used_tokens == 500
+    assert balance.reserved_tokens == 0
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS - 500
+    assert balance.reservations == {}
+
+
+async def test_release_after_commit_is_a_no_op(user):
+    assert await user.reserve_tokens({"report_1": 500})
+    assert await user.commit_tokens("report_1", 500)
+    assert not await user.release_tokens("report_1", 500)
+    assert not await user.commit_tokens("report_1", 500)
+
+    balance = await user.get_token_balance()
+    assert balance.used_tokens == 500
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS - 500
+
+
+async def test_concurrent_settlements_apply_once(user):
+    assert await user.reserve_tokens({"report_1": 1000})
+
+    results = await asyncio.gather(
+        user.commit_tokens("report_1", 1000),
+        user.release_tokens("report_1", 1000),
+        user.release_tokens("report_1", 1000),
+        user.release_tokens("report_1", 1000, tokens_consumed=400),
+    )
+
+    assert sum(results) == 1
+    balance = await user.get_token_balance()
+    assert balance.reserved_tokens == 0
+    assert balance.reservations == {}
+    assert balance.used_tokens + balance.available_tokens == SIGNUP_BONUS_TOKENS
+
+
+async def test_release_keeps_the_consumed_share(user):
+    assert await user.reserve_tokens({"report_1": 1000})
+    assert await user.release_tokens("report_1", 1000, tokens_consumed=400)
+
+    balance = await user.get_token_balance()
+    assert balance.used_tokens == 400
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS - 400
+    assert balance.reserved_tokens == 0
+
+
+async def test_release_without_reservation_changes_nothing(user):
+    assert not await user.release_tokens("unknown_report", 500)
+
+    balance = await user.get_token_balance()
+    assert balance.available_tokens == SIGNUP_BONUS_TOKENS
+    assert balance.used_tokens == 0